@@ -0,0 +1,188 @@
+"""
+Метрики запросов в памяти процесса: время ответа, SQL (число и время),
+попадания в кэш, время сериализации. Отдаются в формате Prometheus на /metrics.
+
+Каждый воркер gunicorn/uvicorn считает своё; Prometheus снимает их по очереди,
+поэтому на дашбордах нужны rate()/histogram_quantile() по сумме воркеров.
+"""
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.serializers import ListSerializer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+TOP_SQL = 5
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, count, total) in sorted(snapshot.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_SECONDS = Histogram(
+    "shop_http_request_duration_seconds", "Время ответа по представлениям",
+    ("view", "method", "status"), LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "shop_db_queries_per_request", "SQL-запросов на запрос", ("view",), QUERY_COUNT_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    "shop_db_duration_seconds", "Время в SQL на запрос", ("view",), LATENCY_BUCKETS,
+)
+SERIALIZER_SECONDS = Histogram(
+    "shop_serializer_duration_seconds", "Время сериализации", ("serializer",), LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "shop_cache_requests_total", "Обращения к кэшу", ("cache", "result"),
+)
+
+REGISTRY = [REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS, CACHE_REQUESTS]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """Счётчики одного запроса; доступны из потоков sync_to_async через contextvars."""
+
+    __slots__ = ("queries", "db_time", "serializer_time", "top_sql", "keep_sql")
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.top_sql = []
+        self.keep_sql = keep_sql
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.keep_sql:
+            item = (duration, self.queries, sql)
+            if len(self.top_sql) < TOP_SQL:
+                heapq.heappush(self.top_sql, item)
+            else:
+                heapq.heappushpop(self.top_sql, item)
+
+
+current_stats = ContextVar("shop_request_stats", default=None)
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.inc(name, "hit" if hit else "miss")
+
+
+@contextmanager
+def serializer_timer(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SERIALIZER_SECONDS.observe(elapsed, name)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.serializer_time += elapsed
+
+
+def _sql_timer(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+def install_sql_timer(connection):
+    if _sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_timer)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    # каждое новое соединение, в том числе в потоках sync_to_async
+    install_sql_timer(connection)
+
+
+class TimedListSerializer(ListSerializer):
+    """list_serializer_class для сериализаторов выдачи: .data попадает в гистограмму."""
+
+    @property
+    def data(self):
+        with serializer_timer(type(self.child).__name__):
+            return super().data
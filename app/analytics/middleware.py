@@ -1,28 +1,267 @@
+import atexit
+import logging
+import os
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import timedelta
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.utils import timezone
+from app.analytics import metrics
 from app.shop.models import Visit
+from core.sessions import CACHE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+VISIT_KEY = "visit:{}"
+
+
+class VisitRecorder:
+    """
+    Учёт визитов внутри процесса: карта visitor_id -> начало текущего визита
+    и буфер новых визитов, который пишется в БД пачкой.
+
+    Начало визита делится между воркерами через кэш (cache.add атомарен),
+    так что визит записывает только один процесс. Буфер сбрасывает фоновый
+    поток раз в flush_interval, даже если запросов больше нет.
+    """
+
+    def __init__(self, session_timeout, buffer_size, flush_interval, max_visitors, use_celery=False):
+        self.session_timeout = session_timeout
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_visitors = max_visitors
+        self.use_celery = use_celery
+        self._lock = threading.Lock()
+        self._last_seen = OrderedDict()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._stopped = threading.Event()
+        self._flusher_pid = None
+
+    def track(self, visitor_id, ip, user_agent, is_new=False, allow_io=True):
+        """
+        С allow_io=False (event loop) в кэш и БД не ходим: визит только
+        продлевается, а буфер остаётся фоновому потоку или следующему
+        синхронному вызову. Возвращает False, если без I/O учесть нельзя.
+        """
+        now = timezone.now()
+        with self._lock:
+            started_at = self._last_seen.get(visitor_id)
+            if started_at is not None:
+                self._last_seen.move_to_end(visitor_id)
+
+        if started_at is None or now - started_at > self.session_timeout:
+            if not allow_io:
+                return False
+            started_at, is_start = self._claim(visitor_id, now, is_new)
+        else:
+            is_start = False
+
+        with self._lock:
+            if is_start:
+                self._buffer.append(
+                    Visit(visitor_id=visitor_id, ip=ip, user_agent=user_agent, started_at=now)
+                )
+            self._remember(visitor_id, started_at)
+            batch = self._take_batch() if allow_io else []
+
+        if batch:
+            self._write(batch)
+        return True
+
+    def needs_io(self, visitor_id):
+        """True, если track() может сходить в кэш или БД (новый визит или сброс буфера)."""
+        now = timezone.now()
+        with self._lock:
+            started_at = self._last_seen.get(visitor_id)
+            if started_at is None or now - started_at > self.session_timeout:
+                return True
+            return (
+                len(self._buffer) + 1 >= self.buffer_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+
+    def _claim(self, visitor_id, now, is_new):
+        """(начало визита, True если визит начинается этим запросом)."""
+        key = VISIT_KEY.format(visitor_id)
+        try:
+            if cache.add(key, now, timeout=int(self.session_timeout.total_seconds())):
+                return now, True
+            # визит уже начал другой воркер; ключ мог истечь между add и get
+            return cache.get(key) or now, False
+        except CACHE_ERRORS:
+            pass
+
+        # без кэша — как раньше: визитор, которого процесс не видел, ищем в БД
+        started_at = None
+        if not is_new:
+            started_at = (
+                Visit.objects.filter(visitor_id=visitor_id)
+                .order_by("-started_at")
+                .values_list("started_at", flat=True)
+                .first()
+            )
+        with self._lock:
+            known = self._last_seen.get(visitor_id)
+        if known is not None and (started_at is None or known > started_at):
+            # параллельный запрос того же визитора успел его учесть
+            started_at = known
+        if started_at is None or now - started_at > self.session_timeout:
+            return now, True
+        return started_at, False
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if batch:
+            self._write(batch)
+
+    def start_flusher(self):
+        """Фоновый сброс буфера; после fork (gunicorn --preload) поток заводится заново."""
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        self._stopped.clear()
+        threading.Thread(target=self._flush_loop, name="visit-flusher", daemon=True).start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _remember(self, visitor_id, started_at):
+        current = self._last_seen.get(visitor_id)
+        if current is None or started_at > current:
+            self._last_seen[visitor_id] = started_at
+        self._last_seen.move_to_end(visitor_id)
+        while len(self._last_seen) > self.max_visitors:
+            self._last_seen.popitem(last=False)
+
+    def _take_batch(self):
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if not self._buffer:
+            if due:
+                self._last_flush = time.monotonic()
+            return []
+        if len(self._buffer) < self.buffer_size and not due:
+            return []
+        batch, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        return batch
+
+    def _write(self, batch):
+        try:
+            if self.use_celery:
+                from app.shop.tasks import record_visits
+
+                record_visits.delay([
+                    {
+                        "visitor_id": v.visitor_id,
+                        "ip": v.ip,
+                        "user_agent": v.user_agent,
+                        "started_at": v.started_at.isoformat(),
+                    }
+                    for v in batch
+                ])
+            else:
+                Visit.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Не удалось записать %s визитов", len(batch))
+
+
+def _valid_visitor_id(value):
+    """Cookie приходит от клиента: ключ корзины и визита — только UUID, иначе выдаём новый."""
+    try:
+        return str(uuid.UUID(value)) if value else None
+    except ValueError:
+        return None
+
 
 class VisitMiddleware:
     COOKIE_NAME = "visitor_id"
     SESSION_TIMEOUT = timedelta(minutes=30)
-    COOKIE_AGE = 60 * 60 * 24 * 365  
+    COOKIE_AGE = 60 * 60 * 24 * 365
+
+    sync_capable = True
+    async_capable = True
+
+    recorder = None
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if VisitMiddleware.recorder is None:
+            VisitMiddleware.recorder = VisitRecorder(
+                session_timeout=self.SESSION_TIMEOUT,
+                buffer_size=getattr(settings, "VISIT_BUFFER_SIZE", 200),
+                flush_interval=getattr(settings, "VISIT_FLUSH_INTERVAL", 5),
+                max_visitors=getattr(settings, "VISIT_TRACKER_MAX_VISITORS", 50000),
+                use_celery=getattr(settings, "VISIT_FLUSH_VIA_CELERY", False),
+            )
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        self._start_flusher()
+        visitor_id, is_new = self._identify(request)
         response = self.get_response(request)
+        if self._should_track(request):
+            self._set_cookie(response, visitor_id, is_new)
+            self.recorder.track(visitor_id, *self._client(request), is_new=is_new)
+        return response
 
-        if request.path.startswith(("/admin", "/static", "/media")):
-            return response
+    async def __acall__(self, request):
+        self._start_flusher()
+        visitor_id, is_new = self._identify(request)
+        response = await self.get_response(request)
+        if self._should_track(request):
+            self._set_cookie(response, visitor_id, is_new)
+            client = self._client(request)
+            # между needs_io и track визит мог истечь — тогда тоже уходим в поток
+            if self.recorder.needs_io(visitor_id) or not self.recorder.track(
+                visitor_id, *client, is_new=is_new, allow_io=False
+            ):
+                await sync_to_async(self.recorder.track)(visitor_id, *client, is_new=is_new)
+        return response
 
-        ip = request.META.get("REMOTE_ADDR")
-        user_agent = request.META.get("HTTP_USER_AGENT", "")
-        visitor_id = request.COOKIES.get(self.COOKIE_NAME)
+    def _start_flusher(self):
+        # тесты выключают поток: буфер не должен пережить тестовую БД
+        if getattr(settings, "VISIT_FLUSH_THREAD", True):
+            self.recorder.start_flusher()
 
-        if not visitor_id:
+    def _identify(self, request):
+        visitor_id = _valid_visitor_id(request.COOKIES.get(self.COOKIE_NAME))
+        is_new = not visitor_id
+        if is_new:
             visitor_id = str(uuid.uuid4())
+        request.visitor_id = visitor_id
+        return visitor_id, is_new
+
+    @staticmethod
+    def _should_track(request):
+        # опросы Prometheus — не визиты
+        return not request.path.startswith(("/admin", "/static", "/media", "/metrics"))
+
+    @staticmethod
+    def _client(request):
+        return request.META.get("REMOTE_ADDR"), request.META.get("HTTP_USER_AGENT", "")
+
+    def _set_cookie(self, response, visitor_id, is_new):
+        if is_new:
             response.set_cookie(
                 self.COOKIE_NAME,
                 visitor_id,
@@ -31,27 +270,63 @@ class VisitMiddleware:
                 samesite="Lax",
             )
 
-        last_visit = (
-            Visit.objects.filter(visitor_id=visitor_id)
-            .order_by("-started_at")
-            .first()
-        )
 
-        now = timezone.now()
-        create_new = False
+class MetricsMiddleware:
+    """
+    Время ответа, SQL и сериализация по представлениям в гистограммы metrics.
+    Запросы дольше SLOW_REQUEST_MS пишутся в лог вместе с самыми долгими SQL.
+    """
 
-        if not last_visit:
-            create_new = True
-        else:
-            delta = now - last_visit.started_at
-            if delta > self.SESSION_TIMEOUT:
-                create_new = True
-
-        if create_new:
-            Visit.objects.create(
-                visitor_id=visitor_id,
-                ip=ip,
-                user_agent=user_agent,
-            )
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", None)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics.install_sql_timer(connection)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    def _start(self):
+        stats = metrics.RequestStats(keep_sql=self.slow_ms is not None)
+        return stats, metrics.current_stats.set(stats), time.perf_counter()
 
-        return response
\ No newline at end of file
+    def _finish(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        metrics.REQUEST_SECONDS.observe(elapsed, view, request.method, response.status_code)
+        metrics.DB_QUERIES.observe(stats.queries, view)
+        metrics.DB_SECONDS.observe(stats.db_time, view)
+
+        if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+            top = "\n".join(
+                f"  {duration * 1000:.1f} ms: {sql[:500]}"
+                for duration, _, sql in sorted(stats.top_sql, reverse=True)
+            )
+            logger.warning(
+                "Медленный запрос %s %s (%s): %.0f ms, SQL %s шт. / %.0f ms, сериализация %.0f ms\n%s",
+                request.method, request.get_full_path(), view, elapsed * 1000,
+                stats.queries, stats.db_time * 1000, stats.serializer_time * 1000, top,
+            )
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from app.analytics import metrics
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики этого процесса в текстовом формате Prometheus. Доступ только с
+    адресов из METRICS_ALLOWED_IPS; пока список пуст, /metrics закрыт.
+    """
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", None) or ()
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
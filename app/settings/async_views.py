@@ -0,0 +1,13 @@
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import require_GET
+
+from app.settings.cache import get_local_payload, load_settings_payload
+from app.settings.views import settings_response
+
+
+@require_GET
+async def settings_list(request):
+    payload = get_local_payload(request)
+    if payload is None:
+        payload = await sync_to_async(load_settings_payload)(request)
+    return settings_response(request, payload)
@@ -0,0 +1,132 @@
+"""
+Кэш ответа настроек сайта в два уровня: словарь в памяти процесса с коротким
+TTL и общий кэш (Redis). Ключ — язык, схема и хост: в ответе переведённые
+поля и абсолютные ссылки на картинки.
+
+Хост берётся только из SITE_SETTINGS_HOSTS (по умолчанию — ALLOWED_HOSTS без
+масок): при ALLOWED_HOSTS = ["*"] произвольный Host иначе раздувал бы и
+словарь процесса, и ключи в Redis. Чужой хост получает ссылки на первый из
+настроенных. Без настроенных хостов в кэше одно тело с подставным хостом,
+а хост запроса подставляется в него при ответе — ссылки остаются абсолютными
+(фронтенд на другом origin).
+"""
+import hashlib
+import threading
+import time
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language
+from rest_framework.renderers import JSONRenderer
+
+from app.analytics.metrics import record_cache
+from app.settings.models import Settings
+from app.settings.serializers import SettingsSerailizer
+
+SETTINGS_VERSION_KEY = "site_settings:version"
+LOCAL_TTL = getattr(settings, "SITE_SETTINGS_LOCAL_TTL", 30)
+SHARED_TTL = getattr(settings, "SITE_SETTINGS_SHARED_TTL", 60 * 60 * 24)
+
+# хост-заглушка в закэшированном теле; домен .invalid не может прийти в Host
+PLACEHOLDER_HOST = "site-host.invalid"
+
+_local = {}
+_lock = threading.Lock()
+
+
+def _site_hosts():
+    hosts = getattr(settings, "SITE_SETTINGS_HOSTS", None)
+    if hosts is None:
+        hosts = [h for h in settings.ALLOWED_HOSTS if h and h != "*" and not h.startswith(".")]
+    return hosts
+
+
+def _site_host(request):
+    hosts = _site_hosts()
+    host = request.get_host()
+    if host in hosts:
+        return host
+    return hosts[0] if hosts else ""
+
+
+class _SiteRequest:
+    """Ссылки на картинки — от настроенного хоста, а не от присланного Host."""
+
+    def __init__(self, scheme, host):
+        self.base = f"{scheme}://{host}/"
+
+    def build_absolute_uri(self, location):
+        return urljoin(self.base, location)
+
+
+def _local_key(request):
+    return get_language(), request.scheme, _site_host(request)
+
+
+def get_local_payload(request):
+    """Только память процесса, без обращений к кэшу и БД; None — промах."""
+    with _lock:
+        entry = _local.get(_local_key(request))
+    hit = entry is not None and entry[0] > time.monotonic()
+    record_cache("site_settings_local", hit)
+    return entry[1] if hit else None
+
+
+def get_settings_payload(request):
+    """
+    {"body": bytes, "etag": str, "last_modified": float | None} —
+    готовое тело ответа и валидаторы для условных запросов.
+    """
+    payload = get_local_payload(request)
+    if payload is None:
+        payload = load_settings_payload(request)
+    if _site_host(request):
+        return payload
+    return _for_request_host(payload, request)
+
+
+def _for_request_host(payload, request):
+    body = payload["body"].replace(
+        f"://{PLACEHOLDER_HOST}/".encode(), f"://{request.get_host()}/".encode()
+    )
+    return dict(payload, body=body, etag='"%s"' % hashlib.sha256(body).hexdigest())
+
+
+def load_settings_payload(request):
+    """Общий кэш или БД, минуя память процесса; результат кладётся в неё."""
+    lang, scheme, host = _local_key(request)
+    version = cache.get(SETTINGS_VERSION_KEY, 1)
+    key = f"site_settings:v{version}:{lang}:{scheme}://{host}"
+    payload = cache.get(key)
+    record_cache("site_settings", payload is not None)
+    if payload is None:
+        objs = list(Settings.objects.all())
+        site_request = _SiteRequest(scheme, host or PLACEHOLDER_HOST)
+        body = JSONRenderer().render(
+            SettingsSerailizer(objs, many=True, context={"request": site_request}).data
+        )
+        updated = [obj.updated_at for obj in objs if obj.updated_at]
+        payload = {
+            "body": body,
+            "etag": '"%s"' % hashlib.sha256(body).hexdigest(),
+            "last_modified": max(updated).timestamp() if updated else None,
+        }
+        cache.set(key, payload, SHARED_TTL)
+
+    with _lock:
+        _local[(lang, scheme, host)] = (time.monotonic() + LOCAL_TTL, payload)
+    return payload
+
+
+def invalidate_settings_cache():
+    """
+    Новая версия ключей в общем кэше; память других процессов
+    устаревает сама не позже чем через LOCAL_TTL секунд.
+    """
+    try:
+        cache.incr(SETTINGS_VERSION_KEY)
+    except ValueError:
+        cache.set(SETTINGS_VERSION_KEY, 2, timeout=None)
+    with _lock:
+        _local.clear()
@@ -57,6 +57,10 @@ class Settings(models.Model):
     text_footer = RichTextField(
         verbose_name='Описание Футера'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлено'
+    )
 
     def __str__(self):
         return self.title_banner
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from app.settings.models import Settings
+from app.analytics.metrics import TimedListSerializer
 
 class SettingsSerailizer(serializers.ModelSerializer):
     class Meta:
@@ -9,4 +10,5 @@ class SettingsSerailizer(serializers.ModelSerializer):
             'title_banner', 'description_banner', 'image_banner',
             'about_title', 'description_about', 'image_about1', 'image_about2',
             'end_about', 'title_catalog', 'review', 'description_review', 'text_footer'
-        ]
\ No newline at end of file
+        ]
+        list_serializer_class = TimedListSerializer
\ No newline at end of file
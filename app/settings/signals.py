@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from app.settings.cache import invalidate_settings_cache
+from app.settings.models import Settings
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def reset_settings_cache(sender, **kwargs):
+    invalidate_settings_cache()
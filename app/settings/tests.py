@@ -1,3 +1,66 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from app.settings import cache as settings_cache
+from app.settings.models import Settings
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SITE_SETTINGS_HOSTS=["shop.example"])
+class SettingsCacheTests(TestCase):
+    URL = "/ru/api/v1/settings/settings/"
+
+    def setUp(self):
+        cache.clear()
+        settings_cache._local.clear()
+        self.obj = Settings.objects.create(
+            telegram="t", instagram="i", whatsapp="w", title_banner="Баннер", description_banner="d",
+            image_banner="settings/banner.jpg", about_title="a", description_about="d",
+            image_about1="about/1.jpg", image_about2="about/2.jpg", end_about="e",
+            title_catalog="c", review="r", description_review="d", text_footer="f",
+        )
+
+    def _get(self, host="shop.example", **headers):
+        return self.client.get(self.URL, headers={"host": host, **headers})
+
+    def test_process_memory_then_shared_cache(self):
+        with self.assertNumQueries(1):
+            first = self._get()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get().content, first.content)
+
+        # память процесса истекла — тело из общего кэша, без БД
+        for key, (expires, payload) in list(settings_cache._local.items()):
+            settings_cache._local[key] = (0, payload)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get().content, first.content)
+
+        self.assertEqual(self._get(if_none_match=first["ETag"]).status_code, 304)
+
+    def test_save_invalidates_both_levels(self):
+        first = self._get()
+        self.obj.title_banner = "Новый баннер"
+        self.obj.save()
+
+        second = self._get()
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()[0]["title_banner"], "Новый баннер")
+
+    def test_unknown_hosts_share_one_entry(self):
+        for n in range(5):
+            response = self._get(host=f"evil{n}.example")
+            self.assertEqual(response.json()[0]["image_banner"], "http://shop.example/media/settings/banner.jpg")
+        self.assertEqual(len(settings_cache._local), 1)
+
+    @override_settings(SITE_SETTINGS_HOSTS=None, ALLOWED_HOSTS=["*"])
+    def test_without_configured_hosts_links_follow_request_host(self):
+        first = self._get(host="shop.example")
+        self.assertEqual(first.json()[0]["image_banner"], "http://shop.example/media/settings/banner.jpg")
+        with self.assertNumQueries(0):
+            second = self._get(host="cdn.example:8000")
+        self.assertEqual(second.json()[0]["image_banner"], "http://cdn.example:8000/media/settings/banner.jpg")
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        # одно тело на все хосты
+        self.assertEqual(len(settings_cache._local), 1)
+        self.assertEqual(self._get(host="shop.example", if_none_match=first["ETag"]).status_code, 304)
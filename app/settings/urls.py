@@ -2,12 +2,13 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from app.settings.views import SettingsAPI
+from app.settings import async_views
 
 router = DefaultRouter()
 router.register("settings", SettingsAPI, basename='settings')
 
 urlpatterns = [
-    
+    path("async/settings/", async_views.settings_list, name="async-settings-list"),
 ]
 
 urlpatterns += router.urls
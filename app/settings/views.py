@@ -1,13 +1,38 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import ListModelMixin
 from rest_framework import permissions
 
+from app.settings.cache import get_settings_payload
 from app.settings.models import Settings
 from app.settings.serializers import SettingsSerailizer
 
+
+def settings_response(request, payload):
+    """Ответ из закэшированного тела: 304, если клиент прислал актуальный ETag/дату."""
+    last_modified = int(payload["last_modified"]) if payload["last_modified"] else None
+    response = get_conditional_response(
+        request, etag=payload["etag"], last_modified=last_modified
+    )
+    if response is None:
+        response = HttpResponse(payload["body"], content_type="application/json")
+    response["ETag"] = payload["etag"]
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, "SITE_SETTINGS_MAX_AGE", 60)
+    )
+    return response
+
+
 class SettingsAPI(GenericViewSet,
                     ListModelMixin):
     queryset = Settings.objects.all()
     serializer_class = SettingsSerailizer
-    permission_classes = [permissions.AllowAny]
\ No newline at end of file
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        return settings_response(request, get_settings_payload(request))
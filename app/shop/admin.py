@@ -1,13 +1,70 @@
 from django.contrib import admin
-from app.shop.models import Product, Order, ProductImage, Reviews, Report, Category, CheckoutOrder, CheckoutItem, Visit, Contact
+from app.shop.models import (
+    Product, Order, ProductImage, Reviews, Report, Category, CheckoutOrder, CheckoutItem, Visit, Contact,
+    VisitHourlyStat, VisitDailyStat, SalesDay, TelegramOutbox, IdempotencyRecord,
+)
 from django.utils.html import format_html
 from django.db.models import Sum, Count
 from datetime import timedelta, datetime
 from django.utils import timezone
+from app.shop.cache import bump_catalog_version
+from app.shop.exports import EXPORTS, export_response
+from app.shop.importer import detect_format, import_products
+from django import forms
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
-admin.site.register(Category)
 admin.site.register(Contact)
 
+
+class CatalogCacheAdminMixin:
+    """Сбрасывает кэш каталога после любых правок из админки."""
+
+    def save_model(self, request, obj, form, change):
+        # list_editable сохраняет только через save_model, без save_related
+        super().save_model(request, obj, form, change)
+        bump_catalog_version()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        bump_catalog_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_catalog_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(label="Файл CSV или JSONL")
+    create_categories = forms.BooleanField(label="Создавать отсутствующие категории", required=False)
+
+
+class ExportAdminMixin:
+    """Выгрузка отмеченных (или всех отфильтрованных) строк потоком, без пагинации."""
+
+    export_name = None
+    actions = ["export_csv", "export_jsonl"]
+
+    @admin.action(description="Выгрузить в CSV")
+    def export_csv(self, request, queryset):
+        return export_response(EXPORTS[self.export_name], "csv", queryset)
+
+    @admin.action(description="Выгрузить в JSONL")
+    def export_jsonl(self, request, queryset):
+        return export_response(EXPORTS[self.export_name], "jsonl", queryset)
+
+
+@admin.register(Category)
+class CategoryAdmin(CatalogCacheAdminMixin, admin.ModelAdmin):
+    pass
+
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1  
@@ -18,25 +75,65 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "price", "stock")      
+class ProductAdmin(CatalogCacheAdminMixin, admin.ModelAdmin):
+    change_list_template = "admin/shop/product/change_list.html"
+    list_display = ("id", "name", "sku", "price", "stock")      
     list_editable = ("price", "stock")                   
-    search_fields = ("name",)
+    search_fields = ("name", "sku")
     inlines = [ProductImageInline]                    
     list_per_page = 20                              
     ordering = ("id",)
     fieldsets = (
         ("Основная информация", {
-            "fields": ("name", "description", 'category', 'rating', 'is_favorites')
+            "fields": ("name", "sku", "description", 'category', 'rating', 'is_favorites')
         }),
         ("Цены и наличие", {
             "fields": ("price", "stock")
         }),
+        ("Рейтинг по отзывам", {
+            "fields": ("rating_avg", "rating_count")
+        }),
     )
+    readonly_fields = ("rating_avg", "rating_count")
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="shop_product_import"),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect("admin:shop_product_changelist")
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            result = import_products(
+                upload.file,
+                detect_format(upload.name),
+                create_categories=form.cleaned_data["create_categories"],
+            )
+            self.message_user(
+                request,
+                f"Создано: {result.created}, обновлено: {result.updated}, картинок: {result.images}",
+                messages.SUCCESS,
+            )
+            for error in result.errors[:20]:
+                self.message_user(request, str(error), messages.WARNING)
+            if len(result.errors) > 20:
+                self.message_user(request, f"... и ещё ошибок: {len(result.errors) - 20}", messages.WARNING)
+            return redirect("admin:shop_product_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Импорт товаров",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/shop/product/import.html", context)
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportAdminMixin, admin.ModelAdmin):
+    export_name = "orders"
     list_display = ("id", "product", "quantity", "created_at")
     list_filter = ("created_at",)
     search_fields = ("product__name",)
@@ -45,16 +142,18 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(Reviews)
 class ReviewsAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "name", "email", "rating_stars", "is_active")
+    list_display = ("id", "title", "product", "name", "email", "rating_stars", "is_active")
     list_editable = ("is_active",)
-    search_fields = ("title", "name", "email")
+    list_select_related = ("product",)
+    search_fields = ("title", "name", "email", "product__name")
     list_filter = ("is_active", "rating")
+    raw_id_fields = ("product",)
     ordering = ("-id",)
     list_per_page = 20
 
     fieldsets = (
         ("Информация об отзыве", {
-            "fields": ("title", "name", "email", "description", "rating")
+            "fields": ("product", "title", "name", "email", "description", "rating")
         }),
         ("Статус", {
             "fields": ("is_active",)
@@ -70,8 +169,8 @@ class ReviewsAdmin(admin.ModelAdmin):
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ("report_type", "total_orders", "total_revenue", "created_at")
-    readonly_fields = ("report_type", "total_orders", "total_revenue", "created_at")
+    list_display = ("report_type", "period_start", "period_end", "total_orders", "total_revenue", "created_at")
+    readonly_fields = ("report_type", "period_start", "period_end", "total_orders", "total_revenue", "created_at")
 
     def has_add_permission(self, request):
         return False
@@ -82,13 +181,25 @@ class ReportAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False  
 
+@admin.register(SalesDay)
+class SalesDayAdmin(admin.ModelAdmin):
+    list_display = ("date", "orders", "orders_revenue", "checkout_orders", "checkout_revenue")
+    readonly_fields = ("date", "orders", "orders_revenue", "checkout_orders", "checkout_revenue", "updated_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 class CheckoutItemInline(admin.TabularInline):
     model = CheckoutItem
     extra = 0
     readonly_fields = ("product", "quantity", "price", "line_total")
 
 @admin.register(CheckoutOrder)
-class CheckoutOrderAdmin(admin.ModelAdmin):
+class CheckoutOrderAdmin(ExportAdminMixin, admin.ModelAdmin):
+    export_name = "checkout_orders"
     list_display = ("id", "first_name", "phone", "delivery_type", "total", "delivery_datetime", "created_at")
     list_filter = ("delivery_type", "created_at")
     search_fields = ("first_name", "last_name", "email", "phone", "city", "address")
@@ -98,4 +209,52 @@ class CheckoutOrderAdmin(admin.ModelAdmin):
     )
     inlines = [CheckoutItemInline]
 
-admin.site.register(Visit)
\ No newline at end of file
+@admin.register(TelegramOutbox)
+class TelegramOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "chat_id", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("chat_id", "text", "parse_mode", "attempts", "last_error", "created_at", "sent_at")
+    fields = ("status", "next_attempt_at") + readonly_fields
+    list_per_page = 20
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ("key", "status_code", "order", "created_at")
+    list_filter = ("status_code",)
+    search_fields = ("key",)
+    readonly_fields = ("key", "fingerprint", "status_code", "response", "order", "created_at")
+    raw_id_fields = ("order",)
+    list_per_page = 20
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Visit)
+class VisitAdmin(ExportAdminMixin, admin.ModelAdmin):
+    export_name = "visits"
+    list_display = ("visitor_id", "ip", "started_at")
+    list_filter = ("started_at",)
+    search_fields = ("visitor_id",)
+    list_per_page = 20
+    show_full_result_count = False
+
+
+class VisitStatAdmin(admin.ModelAdmin):
+    list_display = ("period_start", "visits", "unique_visitors", "updated_at")
+    readonly_fields = ("period_start", "visits", "unique_visitors", "top_user_agents", "updated_at")
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(VisitHourlyStat, VisitStatAdmin)
+admin.site.register(VisitDailyStat, VisitStatAdmin)
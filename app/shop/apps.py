@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.shop'
+
+    def ready(self):
+        from app.shop import search, signals  # noqa: F401 — подключают обработчики сигналов
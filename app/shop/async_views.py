@@ -0,0 +1,152 @@
+"""
+ASGI-представления только для чтения: каталог, карточка товара, отзывы.
+Работают через async ORM и не занимают поток на время ожидания клиента.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from app.analytics.metrics import record_cache
+from app.shop.cache import aproduct_list_cache_key, acache_get_bytes, acache_set_bytes, acatalog_fill_reads, PRODUCT_LIST_TIMEOUT
+from app.shop.favorites import aget_favorites, overlay_favorites
+from app.shop.filters import ProductFilter, search_products
+from app.shop.models import Product, Reviews
+from app.shop.pagination import ShopPagination
+from app.shop.search import get_search_backend
+from app.shop.serializers import ProductSerializer, ReviewsSerializer
+
+# как ProductViewSet.ordering_fields
+ORDERING = {"price", "-price", "rating_avg", "-rating_avg", "rating_count", "-rating_count"}
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False),
+        content_type="application/json",
+        status=status,
+    )
+
+
+def _positive_int(value, default, cutoff=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if value < 1:
+        return default
+    return min(value, cutoff) if cutoff else value
+
+
+def _page_number(value, pages):
+    """Номер страницы как у ShopPagination: "last", иначе целое от 1 до pages; None — 404."""
+    if not value:
+        return 1
+    if value in ShopPagination.last_page_strings:
+        return pages
+    try:
+        page = int(value)
+    except ValueError:
+        return None
+    return page if 1 <= page <= pages else None
+
+
+async def _product_page(request):
+    filterset = ProductFilter(
+        request.GET,
+        queryset=Product.objects.select_related("category").prefetch_related("images"),
+    )
+    if not filterset.is_valid():
+        return None, json_response(filterset.errors, status=400)
+    queryset = filterset.qs
+
+    query = request.GET.get("search", "").strip()
+    if query:
+        backend = get_search_backend()
+        if backend is not None:
+            queryset = await sync_to_async(search_products)(queryset, query, backend)
+        else:
+            queryset = queryset.filter(name__icontains=query)
+
+    # "price,-rating_avg" как у OrderingFilter: неизвестные поля отбрасываются
+    ordering = [field.strip() for field in request.GET.get("ordering", "").split(",")]
+    ordering = [field for field in ordering if field in ORDERING]
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+
+    size = _positive_int(
+        request.GET.get(ShopPagination.page_size_query_param),
+        ShopPagination.page_size,
+        cutoff=ShopPagination.max_page_size,
+    )
+    count = await queryset.acount()
+    page = _page_number(request.GET.get("page"), max(1, -(-count // size)))
+    if page is None:
+        return None, json_response({"detail": str(ShopPagination.invalid_page_message)}, status=404)
+    offset = (page - 1) * size
+
+    products = [product async for product in queryset[offset:offset + size]]
+    # страница общая для всех и кэшируется; избранное накладывает product_list
+    results = ProductSerializer(
+        products, many=True, context={"request": request, "favorites": frozenset()}
+    ).data
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, "page", page + 1) if offset + size < count else None
+    if page <= 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, "page")
+    else:
+        previous_url = replace_query_param(url, "page", page - 1)
+
+    return {"count": count, "next": next_url, "previous": previous_url, "results": results}, None
+
+
+@require_GET
+async def product_list(request):
+    cache_key = await aproduct_list_cache_key(request.GET)
+    body = await acache_get_bytes(cache_key)
+    record_cache("products_list_json", body is not None)
+    if body is None:
+        with await acatalog_fill_reads():
+            data, error = await _product_page(request)
+        if error is not None:
+            return error
+        body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+        await acache_set_bytes(cache_key, body, PRODUCT_LIST_TIMEOUT)
+
+    favorites = await aget_favorites(request)
+    if favorites:
+        # без избранного (большинство запросов) отдаём закэшированные байты как есть
+        data = json.loads(body)
+        overlay_favorites(data["results"], favorites)
+        return json_response(data)
+    return HttpResponse(body, content_type="application/json")
+
+
+@require_GET
+async def product_detail(request, pk):
+    try:
+        product = await (
+            Product.objects.select_related("category").prefetch_related("images").aget(pk=pk)
+        )
+    except Product.DoesNotExist:
+        return json_response({"detail": "No Product matches the given query."}, status=404)
+    favorites = await aget_favorites(request)
+    return json_response(
+        ProductSerializer(product, context={"request": request, "favorites": favorites}).data
+    )
+
+
+@require_GET
+async def reviews_list(request):
+    queryset = Reviews.objects.filter(is_active=True)
+    product = request.GET.get("product")
+    if product and product.isdigit():
+        queryset = queryset.filter(product_id=product)
+    reviews = [review async for review in queryset.aiterator()]
+    return json_response(ReviewsSerializer(reviews, many=True).data)
@@ -0,0 +1,39 @@
+import math
+import time
+from contextlib import contextmanager
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """Сводка по списку длительностей (секунды) за общее время elapsed."""
+    count = len(latencies)
+    return {
+        "requests": count,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def format_summary(name, summary):
+    return (
+        f"{name}: {summary['requests']} запросов, {summary['throughput']:.1f} req/s, "
+        f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms"
+    )
+
+
+@contextmanager
+def timed(latencies):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        latencies.append(time.perf_counter() - started)
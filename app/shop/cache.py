@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+import weakref
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+from app.shop.filters import ProductFilter
+from core.routers import primary_reads
+
+CATALOG_VERSION_KEY = "catalog:version"
+# пока ключ жив, реплика может не догнать правку — выдачу заполняем с основной БД
+CATALOG_PRIMARY_KEY = "catalog:primary"
+PRODUCT_LIST_TIMEOUT = 60
+
+# Параметры запроса, которые влияют на выдачу каталога. Всё остальное
+# (utm-метки, cache-busters и т.п.) в ключ не попадает.
+PRODUCT_LIST_PARAMS = frozenset(ProductFilter.base_filters) | {
+    "search", "ordering", "page", "page_size", "cursor",
+}
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Инвалидирует все закэшированные выдачи каталога разом."""
+    # до новой версии: иначе первый промах успеет закэшировать её с отстающей реплики
+    cache.set(CATALOG_PRIMARY_KEY, 1, timeout=getattr(settings, "REPLICA_PIN_SECONDS", 5))
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def catalog_fill_reads():
+    """Контекст заполнения кэша выдачи: сразу после правки каталога — чтение с основной БД."""
+    return primary_reads() if cache.get(CATALOG_PRIMARY_KEY) else nullcontext()
+
+
+def _query_digest(query_params, params):
+    normalized = [
+        (name, sorted(v.strip() for v in query_params.getlist(name)))
+        for name in sorted(set(query_params) & params)
+    ]
+    return hashlib.md5(
+        json.dumps(normalized, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def _list_key(prefix, version, digest):
+    return "{prefix}:v{version}:{lang}:{digest}".format(
+        prefix=prefix,
+        version=version,
+        lang=translation.get_language() or "",
+        digest=digest,
+    )
+
+
+def product_list_cache_key(query_params, params=PRODUCT_LIST_PARAMS, prefix="products_list"):
+    return _list_key(prefix, get_catalog_version(), _query_digest(query_params, params))
+
+
+# --- async-доступ для ASGI-представлений -------------------------------------
+# BaseCache.aget() у django_redis — это sync_to_async поверх синхронного
+# клиента, поэтому при Redis-кэше ходим в него напрямую через redis.asyncio.
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _uses_redis():
+    return settings.CACHES["default"]["BACKEND"].startswith("django_redis")
+
+
+def async_redis():
+    """Клиент redis.asyncio, привязанный к текущему event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from redis import asyncio as aioredis
+
+        client = aioredis.from_url(settings.CACHES["default"]["LOCATION"])
+        _async_clients[loop] = client
+    return client
+
+
+async def aget_catalog_version():
+    if _uses_redis():
+        value = await async_redis().get(cache.make_key(CATALOG_VERSION_KEY))
+        if value is not None:
+            return int(value)
+    return await sync_to_async(get_catalog_version)()
+
+
+async def aproduct_list_cache_key(query_params, params=PRODUCT_LIST_PARAMS, prefix="products_list_json"):
+    return _list_key(prefix, await aget_catalog_version(), _query_digest(query_params, params))
+
+
+async def acatalog_fill_reads():
+    if _uses_redis():
+        fresh = await async_redis().get(cache.make_key(CATALOG_PRIMARY_KEY))
+    else:
+        fresh = await cache.aget(CATALOG_PRIMARY_KEY)
+    return primary_reads() if fresh else nullcontext()
+
+
+async def acache_get_bytes(key):
+    if _uses_redis():
+        return await async_redis().get(cache.make_key(key))
+    return await cache.aget(key)
+
+
+async def acache_set_bytes(key, value, timeout):
+    if _uses_redis():
+        await async_redis().set(cache.make_key(key), value, ex=timeout)
+    else:
+        await cache.aset(key, value, timeout)
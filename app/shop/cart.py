@@ -0,0 +1,203 @@
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from app.shop.models import CartItem, Product
+
+logger = logging.getLogger(__name__)
+
+CART_TTL = getattr(settings, "CART_TTL", 60 * 60 * 24 * 30)
+
+# корзины, изменённые в БД, пока Redis был недоступен (в этом процессе)
+_pending_lock = threading.Lock()
+_pending = set()
+
+
+def _mark_pending(key):
+    with _pending_lock:
+        _pending.add(key)
+
+
+class DatabaseCartStore:
+    """Корзина в таблице CartItem: одна строка на товар, обновления через F()."""
+
+    def _live(self, key):
+        return CartItem.objects.filter(
+            cart_key=key, updated_at__gte=timezone.now() - timedelta(seconds=CART_TTL)
+        )
+
+    def items(self, key):
+        return dict(self._live(key).values_list("product_id", "quantity"))
+
+    def add(self, key, product_id, delta=1):
+        now = timezone.now()
+        # просроченная строка ещё не удалена purge_expired — считаем с нуля
+        quantity = Case(
+            When(updated_at__lt=now - timedelta(seconds=CART_TTL), then=Value(delta)),
+            default=F("quantity") + delta,
+        )
+        row = CartItem.objects.filter(cart_key=key, product_id=product_id)
+        if row.update(quantity=quantity, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart_key=key, product_id=product_id, quantity=delta)
+        except IntegrityError:
+            # параллельный запрос успел создать строку; если нет — товара нет в каталоге
+            if not row.update(quantity=quantity, updated_at=now):
+                raise
+
+    def decrement(self, key, product_id):
+        row = CartItem.objects.filter(cart_key=key, product_id=product_id)
+        row.filter(
+            Q(quantity__lte=1) | Q(updated_at__lt=timezone.now() - timedelta(seconds=CART_TTL))
+        ).delete()
+        row.update(quantity=F("quantity") - 1, updated_at=timezone.now())
+
+    def remove(self, key, product_id):
+        CartItem.objects.filter(cart_key=key, product_id=product_id).delete()
+
+    def clear(self, key):
+        CartItem.objects.filter(cart_key=key).delete()
+
+    @staticmethod
+    def purge_expired():
+        return CartItem.objects.filter(
+            updated_at__lt=timezone.now() - timedelta(seconds=CART_TTL)
+        ).delete()[0]
+
+
+class RedisCartStore:
+    """Корзина в Redis-хэше cart:<key> {product_id: quantity} с TTL."""
+
+    prefix = "cart:"
+
+    def __init__(self, client, fallback=None):
+        self.client = client
+        self.fallback = fallback or DatabaseCartStore()
+
+    def _call(self, method, key, *args):
+        from redis.exceptions import RedisError
+
+        try:
+            self._adopt_pending()
+            return getattr(self, f"_{method}")(self.prefix + key, *args)
+        except RedisError:
+            logger.warning("Redis недоступен, корзина %s обслуживается из БД", key)
+            result = getattr(self.fallback, method)(key, *args)
+            if method != "items":
+                _mark_pending(key)
+            return result
+
+    def items(self, key):
+        return self._call("items", key)
+
+    def add(self, key, product_id, delta=1):
+        return self._call("add", key, product_id, delta)
+
+    def decrement(self, key, product_id):
+        return self._call("decrement", key, product_id)
+
+    def remove(self, key, product_id):
+        return self._call("remove", key, product_id)
+
+    def clear(self, key):
+        return self._call("clear", key)
+
+    def _adopt_pending(self):
+        """
+        Пока Redis работал без сбоев, набор пуст и в БД не ходим. После сбоя
+        первый удачный вызов переносит все корзины, записанные этим процессом в БД.
+        """
+        while _pending:
+            with _pending_lock:
+                if not _pending:
+                    return
+                key = _pending.pop()
+            try:
+                self._adopt(self.prefix + key, key)
+            except Exception:
+                _mark_pending(key)
+                raise
+
+    def _adopt(self, name, key):
+        """
+        Позиции, записанные в БД, пока Redis был недоступен, переносятся в хэш —
+        иначе после восстановления Redis корзина «пропадает». Строка удаляется
+        до HINCRBY, поэтому параллельный запрос не перенесёт её второй раз;
+        ошибка Redis откатывает удаление.
+        """
+        rows = list(self.fallback._live(key).values_list("pk", "product_id", "quantity"))
+        if not rows:
+            return
+        with transaction.atomic():
+            pipe = self.client.pipeline()
+            for pk, product_id, quantity in rows:
+                if CartItem.objects.filter(pk=pk).delete()[0]:
+                    pipe.hincrby(name, product_id, quantity)
+            pipe.expire(name, CART_TTL)
+            pipe.execute()
+
+    def _items(self, name):
+        return {int(pid): int(qty) for pid, qty in self.client.hgetall(name).items()}
+
+    def _add(self, name, product_id, delta):
+        pipe = self.client.pipeline()
+        pipe.hincrby(name, product_id, delta)
+        pipe.expire(name, CART_TTL)
+        pipe.execute()
+
+    def _decrement(self, name, product_id):
+        if self.client.hincrby(name, product_id, -1) <= 0:
+            self.client.hdel(name, product_id)
+
+    def _remove(self, name, product_id):
+        self.client.hdel(name, product_id)
+
+    def _clear(self, name):
+        self.client.delete(name)
+
+
+def get_cart_store():
+    """Redis, если кэш на django_redis и не задано CART_BACKEND = "db"."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if getattr(settings, "CART_BACKEND", "redis") == "redis" and backend.startswith("django_redis"):
+        from django_redis import get_redis_connection
+
+        return RedisCartStore(get_redis_connection("default"))
+    return DatabaseCartStore()
+
+
+def get_cart_key(request):
+    visitor_id = getattr(request, "visitor_id", None)
+    if visitor_id:
+        return visitor_id
+    if not request.session.session_key:
+        request.session.save()
+    return request.session.session_key
+
+
+def cart_summary(quantities):
+    """Цены и названия подтягиваются одним запросом на момент показа корзины."""
+    products = Product.objects.filter(id__in=quantities).only("id", "name", "price")
+    items = {}
+    total = Decimal("0")
+    for product in products:
+        qty = quantities[product.id]
+        items[str(product.id)] = {
+            "name": product.name,
+            "price": float(product.price),
+            "quantity": qty,
+        }
+        total += product.price * qty
+    return {
+        "items": items,
+        "total_price": round(float(total), 2),
+        "total_items": sum(item["quantity"] for item in items.values()),
+    }
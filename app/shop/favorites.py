@@ -0,0 +1,23 @@
+"""
+Избранное — персональный слой поверх общей выдачи каталога.
+
+Каталог кэшируется один раз для всех с is_favorites=False, а флаги из сессии
+проставляются уже при ответе (overlay_favorites). Фронтенд может и сам
+брать id избранного с favorites/ids/ и не зависеть от флага в выдаче.
+"""
+SESSION_KEY = "favorites"
+
+
+def get_favorites(request):
+    return set(request.session.get(SESSION_KEY, []))
+
+
+async def aget_favorites(request):
+    return set(await request.session.aget(SESSION_KEY, []))
+
+
+def overlay_favorites(results, favorites):
+    """Проставляет is_favorites в сериализованных товарах; results меняется на месте."""
+    for item in results:
+        item["is_favorites"] = item["id"] in favorites
+    return results
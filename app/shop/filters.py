@@ -1,5 +1,9 @@
 import django_filters
+from django.db.models import Case, When, IntegerField
+from rest_framework import filters
+
 from app.shop.models import Product
+from app.shop.search import get_search_backend
 
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
@@ -10,3 +14,26 @@ class ProductFilter(django_filters.FilterSet):
     class Meta:
         model = Product
         fields = ['name', 'price', 'stock']  # только реальные поля модели
+
+
+def search_products(queryset, query, backend):
+    """Фильтрует queryset по индексу и сортирует по релевантности."""
+    ids = backend.search(query)
+    queryset = queryset.filter(id__in=ids)
+    if ids:
+        queryset = queryset.order_by(
+            Case(*[When(id=pk, then=pos) for pos, pk in enumerate(ids)], output_field=IntegerField())
+        )
+    return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """?search= через полнотекстовый индекс; без индекса — обычный SearchFilter."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        backend = get_search_backend()
+        if not query or backend is None:
+            return super().filter_queryset(request, queryset, view)
+        # по умолчанию — порядок релевантности; ?ordering= его перекроет
+        return search_products(queryset, query, backend)
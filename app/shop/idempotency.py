@@ -0,0 +1,164 @@
+"""
+Idempotency-Key для POST checkout/.
+
+Повтор оформления с тем же заголовком (двойной клик, ретрай клиента или
+прокси после таймаута) не создаёт второй заказ, а получает первый ответ.
+Первый запрос берёт блокировку в кэше и оформляет заказ; ответ пишется в
+IdempotencyRecord в той же транзакции, что и заказ, и копируется в кэш на
+IDEMPOTENCY_TTL. Повтор после этого отдаётся из кэша без запросов к БД.
+Повтор, пришедший, пока первый ещё выполняется, ждёт его ответа до
+IDEMPOTENCY_WAIT секунд, затем 409.
+
+Ключ действует в пределах корзины посетителя; тот же ключ с другим телом
+запроса — 422. Ошибки (400) не сохраняются: исправив данные, можно повторить
+с тем же ключом. Без Redis блокировки нет — тогда дубль ловит уникальный
+ключ в БД, и второй заказ откатывается вместе со своей записью.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from app.shop.models import IdempotencyRecord
+from core.sessions import CACHE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+RESULT_KEY = "idempotency:{}"
+LOCK_KEY = "idempotency:{}:lock"
+POLL_INTERVAL = 0.05
+
+
+class IdempotencyError(Exception):
+    def __init__(self, detail, status):
+        super().__init__(detail)
+        self.status = status
+
+
+def _ttl():
+    return getattr(settings, "IDEMPOTENCY_TTL", 60 * 60 * 24)
+
+
+def scoped_key(cart_key, key):
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f"{HEADER} должен быть непустой строкой до {MAX_KEY_LENGTH} символов.", 400)
+    return hashlib.sha256(f"{cart_key}:{key}".encode()).hexdigest()
+
+
+def request_fingerprint(data):
+    if hasattr(data, "lists"):  # QueryDict из формы
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cached(key):
+    try:
+        return cache.get(RESULT_KEY.format(key))
+    except CACHE_ERRORS:
+        return None
+
+
+def _remember(key, result):
+    try:
+        cache.set(RESULT_KEY.format(key), result, timeout=_ttl())
+    except CACHE_ERRORS:
+        logger.warning("Кэш недоступен, ответ по ключу %s остался только в БД", key)
+
+
+def _acquire(key):
+    try:
+        return cache.add(LOCK_KEY.format(key), 1, timeout=getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60))
+    except CACHE_ERRORS:
+        # без кэша параллельные дубли разведёт уникальный ключ в БД
+        return True
+
+
+def _release(key):
+    try:
+        cache.delete(LOCK_KEY.format(key))
+    except CACHE_ERRORS:
+        pass
+
+
+def load_result(key):
+    """(fingerprint, status_code, body) из кэша, иначе из БД (и обратно в кэш)."""
+    result = _cached(key)
+    if result is not None:
+        return result
+    row = (
+        IdempotencyRecord.objects
+        .filter(key=key, created_at__gte=timezone.now() - timedelta(seconds=_ttl()))
+        .values_list("fingerprint", "status_code", "response")
+        .first()
+    )
+    if row is not None:
+        result = tuple(row)
+        _remember(key, result)
+    return result
+
+
+def _replay(result, fingerprint):
+    stored_fingerprint, status_code, body = result
+    if stored_fingerprint != fingerprint:
+        raise IdempotencyError(f"{HEADER} уже использован с другими данными заказа.", 422)
+    return status_code, body, True
+
+
+def idempotent(key, fingerprint, create):
+    """
+    create() -> (order, body) оформляет заказ; ValidationError пробрасывается
+    и ничего не сохраняет. Возвращает (status_code, body, replayed).
+    """
+    deadline = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT", 10)
+    while True:
+        # пока первый запрос держит блокировку, опрашиваем только кэш
+        result = _cached(key)
+        if result is not None:
+            return _replay(result, fingerprint)
+        if _acquire(key):
+            break
+        if time.monotonic() >= deadline:
+            raise IdempotencyError("Запрос с этим ключом ещё обрабатывается, повторите позже.", 409)
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        # ответ мог вытесниться из кэша или прийти между проверкой и блокировкой
+        result = load_result(key)
+        if result is not None:
+            return _replay(result, fingerprint)
+        try:
+            with transaction.atomic():
+                # просроченная, но ещё не вычищенная запись не должна занимать ключ
+                IdempotencyRecord.objects.filter(
+                    key=key, created_at__lt=timezone.now() - timedelta(seconds=_ttl())
+                ).delete()
+                order, body = create()
+                IdempotencyRecord.objects.create(
+                    key=key, fingerprint=fingerprint, status_code=201, response=body, order=order
+                )
+        except IntegrityError:
+            # кэш недоступен и параллельный дубль закоммитил первым: наш заказ откатился
+            result = load_result(key)
+            if result is None:
+                raise
+            return _replay(result, fingerprint)
+        _remember(key, (fingerprint, 201, body))
+        return 201, body, False
+    finally:
+        _release(key)
+
+
+def purge_expired():
+    return IdempotencyRecord.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=_ttl())
+    ).delete()[0]
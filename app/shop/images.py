@@ -0,0 +1,119 @@
+"""
+Уменьшенные копии фотографий товаров: фиксированные ширины в WebP/AVIF
+и JPEG для старых браузеров. Генерируются Celery-задачей после сохранения
+ProductImage, в сериализаторе отдаются списком srcset.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from app.shop.models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = getattr(settings, "PRODUCT_IMAGE_WIDTHS", (320, 640, 1280))
+VARIANT_FORMATS = getattr(settings, "PRODUCT_IMAGE_FORMATS", ("webp", "jpeg"))
+VARIANT_QUALITY = getattr(settings, "PRODUCT_IMAGE_QUALITY", 80)
+VARIANT_ROOT = "products/variants"
+
+EXTENSIONS = {"webp": "webp", "avif": "avif", "jpeg": "jpg"}
+MIME_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+
+
+def supported_formats():
+    """Форматы из PRODUCT_IMAGE_FORMATS, которые умеет кодировать текущая сборка Pillow."""
+    return [fmt for fmt in VARIANT_FORMATS if fmt == "jpeg" or features.check(fmt)]
+
+
+def variant_dir(image_id):
+    return f"{VARIANT_ROOT}/{image_id}"
+
+
+def _encode(img, fmt):
+    buffer = BytesIO()
+    if fmt == "jpeg":
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(buffer, "JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(buffer, fmt.upper(), quality=VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def delete_variants(variants):
+    for variant in variants or []:
+        try:
+            default_storage.delete(variant["name"])
+        except Exception:
+            logger.warning("Не удалось удалить %s", variant.get("name"))
+
+
+def build_variants(product_image):
+    """
+    Режет оригинал на ширины VARIANT_WIDTHS (не больше исходной) и сохраняет
+    копии в products/variants/<id>/. Возвращает (width, height, variants).
+    """
+    with product_image.image.open("rb") as f:
+        original = Image.open(f)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    width, height = original.size
+    if original.mode not in ("RGB", "RGBA", "L"):
+        original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+
+    stem = posixpath.splitext(posixpath.basename(product_image.image.name))[0]
+    widths = sorted({w for w in VARIANT_WIDTHS if w < width} | {min(width, max(VARIANT_WIDTHS))})
+    variants = []
+    for target in widths:
+        target_height = max(1, round(height * target / width))
+        resized = original if target == width else original.resize(
+            (target, target_height), Image.Resampling.LANCZOS
+        )
+        for fmt in supported_formats():
+            name = f"{variant_dir(product_image.pk)}/{stem}-{target}w.{EXTENSIONS[fmt]}"
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(_encode(resized, fmt)))
+            variants.append({
+                "name": name,
+                "width": target,
+                "height": target_height,
+                "format": fmt,
+            })
+    return width, height, variants
+
+
+def generate_variants(image_id):
+    """Пересоздаёт копии одной картинки; update() не вызывает post_save повторно."""
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None or not product_image.image:
+        return None
+
+    old_variants = product_image.variants
+    width, height, variants = build_variants(product_image)
+    new_names = {v["name"] for v in variants}
+    delete_variants([v for v in old_variants or [] if v.get("name") not in new_names])
+
+    ProductImage.objects.filter(pk=image_id).update(width=width, height=height, variants=variants)
+    return variants
+
+
+def srcset(variants, build_url):
+    """[{url, width, height, type}] от меньшей ширины к большей, лучшие форматы первыми."""
+    order = {fmt: i for i, fmt in enumerate(VARIANT_FORMATS)}
+    result = sorted(variants or [], key=lambda v: (order.get(v["format"], len(order)), v["width"]))
+    return [
+        {
+            "url": build_url(default_storage.url(v["name"])),
+            "width": v["width"],
+            "height": v["height"],
+            "type": MIME_TYPES.get(v["format"], ""),
+        }
+        for v in result
+    ]
@@ -0,0 +1,265 @@
+"""
+Импорт товаров из CSV/JSONL пачками: upsert по артикулу (sku), без артикула —
+по названию. Ошибки копятся построчно, остальные строки импортируются.
+
+Колонки: sku, name, description, price, stock, rating, category, images.
+В CSV картинки перечисляются через "|", в JSONL — списком; пути относительно
+MEDIA_ROOT (products/foo.jpg), файлы должны уже лежать в хранилище.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from app.shop.cache import bump_catalog_version
+from app.shop.models import Category, Product, ProductImage
+from app.shop.search import get_search_backend
+
+IMPORT_BATCH_SIZE = 1000
+UPDATE_FIELDS = ["name", "description", "price", "stock", "rating", "category"]
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+    def __str__(self):
+        return f"строка {self.line}: {self.message}"
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    images: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return self.created + self.updated
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream, fmt):
+    """(номер строки, dict) из текстового потока; битый JSON — dict с ключом __error__."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {"__error__": f"некорректный JSON: {e}"}
+        if not isinstance(row, dict):
+            row = {"__error__": "ожидался JSON-объект"}
+        yield line_no, row
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _images(value):
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        value = value.split("|")
+    return [str(path).strip().lstrip("/") for path in value if str(path).strip()]
+
+
+class ProductImporter:
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, create_categories=False, dry_run=False):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self._categories = None
+        self._imported_ids = []
+
+    def run(self, rows):
+        # все категории одним запросом: справочник маленький
+        self._categories = {c.name.strip().lower(): c for c in Category.objects.all()}
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._process(batch)
+                batch = []
+        if batch:
+            self._process(batch)
+
+        if self._imported_ids and not self.dry_run:
+            self._reindex()
+            bump_catalog_version()
+        return self.result
+
+    def _error(self, line, message):
+        self.result.errors.append(RowError(line, message))
+
+    def _clean(self, line, row):
+        if "__error__" in row:
+            return self._error(line, row["__error__"])
+
+        name = _text(row, "name")
+        sku = _text(row, "sku") or None
+        if not name:
+            return self._error(line, "не указано название")
+        if len(name) > 255:
+            return self._error(line, "название длиннее 255 символов")
+        if sku and len(sku) > 64:
+            return self._error(line, "артикул длиннее 64 символов")
+
+        try:
+            price = Decimal(_text(row, "price").replace(",", "."))
+        except InvalidOperation:
+            return self._error(line, f"некорректная цена: {row.get('price')!r}")
+        if price < 0 or price >= Decimal("1e8"):
+            return self._error(line, f"цена вне диапазона: {price}")
+
+        try:
+            stock = int(_text(row, "stock") or 0)
+            rating = int(_text(row, "rating") or 5)
+        except ValueError:
+            return self._error(line, "остаток и оценка должны быть целыми числами")
+        if stock < 0:
+            return self._error(line, "отрицательный остаток")
+        if not 1 <= rating <= 5:
+            return self._error(line, "оценка должна быть от 1 до 5")
+
+        category_name = _text(row, "category")
+        category = None
+        if len(category_name) > 155:
+            return self._error(line, "название категории длиннее 155 символов")
+        if category_name:
+            category = self._categories.get(category_name.lower())
+            if category is None and not self.create_categories:
+                return self._error(line, f"нет категории «{category_name}»")
+
+        images = _images(row.get("images"))
+        missing = [path for path in images if not default_storage.exists(path)]
+        if missing:
+            return self._error(line, f"нет файлов: {', '.join(missing)}")
+
+        if category_name and category is None:
+            # новая категория — только для строки, прошедшей все проверки
+            category = Category(name=category_name)
+            self._categories[category_name.lower()] = category
+
+        product = Product(
+            sku=sku, name=name, description=_text(row, "description"),
+            price=price, stock=stock, rating=rating, category=category,
+        )
+        return product, images
+
+    def _process(self, batch):
+        by_sku, by_name = {}, {}
+        for line, row in batch:
+            cleaned = self._clean(line, row)
+            if cleaned is None:
+                continue
+            product = cleaned[0]
+            # повтор ключа внутри пачки — побеждает последняя строка
+            if product.sku:
+                by_sku[product.sku] = cleaned
+            else:
+                by_name[product.name] = cleaned
+        if self.dry_run or not (by_sku or by_name):
+            return
+
+        cleaned = list(by_sku.values()) + list(by_name.values())
+        with transaction.atomic():
+            # только категории товаров, которые будут записаны (повтор ключа мог вытеснить строку)
+            new_categories = {
+                id(product.category): product.category
+                for product, _ in cleaned
+                if product.category is not None and product.category.pk is None
+            }
+            if new_categories:
+                Category.objects.bulk_create(list(new_categories.values()))
+            for product, _ in cleaned:
+                product.category_id = product.category.pk if product.category else None
+
+            ids = self._upsert_by_sku(by_sku) + self._upsert_by_name(by_name)
+            self._attach_images([(product.pk, images) for product, images in cleaned])
+        self._imported_ids.extend(ids)
+
+    def _upsert_by_sku(self, by_sku):
+        if not by_sku:
+            return []
+        existing = set(Product.objects.filter(sku__in=by_sku).values_list("sku", flat=True))
+        Product.objects.bulk_create(
+            [product for product, _ in by_sku.values()],
+            update_conflicts=True,
+            unique_fields=["sku"],
+            update_fields=UPDATE_FIELDS,
+        )
+        # pk после upsert есть не на всех БД — перечитываем одним запросом
+        ids = dict(Product.objects.filter(sku__in=by_sku).values_list("sku", "id"))
+        for sku, (product, _) in by_sku.items():
+            product.pk = ids[sku]
+        self.result.created += len(by_sku) - len(existing)
+        self.result.updated += len(existing)
+        return list(ids.values())
+
+    def _upsert_by_name(self, by_name):
+        if not by_name:
+            return []
+        ids = {}
+        for pk, name in (
+            Product.objects.filter(name__in=by_name, sku__isnull=True).order_by("id").values_list("id", "name")
+        ):
+            ids.setdefault(name, pk)
+
+        to_update, to_create = [], []
+        for name, (product, _) in by_name.items():
+            if name in ids:
+                product.pk = ids[name]
+                to_update.append(product)
+            else:
+                to_create.append(product)
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+        Product.objects.bulk_create(to_create)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+        return [product.pk for product in to_update + to_create]
+
+    def _attach_images(self, product_images):
+        wanted = {(pk, path) for pk, paths in product_images for path in paths}
+        if not wanted:
+            return
+        existing = set(
+            ProductImage.objects.filter(product_id__in={pk for pk, _ in wanted}).values_list("product_id", "image")
+        )
+        new = [ProductImage(product_id=pk, image=path) for pk, path in sorted(wanted - existing)]
+        ProductImage.objects.bulk_create(new)
+        self.result.images += len(new)
+
+    def _reindex(self):
+        backend = get_search_backend()
+        if backend is None:
+            return
+        ids = sorted(set(self._imported_ids))
+        for start in range(0, len(ids), self.batch_size):
+            backend.index(
+                Product.objects.filter(id__in=ids[start:start + self.batch_size]).only("id", "name", "description")
+            )
+
+
+def import_products(stream, fmt, **options):
+    """Удобная обёртка: stream — текстовый или байтовый файл."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    return ProductImporter(**options).run(read_rows(stream, fmt))
@@ -0,0 +1,299 @@
+"""
+Нагрузочные сценарии магазина: синтетические данные (seed_perf_data)
+и прогон сценариев (loadtest) через тестовый клиент Django в процессе
+или по HTTP против запущенного сервера.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from app.shop.benchmarks import summarize
+from app.shop.pagination import ShopPagination
+from app.shop.ratings import rebuild_ratings
+from app.shop.models import (
+    Category, Product, Reviews, Visit, Order, CheckoutOrder, CheckoutItem,
+)
+
+PERF_PREFIX = "perf-"
+PERF_EMAIL = "perf@example.test"
+API_PREFIX = "/ru/api/v1/shop/"
+
+WORDS = [
+    "газонокосилка", "триммер", "пила", "насос", "культиватор", "генератор",
+    "мойка", "опрыскиватель", "секатор", "лопата", "шланг", "тачка",
+]
+
+
+def seed(products=10000, categories=20, reviews=2000, visits=100000, orders=5000, batch_size=2000, log=print):
+    """Синтетический каталог, отзывы, визиты и заказы; всё помечено префиксом perf-."""
+    rnd = random.Random(42)
+    now = timezone.now()
+
+    Category.objects.bulk_create(
+        Category(name=f"{PERF_PREFIX}category-{i}", is_active=True) for i in range(categories)
+    )
+    category_ids = list(
+        Category.objects.filter(name__startswith=PERF_PREFIX).values_list("id", flat=True)
+    )
+
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=f"{PERF_PREFIX}{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}",
+                description=f"<p>{' '.join(rnd.choices(WORDS, k=30))}</p>",
+                price=Decimal(rnd.randint(500, 150000)),
+                stock=10 ** 6,
+                rating=rnd.randint(1, 5),
+                category_id=rnd.choice(category_ids),
+            )
+            for i in range(start, min(start + batch_size, products))
+        )
+    log(f"товаров: {products}")
+    product_ids = perf_product_ids()
+
+    Reviews.objects.bulk_create(
+        (
+            Reviews(
+                product_id=rnd.choice(product_ids),
+                title=f"{PERF_PREFIX}review-{i}",
+                name="Perf",
+                description=" ".join(rnd.choices(WORDS, k=20)),
+                email=PERF_EMAIL,
+                rating=rnd.randint(1, 5),
+                is_active=rnd.random() < 0.8,
+            )
+            for i in range(reviews)
+        ),
+        batch_size=batch_size,
+    )
+    # bulk_create мимо сигналов — рейтинги пересчитываем разом
+    rebuild_ratings()
+    log(f"отзывов: {reviews}")
+
+    for start in range(0, visits, batch_size):
+        Visit.objects.bulk_create(
+            Visit(
+                visitor_id=f"{PERF_PREFIX}{rnd.randint(0, visits // 3)}",
+                ip=f"10.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}",
+                user_agent="Mozilla/5.0 (perf)",
+                started_at=now - timedelta(seconds=rnd.randint(0, 90 * 24 * 3600)),
+            )
+            for _ in range(start, min(start + batch_size, visits))
+        )
+    log(f"визитов: {visits}")
+
+    # bulk_create без сигналов: синтетические заказы не уходят в Telegram
+    prices = dict(Product.objects.filter(id__in=product_ids).values_list("id", "price"))
+    for start in range(0, orders, batch_size):
+        count = min(batch_size, orders - start)
+        order_products = [rnd.choice(product_ids) for _ in range(count)]
+        Order.objects.bulk_create(
+            Order(
+                product_id=pid, price=prices[pid], quantity=rnd.randint(1, 3),
+                user_name="Perf", user_phone="+70000000000", user_address=PERF_PREFIX,
+            )
+            for pid in order_products
+        )
+        with transaction.atomic():
+            checkout_orders = CheckoutOrder.objects.bulk_create(
+                CheckoutOrder(
+                    first_name="Perf", email=PERF_EMAIL, phone="+70000000000",
+                    delivery_type=CheckoutOrder.DELIVERY_STANDARD,
+                    country="KG", city="Bishkek", address=PERF_PREFIX,
+                )
+                for _ in range(count)
+            )
+            items = []
+            for order in checkout_orders:
+                for pid in rnd.sample(product_ids, k=min(3, len(product_ids))):
+                    qty = rnd.randint(1, 2)
+                    items.append(CheckoutItem(
+                        order_id=order.pk, product_id=pid, quantity=qty,
+                        price=prices[pid], line_total=prices[pid] * qty,
+                    ))
+                    order.subtotal += prices[pid] * qty
+                order.total = order.subtotal
+            CheckoutItem.objects.bulk_create(items)
+            CheckoutOrder.objects.bulk_update(checkout_orders, ["subtotal", "total"])
+    log(f"заказов: {orders} + {orders} (checkout)")
+
+
+def clear():
+    CheckoutOrder.objects.filter(email=PERF_EMAIL).delete()
+    Order.objects.filter(user_address=PERF_PREFIX).delete()
+    Visit.objects.filter(visitor_id__startswith=PERF_PREFIX).delete()
+    Reviews.objects.filter(title__startswith=PERF_PREFIX).delete()
+    Product.objects.filter(name__startswith=PERF_PREFIX).delete()
+    Category.objects.filter(name__startswith=PERF_PREFIX).delete()
+
+
+def perf_product_ids():
+    return list(Product.objects.filter(name__startswith=PERF_PREFIX).values_list("id", flat=True))
+
+
+class ClientSession:
+    """Тестовый клиент Django в этом же процессе; считает SQL-запросы."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            if method == "GET":
+                response = self.client.get(path, data)
+            else:
+                response = self.client.post(path, data or {}, content_type="application/json")
+        return response.status_code, len(queries)
+
+
+class HttpSession:
+    """Один «пользователь»: keep-alive соединение и свои cookie (visitor_id, sessionid)."""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.conn = conn_class(url.hostname, url.port, timeout=30)
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, data=None):
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={m.value}" for k, m in self.cookies.items())
+        body = None
+        if method == "GET" and data:
+            path = f"{path}?{urlencode(data)}"
+        elif method != "GET":
+            body = json.dumps(data or {})
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            return 599, None
+        for header in response.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(header)
+        return response.status, None
+
+    def close(self):
+        self.conn.close()
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: object
+    setup: object = None
+
+
+def _add_random(session, ctx):
+    session.request("POST", f"{API_PREFIX}cart/{ctx.rnd.choice(ctx.product_ids)}/add/")
+
+
+def _remove_setup(session, ctx):
+    ctx.last_product = ctx.rnd.choice(ctx.product_ids)
+    session.request("POST", f"{API_PREFIX}cart/{ctx.last_product}/add/")
+
+
+CHECKOUT_FORM = {
+    "first_name": "Perf", "email": PERF_EMAIL, "phone": "+70000000000",
+    "delivery_type": "express", "country": "KG", "city": "Bishkek", "address": PERF_PREFIX,
+}
+
+SCENARIOS = {
+    s.name: s
+    for s in (
+        Scenario("product_list", lambda s, c: s.request(
+            "GET", f"{API_PREFIX}product/", {"page": c.rnd.randint(1, c.pages)})),
+        Scenario("product_search", lambda s, c: s.request(
+            "GET", f"{API_PREFIX}product/", {"search": c.rnd.choice(WORDS)})),
+        Scenario("product_filter", lambda s, c: s.request(
+            "GET", f"{API_PREFIX}product/",
+            {"min_price": c.rnd.randint(500, 50000), "max_price": c.rnd.randint(50000, 150000), "ordering": "-price"})),
+        Scenario("cart_add", lambda s, c: s.request(
+            "POST", f"{API_PREFIX}cart/{c.rnd.choice(c.product_ids)}/add/")),
+        Scenario("cart_remove", lambda s, c: s.request(
+            "POST", f"{API_PREFIX}cart/{c.last_product}/remove/"), setup=_remove_setup),
+        Scenario("checkout_preview", lambda s, c: s.request(
+            "GET", f"{API_PREFIX}checkout/", {"delivery_type": "express"}), setup=_add_random),
+        Scenario("checkout_create", lambda s, c: s.request(
+            "POST", f"{API_PREFIX}checkout/", CHECKOUT_FORM), setup=_add_random),
+    )
+}
+
+
+class Context:
+    def __init__(self, product_ids, seed=None):
+        self.product_ids = product_ids
+        self.pages = max(1, min(50, len(product_ids) // ShopPagination.page_size))
+        self.rnd = random.Random(seed)
+        self.last_product = None
+
+
+def run_in_process(scenario, product_ids, iterations, warmup=5):
+    """Последовательно через тестовый клиент: латентность и SQL-запросов на запрос."""
+    session, ctx = ClientSession(), Context(product_ids, seed=1)
+    latencies, queries, errors = [], [], 0
+    for i in range(warmup + iterations):
+        if scenario.setup:
+            scenario.setup(session, ctx)
+        t0 = time.perf_counter()
+        status, n_queries = scenario.run(session, ctx)
+        elapsed = time.perf_counter() - t0
+        if i < warmup:
+            continue
+        if status >= 400:
+            errors += 1
+        latencies.append(elapsed)
+        queries.append(n_queries)
+    # последовательно: пропускная способность — без времени на подготовку (setup)
+    summary = summarize(latencies, sum(latencies))
+    summary["queries"] = sum(queries) / len(queries) if queries else 0.0
+    summary["errors"] = errors
+    return summary
+
+
+def run_http(scenario, product_ids, base_url, concurrency, duration):
+    """concurrency пользователей крутят сценарий duration секунд, как в locust."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(n):
+        session, ctx = HttpSession(base_url), Context(product_ids, seed=n)
+        local, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            if scenario.setup:
+                scenario.setup(session, ctx)
+            t0 = time.perf_counter()
+            status, _ = scenario.run(session, ctx)
+            if status >= 400:
+                local_errors += 1
+            else:
+                local.append(time.perf_counter() - t0)
+        session.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+    summary = summarize(latencies, time.perf_counter() - started)
+    summary["queries"] = None
+    summary["errors"] = errors[0]
+    return summary
@@ -0,0 +1,67 @@
+import time
+import uuid
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+
+from app.shop.benchmarks import summarize, format_summary, timed
+from app.shop.cart import DatabaseCartStore, get_cart_store, cart_summary
+from app.shop.models import Product
+
+BENCH_PREFIX = "bench-cart-"
+
+
+class Command(BaseCommand):
+    help = "Сравнивает добавление в корзину: JSON в сессии против отдельного хранилища корзин"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clicks", type=int, default=500)
+        parser.add_argument("--products", type=int, default=20)
+        parser.add_argument("--backend", choices=["auto", "db"], default="auto")
+
+    def handle(self, *args, clicks, products, backend, **options):
+        Product.objects.bulk_create(
+            Product(name=f"{BENCH_PREFIX}{i}", description="", price=100 + i, stock=10)
+            for i in range(products)
+        )
+        ids = list(
+            Product.objects.filter(name__startswith=BENCH_PREFIX).order_by("id").values_list("id", flat=True)
+        )
+        store = DatabaseCartStore() if backend == "db" else get_cart_store()
+        key = f"bench-{uuid.uuid4().hex}"
+        session = SessionStore()
+        session.create()
+
+        try:
+            session_latencies = []
+            started = time.perf_counter()
+            for n in range(clicks):
+                pk = ids[n % len(ids)]
+                with timed(session_latencies):
+                    # прежний CartViewSet.add: чтение товара и перезапись всей сессии
+                    s = SessionStore(session_key=session.session_key)
+                    cart = s.get("cart", {})
+                    product = Product.objects.get(pk=pk)
+                    if str(pk) in cart:
+                        cart[str(pk)]["quantity"] += 1
+                    else:
+                        cart[str(pk)] = {"name": product.name, "price": float(product.price), "quantity": 1}
+                    s["cart"] = cart
+                    s.save()
+            session_elapsed = time.perf_counter() - started
+
+            store_latencies = []
+            started = time.perf_counter()
+            for n in range(clicks):
+                pk = ids[n % len(ids)]
+                with timed(store_latencies):
+                    store.add(key, pk)
+                    cart_summary(store.items(key))
+            store_elapsed = time.perf_counter() - started
+        finally:
+            session.delete()
+            store.clear(key)
+            Product.objects.filter(id__in=ids).delete()
+
+        self.stdout.write(format_summary("session", summarize(session_latencies, session_elapsed)))
+        self.stdout.write(format_summary(type(store).__name__, summarize(store_latencies, store_elapsed)))
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, OperationalError
+
+from app.shop.benchmarks import summarize, format_summary, timed
+from app.shop.models import Product
+from app.shop.stock import reserve_stock, OutOfStock
+
+BENCH_PREFIX = "bench-checkout-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Параллельное списание остатков на «горячие» товары, как при оформлении "
+        "заказа: проверяет, что остаток не уходит в минус и продано ровно столько, "
+        "сколько списано. Уведомления в Telegram не создаются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--checkouts", type=int, default=400)
+        parser.add_argument("--skus", type=int, default=3)
+        parser.add_argument("--stock", type=int, default=100)
+        parser.add_argument("--lines", type=int, default=2, help="товаров в одном заказе")
+
+    def handle(self, *args, workers, checkouts, skus, stock, lines, **options):
+        Product.objects.bulk_create(
+            Product(name=f"{BENCH_PREFIX}{i}", description="", price=100, stock=stock)
+            for i in range(skus)
+        )
+        product_ids = list(
+            Product.objects.filter(name__startswith=BENCH_PREFIX).order_by("id").values_list("id", flat=True)
+        )
+        results = {"ok": 0, "out_of_stock": 0, "errors": 0}
+        reserved = dict.fromkeys(product_ids, 0)
+        lock = threading.Lock()
+        latencies = []
+
+        def checkout(n):
+            quantities = {
+                product_ids[(n + i) % len(product_ids)]: 1 for i in range(min(lines, len(product_ids)))
+            }
+            try:
+                with timed(latencies), transaction.atomic():
+                    reserve_stock(quantities)
+                outcome = "ok"
+            except OutOfStock:
+                outcome = "out_of_stock"
+            except OperationalError:
+                outcome = "errors"
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+                if outcome == "ok":
+                    for pid, qty in quantities.items():
+                        reserved[pid] += qty
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(checkout, range(checkouts)))
+            elapsed = time.perf_counter() - started
+
+            remaining = dict(Product.objects.filter(id__in=product_ids).values_list("id", "stock"))
+        finally:
+            Product.objects.filter(id__in=product_ids).delete()
+
+        self.stdout.write(format_summary("checkout", summarize(latencies, elapsed)))
+        self.stdout.write(
+            f"успешно: {results['ok']}, отказ по остатку: {results['out_of_stock']}, "
+            f"ошибки БД: {results['errors']}"
+        )
+        self.stdout.write(f"остатки: {remaining}")
+
+        mismatched = [pid for pid in product_ids if remaining[pid] != stock - reserved[pid]]
+        if mismatched or any(left < 0 for left in remaining.values()):
+            self.stderr.write(self.style.ERROR(f"Остатки не сходятся по товарам {mismatched}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Остатки сходятся, перепродаж нет."))
@@ -0,0 +1,69 @@
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from app.shop.benchmarks import summarize, format_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "HTTP-нагрузка на запущенный сервер: N параллельных клиентов с keep-alive. "
+        "Для сравнения WSGI и ASGI поднимите по очереди\n"
+        "  gunicorn core.wsgi:application -w 4 -b 127.0.0.1:8000\n"
+        "  uvicorn core.asgi:application --workers 4 --port 8000\n"
+        "и прогоните одни и те же --path (например /ru/api/v1/shop/product/ "
+        "против /ru/api/v1/shop/async/product/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--path", action="append", dest="paths")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=10.0, help="секунд на каждый path")
+
+    def handle(self, *args, base_url, paths, concurrency, duration, **options):
+        paths = paths or ["/ru/api/v1/shop/product/", "/ru/api/v1/shop/async/product/"]
+        for path in paths:
+            summary, errors = run_load(base_url, path, concurrency, duration)
+            self.stdout.write(format_summary(path, summary) + f", ошибок: {errors}")
+
+
+def run_load(base_url, path, concurrency, duration):
+    url = urlsplit(base_url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(url.hostname, url.port, timeout=30)
+        local, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers={"Cookie": "visitor_id=bench"})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - started)
+            else:
+                local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return summarize(latencies, time.perf_counter() - started), errors[0]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from app.shop.loadtest import API_PREFIX, perf_product_ids
+from app.shop.management.commands.loadtest import OFFLINE_SETTINGS
+
+WRITE_SQL = ("INSERT", "UPDATE", "DELETE")
+
+BEFORE = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "SESSION_SAVE_EVERY_REQUEST": True,
+    "MIDDLEWARE": [
+        "django.contrib.sessions.middleware.SessionMiddleware" if m == "core.sessions.SessionMiddleware" else m
+        for m in settings.MIDDLEWARE
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Считает записи на запрос из-за сессий: прежняя схема (django_session, "
+        "SESSION_SAVE_EVERY_REQUEST) против core.sessions. Смесь запросов: каталог, "
+        "корзина, изредка переключение избранного. Данные: manage.py seed_perf_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=50, help="Запросов на пользователя")
+        parser.add_argument("--toggle-every", type=int, default=10, help="Каждый N-й запрос — избранное")
+        parser.add_argument("--use-configured-cache", action="store_true",
+                            help="Не подменять кэш, писать сессии в настроенный Redis")
+
+    def handle(self, *args, users, requests, toggle_every, use_configured_cache, **options):
+        product_ids = perf_product_ids()
+        if not product_ids:
+            raise CommandError("Нет perf-товаров, сначала manage.py seed_perf_data")
+
+        offline = {} if use_configured_cache else OFFLINE_SETTINGS
+        for label, overrides in (("до", BEFORE), ("после", {})):
+            with override_settings(**offline, **overrides):
+                stats = run_mix(product_ids, users, requests, toggle_every)
+            total = stats["requests"]
+            self.stdout.write(
+                f"{label:>5}: запросов {total}, SQL-записей/запрос {stats['writes'] / total:.2f}, "
+                f"из них django_session {stats['session_writes'] / total:.2f}, "
+                f"сохранений сессии/запрос {stats['session_saves'] / total:.2f}"
+            )
+
+
+def run_mix(product_ids, users, requests, toggle_every):
+    stats = {"requests": 0, "writes": 0, "session_writes": 0, "session_saves": 0}
+    for user in range(users):
+        client = Client()
+        for n in range(requests):
+            if n % toggle_every == 0:
+                method, path = "post", f"{API_PREFIX}favorites/{product_ids[(user + n) % len(product_ids)]}/toggle/"
+            elif n % 2:
+                method, path = "get", f"{API_PREFIX}product/"
+            else:
+                method, path = "get", f"{API_PREFIX}cart/"
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path)
+            writes = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith(WRITE_SQL)]
+            stats["requests"] += 1
+            stats["writes"] += len(writes)
+            stats["session_writes"] += sum("django_session" in sql for sql in writes)
+            # сессия сохраняется ровно тогда, когда middleware ставит cookie
+            stats["session_saves"] += settings.SESSION_COOKIE_NAME in response.cookies
+    return stats
@@ -0,0 +1,58 @@
+import resource
+import sys
+import time
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.shop.exports import EXPORTS, EXPORT_CHUNK_SIZE, export_lines
+
+
+def _moment(value):
+    """YYYY-MM-DD или ISO datetime -> aware datetime."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Не удалось разобрать дату: {value}")
+        moment = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка заказов/визитов в CSV или JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORTS))
+        parser.add_argument("--format", dest="fmt", choices=["csv", "jsonl"], default="csv")
+        parser.add_argument("--since", type=_moment, help="Включительно, YYYY-MM-DD или ISO datetime")
+        parser.add_argument("--until", type=_moment, help="Не включительно")
+        parser.add_argument("--output", "-o", default="-", help="Файл; по умолчанию stdout")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, dataset, fmt, since, until, output, chunk_size, **options):
+        spec = EXPORTS[dataset]
+        queryset = spec.queryset(since=since, until=until)
+
+        out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        started = time.perf_counter()
+        written = 0
+        try:
+            for chunk in export_lines(spec, fmt, queryset, chunk_size=chunk_size):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - started
+
+        rows = queryset.count()
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stderr.write(
+            f"{dataset}: {rows} строк, {written / 1024 / 1024:.1f} МБ за {elapsed:.2f} с "
+            f"({rows / elapsed if elapsed else 0:.0f} строк/с), пик памяти процесса {peak_mb:.0f} МБ"
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from app.shop.cache import bump_catalog_version
+from app.shop.images import generate_variants
+from app.shop.models import ProductImage
+from app.shop.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = "Создаёт уменьшенные копии для уже загруженных фотографий товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", dest="regenerate", action="store_true", help="Пересоздать копии и там, где они уже есть")
+        parser.add_argument("--async", dest="use_celery", action="store_true", help="Поставить задачи в Celery")
+
+    def handle(self, *args, regenerate, use_celery, **options):
+        queryset = ProductImage.objects.order_by("id")
+        if not regenerate:
+            queryset = queryset.filter(variants=[])
+        ids = list(queryset.values_list("id", flat=True))
+
+        done = failed = 0
+        for image_id in ids:
+            if use_celery:
+                generate_image_variants.delay(image_id)
+                done += 1
+                continue
+            try:
+                if generate_variants(image_id) is not None:
+                    done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"#{image_id}: {e}")
+
+        if done and not use_celery:
+            bump_catalog_version()
+        verb = "Поставлено в очередь" if use_celery else "Обработано"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {done}, ошибок: {failed}"))
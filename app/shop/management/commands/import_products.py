@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.shop.importer import IMPORT_BATCH_SIZE, ProductImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Импортирует товары из CSV/JSONL: upsert по артикулу или названию, пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", dest="fmt", choices=["csv", "jsonl"], help="По умолчанию — по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--create-categories", action="store_true", help="Создавать отсутствующие категории")
+        parser.add_argument("--dry-run", action="store_true", help="Только проверить строки")
+        parser.add_argument("--max-errors", type=int, default=50, help="Сколько ошибок вывести")
+
+    def handle(self, *args, path, fmt, batch_size, create_categories, dry_run, max_errors, **options):
+        importer = ProductImporter(
+            batch_size=batch_size, create_categories=create_categories, dry_run=dry_run
+        )
+        started = time.perf_counter()
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            result = importer.run(read_rows(f, fmt or detect_format(path)))
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors[:max_errors]:
+            self.stderr.write(str(error))
+        if len(result.errors) > max_errors:
+            self.stderr.write(f"... и ещё {len(result.errors) - max_errors}")
+
+        if dry_run:
+            self.stdout.write(f"Проверка завершена, ошибок: {len(result.errors)}")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: {result.created}, обновлено: {result.updated}, картинок: {result.images}, "
+            f"ошибок: {len(result.errors)} за {elapsed:.1f} с"
+        ))
+        if result.images:
+            self.stdout.write("Уменьшенные копии: manage.py generate_image_variants")
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from app.shop.benchmarks import format_summary
+from app.shop.loadtest import SCENARIOS, perf_product_ids, run_http, run_in_process
+
+OFFLINE_SETTINGS = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    # без Redis корзина живёт в CartItem, Celery не дёргаем — outbox разберёт beat
+    "CART_BACKEND": "db",
+    "TELEGRAM_OUTBOX_EAGER_DRAIN": False,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет сценарии магазина (каталог, поиск, фильтры, корзина, оформление) "
+        "и печатает p50/p95/p99, SQL-запросов на запрос и пропускную способность. "
+        "Без --base-url — тестовый клиент в этом процессе, с локальным кэшем вместо Redis; "
+        "с --base-url — HTTP-пользователи против запущенного сервера. "
+        "Данные: manage.py seed_perf_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", dest="scenarios", choices=sorted(SCENARIOS))
+        parser.add_argument("--iterations", type=int, default=200, help="Запросов на сценарий (в процессе)")
+        parser.add_argument("--base-url", help="Например http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=10.0, help="Секунд на сценарий (HTTP)")
+        parser.add_argument("--use-configured-cache", action="store_true",
+                            help="В процессе: не подменять кэш/корзину, работать с настроенным Redis")
+
+    def handle(self, *args, scenarios, iterations, base_url, concurrency, duration, use_configured_cache, **options):
+        product_ids = perf_product_ids()
+        if not product_ids:
+            raise CommandError("Нет perf-товаров, сначала manage.py seed_perf_data")
+
+        for name in scenarios or list(SCENARIOS):
+            scenario = SCENARIOS[name]
+            if base_url:
+                summary = run_http(scenario, product_ids, base_url, concurrency, duration)
+            elif use_configured_cache:
+                with override_settings(ALLOWED_HOSTS=["*"]):
+                    summary = run_in_process(scenario, product_ids, iterations)
+            else:
+                with override_settings(ALLOWED_HOSTS=["*"], **OFFLINE_SETTINGS):
+                    summary = run_in_process(scenario, product_ids, iterations)
+
+            line = format_summary(name, summary)
+            if summary["queries"] is not None:
+                line += f", SQL {summary['queries']:.1f}/запрос"
+            self.stdout.write(line + f", ошибок: {summary['errors']}")
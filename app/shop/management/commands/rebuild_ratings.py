@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.shop.cache import bump_catalog_version
+from app.shop.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает рейтинги товаров по активным отзывам (после bulk-правок отзывов)"
+
+    def handle(self, *args, **options):
+        changed = rebuild_ratings()
+        if changed:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Обновлено товаров: {changed}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("Для текущей БД нет бэкенда полнотекстового поиска.")
+        total = backend.rebuild(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано товаров: {total}"))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.shop import loadtest
+from app.shop.cache import bump_catalog_version
+from app.shop.models import Product
+from app.shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Заполняет БД синтетическими товарами, отзывами, визитами и заказами (префикс perf-)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--reviews", type=int, default=2000)
+        parser.add_argument("--visits", type=int, default=100000)
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--clear", action="store_true", help="Удалить прошлые perf-данные перед заполнением")
+        parser.add_argument("--clear-only", action="store_true", help="Только удалить perf-данные")
+
+    def handle(self, *args, clear, clear_only, **options):
+        if clear or clear_only:
+            loadtest.clear()
+            self.stdout.write("perf-данные удалены")
+            if clear_only:
+                bump_catalog_version()
+                return
+
+        started = time.perf_counter()
+        loadtest.seed(
+            products=options["products"],
+            categories=options["categories"],
+            reviews=options["reviews"],
+            visits=options["visits"],
+            orders=options["orders"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+
+        backend = get_search_backend()
+        if backend is not None:
+            ids = loadtest.perf_product_ids()
+            for start in range(0, len(ids), options["batch_size"]):
+                backend.index(
+                    Product.objects.filter(id__in=ids[start:start + options["batch_size"]])
+                    .only("id", "name", "description")
+                )
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - started:.1f} с"))
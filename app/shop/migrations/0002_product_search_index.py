@@ -0,0 +1,37 @@
+from django.db import migrations
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts "
+    "USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')",
+)
+SQLITE_DROP = ("DROP TABLE IF EXISTS shop_product_fts",)
+
+POSTGRES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS shop_product_search ("
+    "product_id bigint PRIMARY KEY REFERENCES shop_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS shop_product_search_document_gin "
+    "ON shop_product_search USING gin (document)",
+)
+POSTGRES_DROP = ("DROP TABLE IF EXISTS shop_product_search",)
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_CREATE, "postgresql": POSTGRES_CREATE}),
+            _run({"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(unique=True, verbose_name='Начало периода')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Визиты')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Уникальные посетители')),
+                ('top_user_agents', models.JSONField(blank=True, default=list, verbose_name='Популярные User-Agent')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Посещения за день',
+                'verbose_name_plural': 'Посещения по дням',
+                'ordering': ['-period_start'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(unique=True, verbose_name='Начало периода')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Визиты')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Уникальные посетители')),
+                ('top_user_agents', models.JSONField(blank=True, default=list, verbose_name='Популярные User-Agent')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Посещения за час',
+                'verbose_name_plural': 'Посещения по часам',
+                'ordering': ['-period_start'],
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='visit',
+            name='visitor_id',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['visitor_id', '-started_at'], name='shop_visit_visitor_started'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['-started_at'], name='shop_visit_started'),
+        ),
+    ]
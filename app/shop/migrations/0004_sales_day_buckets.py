@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_visit_indexes_and_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='День')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Заказы из бота')),
+                ('orders_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка заказов из бота')),
+                ('checkout_orders', models.PositiveIntegerField(default=0, verbose_name='Оформленные заказы')),
+                ('checkout_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка оформленных заказов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='period_end',
+            field=models.DateField(blank=True, null=True, verbose_name='Конец периода'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='period_start',
+            field=models.DateField(blank=True, null=True, verbose_name='Начало периода'),
+        ),
+        migrations.AddConstraint(
+            model_name='report',
+            constraint=models.UniqueConstraint(fields=('report_type', 'period_end'), name='shop_report_type_period_end'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_telegram_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_key', models.CharField(max_length=64, verbose_name='Ключ корзины')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Позиция корзины',
+                'verbose_name_plural': 'Позиции корзин',
+                'constraints': [models.UniqueConstraint(fields=('cart_key', 'product'), name='shop_cartitem_key_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_prices(apps, schema_editor):
+    # цены прошлых заказов не сохранились — берём текущую цену товара
+    Order = apps.get_model("shop", "Order")
+    Product = apps.get_model("shop", "Product")
+    Order.objects.filter(price__isnull=True).update(
+        price=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена на момент заказа'),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
-from django.db.models import Sum, F
-from datetime import timedelta
+from django.db.models import Sum, F, Count, Q
+from django.db.models.functions import TruncDate
+from datetime import timedelta, datetime, time
 from ckeditor.fields import RichTextField
+import logging
 import uuid
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
 
 RATING_CHOICES = [
         (1, "★☆☆☆☆ (1)"),
@@ -43,6 +50,13 @@ class Product(models.Model):
         max_length=255,
         verbose_name="Название товара"
     )
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Артикул"
+    )
     description = RichTextField(
         verbose_name="Описание"
     )
@@ -64,11 +78,27 @@ class Product(models.Model):
         default=False,
         verbose_name='В ИЗБРАННОЕ'
     )
+    # агрегаты активных отзывов, ведутся сигналами (app/shop/ratings.py)
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество отзывов"
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Сумма оценок"
+    )
+    rating_avg = models.FloatField(
+        default=0,
+        verbose_name="Средняя оценка"
+    )
 
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ["id"]
+        indexes = [
+            models.Index(fields=["-rating_avg", "-rating_count", "id"], name="shop_product_top_rated"),
+        ]
 
     def __str__(self):
         return self.name
@@ -85,6 +115,19 @@ class ProductImage(models.Model):
         upload_to="products/",
         verbose_name="Изображение"
     )
+    width = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name="Ширина"
+    )
+    height = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name="Высота"
+    )
+    variants = models.JSONField(
+        default=list, blank=True,
+        verbose_name="Уменьшенные копии",
+        help_text="Заполняется фоновой задачей: [{name, width, height, format}]"
+    )
 
     class Meta:
         verbose_name = "Изображение товара"
@@ -94,6 +137,14 @@ class ProductImage(models.Model):
         return f"Изображение для {self.product.name}"
 
 class Reviews(models.Model):
+    product = models.ForeignKey(
+        Product,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="reviews",
+        verbose_name="Товар"
+    )
     title = models.CharField(
         max_length=155,
         verbose_name="Заголовок"
@@ -127,12 +178,25 @@ class Reviews(models.Model):
         verbose_name_plural = "Отзывы"
         ordering = ["-id"]
 
+def sales_timezone():
+    """
+    Дни продаж — по часовому поясу магазина (CELERY_TIMEZONE, в нём же beat
+    запускает отчёты в полночь), а не по TIME_ZONE = UTC.
+    """
+    return ZoneInfo(getattr(settings, "CELERY_TIMEZONE", None) or settings.TIME_ZONE)
+
+
 class Report(models.Model):
     REPORT_TYPES = [
         ('daily', 'Дневной отчёт'),
         ('weekly', 'Недельный отчёт'),
         ('monthly', 'Месячный отчёт'),
     ]
+    PERIOD_DAYS = {
+        'daily': 1,
+        'weekly': 7,
+        'monthly': 30,
+    }
 
     report_type = models.CharField(
         max_length=10,
@@ -147,6 +211,16 @@ class Report(models.Model):
         decimal_places=2,
         verbose_name="Общая выручка"
     )
+    period_start = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Начало периода"
+    )
+    period_end = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Конец периода"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата создания отчёта"
@@ -156,35 +230,120 @@ class Report(models.Model):
         verbose_name = "Отчёт"
         verbose_name_plural = "Отчёты"
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["report_type", "period_end"], name="shop_report_type_period_end"),
+        ]
 
     def __str__(self):
         return f"{self.get_report_type_display()} — {self.created_at.strftime('%d.%m.%Y %H:%M')}"
 
     @classmethod
-    def generate_reports(cls):
-        from .models import Order
+    def generate_reports(cls, today=None):
+        """
+        Отчёты за последние завершённые 1/7/30 дней. Суммы берутся из SalesDay,
+        повторный запуск за тот же день перезаписывает те же отчёты.
+        """
+        today = today or timezone.localdate(timezone=sales_timezone())
+        last_day = today - timedelta(days=1)
+        SalesDay.fill(last_day)
+
+        windows = {
+            report_type: last_day - timedelta(days=days - 1)
+            for report_type, days in cls.PERIOD_DAYS.items()
+        }
+        aggregates = {}
+        for report_type, start in windows.items():
+            in_window = Q(date__gte=start)
+            aggregates[f"{report_type}_orders"] = Sum(F("orders") + F("checkout_orders"), filter=in_window)
+            aggregates[f"{report_type}_revenue"] = Sum(F("orders_revenue") + F("checkout_revenue"), filter=in_window)
+        totals = SalesDay.objects.filter(
+            date__gte=min(windows.values()), date__lte=last_day
+        ).aggregate(**aggregates)
+
+        for report_type, start in windows.items():
+            cls.objects.update_or_create(
+                report_type=report_type,
+                period_end=last_day,
+                defaults={
+                    "period_start": start,
+                    "total_orders": totals[f"{report_type}_orders"] or 0,
+                    "total_revenue": totals[f"{report_type}_revenue"] or 0,
+                },
+            )
 
-        now = timezone.now()
 
-        periods = {
-            'daily': now - timedelta(days=1),
-            'weekly': now - timedelta(weeks=1),
-            'monthly': now - timedelta(days=30),
-        }
+class SalesDay(models.Model):
+    """Продажи за один день: заказы из бота и оформленные заказы с сайта."""
+    date = models.DateField(unique=True, verbose_name="День")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заказы из бота")
+    orders_revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, verbose_name="Выручка заказов из бота"
+    )
+    checkout_orders = models.PositiveIntegerField(default=0, verbose_name="Оформленные заказы")
+    checkout_revenue = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, verbose_name="Выручка оформленных заказов"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
-        for report_type, start_date in periods.items():
-            orders = Order.objects.filter(created_at__gte=start_date)
+    class Meta:
+        verbose_name = "Продажи за день"
+        verbose_name_plural = "Продажи по дням"
+        ordering = ["-date"]
 
-            total_orders = orders.count()
-            total_revenue = (
-                orders.aggregate(total=Sum(F('product__price') * F('quantity')))["total"] or 0
-            )
+    def __str__(self):
+        return f"{self.date:%d.%m.%Y}"
 
-            cls.objects.create(
-                report_type=report_type,
-                total_orders=total_orders,
-                total_revenue=total_revenue
-            )
+    @classmethod
+    def fill(cls, last_day, max_days=30):
+        """Досчитывает недостающие дни до last_day включительно (не дальше max_days назад)."""
+        first_day = last_day - timedelta(days=max_days - 1)
+        latest = cls.objects.filter(date__lte=last_day).order_by("-date").values_list("date", flat=True).first()
+        if latest is not None:
+            first_day = max(first_day, latest + timedelta(days=1))
+        if first_day > last_day:
+            return
+
+        tz = sales_timezone()
+        start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+        end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+
+        orders = {
+            row["day"]: row
+            for row in Order.objects.filter(created_at__gte=start, created_at__lt=end)
+            .order_by()
+            .annotate(day=TruncDate("created_at", tzinfo=tz))
+            .values("day")
+            .annotate(count=Count("id"), revenue=Sum(F("price") * F("quantity")))
+        }
+        checkouts = {
+            row["day"]: row
+            for row in CheckoutOrder.objects.filter(created_at__gte=start, created_at__lt=end)
+            .order_by()
+            .annotate(day=TruncDate("created_at", tzinfo=tz))
+            .values("day")
+            .annotate(count=Count("id"), revenue=Sum("total"))
+        }
+
+        days = []
+        day = first_day
+        while day <= last_day:
+            order_row = orders.get(day, {})
+            checkout_row = checkouts.get(day, {})
+            days.append(cls(
+                date=day,
+                orders=order_row.get("count") or 0,
+                orders_revenue=order_row.get("revenue") or 0,
+                checkout_orders=checkout_row.get("count") or 0,
+                checkout_revenue=checkout_row.get("revenue") or 0,
+            ))
+            day += timedelta(days=1)
+
+        cls.objects.bulk_create(
+            days,
+            update_conflicts=True,
+            unique_fields=["date"],
+            update_fields=["orders", "orders_revenue", "checkout_orders", "checkout_revenue", "updated_at"],
+        )
 
 class Order(models.Model):
     product = models.ForeignKey(
@@ -196,6 +355,13 @@ class Order(models.Model):
         default=1,
         verbose_name="Количество"
     )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Цена на момент заказа"
+    )
     user_name = models.CharField(
         max_length=255,
         blank=True,
@@ -223,6 +389,12 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ №{self.id} - {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        if self.price is None and self.product_id:
+            # выручка в отчётах не должна меняться вслед за ценой товара
+            self.price = Product.objects.filter(pk=self.product_id).values_list("price", flat=True).first()
+        super().save(*args, **kwargs)
+
 
 class CheckoutOrder(models.Model):
     DELIVERY_STANDARD = "standard"
@@ -277,8 +449,44 @@ class CheckoutItem(models.Model):
     def __str__(self):
         return f"{self.product} x {self.quantity}"
 
+class CartItem(models.Model):
+    """Корзина в БД — запасной вариант, когда Redis недоступен."""
+    cart_key = models.CharField("Ключ корзины", max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Товар")
+    quantity = models.PositiveIntegerField("Количество", default=1)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Позиция корзины"
+        verbose_name_plural = "Позиции корзин"
+        constraints = [
+            models.UniqueConstraint(fields=["cart_key", "product"], name="shop_cartitem_key_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.cart_key}: {self.product_id} x {self.quantity}"
+
+
+class IdempotencyRecord(models.Model):
+    """Ответ на оформление по Idempotency-Key — повтор запроса получает его же."""
+    key = models.CharField("Ключ", max_length=64, unique=True)  # sha256 корзины и заголовка
+    fingerprint = models.CharField("Отпечаток запроса", max_length=64)
+    status_code = models.PositiveSmallIntegerField("HTTP-статус", default=201)
+    response = models.JSONField("Ответ", encoder=DjangoJSONEncoder)
+    order = models.ForeignKey(
+        CheckoutOrder, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Заказ"
+    )
+    created_at = models.DateTimeField("Создано", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+
+    def __str__(self):
+        return f"{self.key[:12]}… → {self.order_id or self.status_code}"
+
 class Visit(models.Model):
-    visitor_id = models.CharField(max_length=64, db_index=True)
+    visitor_id = models.CharField(max_length=64)
     ip = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     started_at = models.DateTimeField(default=timezone.now)
@@ -287,10 +495,41 @@ class Visit(models.Model):
         verbose_name = "Посещение"
         verbose_name_plural = "Посещения"
         ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["visitor_id", "-started_at"], name="shop_visit_visitor_started"),
+            models.Index(fields=["-started_at"], name="shop_visit_started"),
+        ]
 
     def __str__(self):
         return f"{self.visitor_id} ({self.ip}) - {self.started_at:%Y-%m-%d %H:%M}"
 
+
+class VisitStat(models.Model):
+    period_start = models.DateTimeField("Начало периода", unique=True)
+    visits = models.PositiveIntegerField("Визиты", default=0)
+    unique_visitors = models.PositiveIntegerField("Уникальные посетители", default=0)
+    top_user_agents = models.JSONField("Популярные User-Agent", default=list, blank=True)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        abstract = True
+        ordering = ["-period_start"]
+
+    def __str__(self):
+        return f"{self.period_start:%Y-%m-%d %H:%M} — {self.visits} визитов"
+
+
+class VisitHourlyStat(VisitStat):
+    class Meta(VisitStat.Meta):
+        verbose_name = "Посещения за час"
+        verbose_name_plural = "Посещения по часам"
+
+
+class VisitDailyStat(VisitStat):
+    class Meta(VisitStat.Meta):
+        verbose_name = "Посещения за день"
+        verbose_name_plural = "Посещения по дням"
+
 class Contact(models.Model):
     name = models.CharField(
         max_length=155,
@@ -317,4 +556,60 @@ class Contact(models.Model):
         
     class Meta:
         verbose_name = 'Наши контакты'
-        verbose_name_plural = 'Наши контакты'    
\ No newline at end of file
+        verbose_name_plural = 'Наши контакты'    
+
+class TelegramOutbox(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Ошибка"),
+    )
+
+    chat_id = models.CharField("Чат", max_length=64, blank=True)
+    text = models.TextField("Текст")
+    parse_mode = models.CharField("Разметка", max_length=16, blank=True, default="HTML")
+    status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField("Попытки", default=0)
+    next_attempt_at = models.DateTimeField("Следующая попытка", default=timezone.now)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Создано", auto_now_add=True)
+    sent_at = models.DateTimeField("Отправлено", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Уведомление Telegram"
+        verbose_name_plural = "Очередь уведомлений Telegram"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="shop_tgoutbox_due"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} → {self.chat_id or 'admin'} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, text, chat_id="", parse_mode="HTML"):
+        """
+        Пишет сообщение в очередь в текущей транзакции; отправка — после коммита
+        в Celery, так что запрос не ждёт api.telegram.org.
+        """
+        from django.db import transaction
+
+        message = cls.objects.create(chat_id=chat_id, text=text, parse_mode=parse_mode)
+        transaction.on_commit(cls.schedule_drain)
+        return message
+
+    @staticmethod
+    def schedule_drain():
+        from django.conf import settings
+        from app.shop.tasks import drain_telegram_outbox
+
+        if not getattr(settings, "TELEGRAM_OUTBOX_EAGER_DRAIN", True):
+            return
+        try:
+            drain_telegram_outbox.delay()
+        except Exception as e:
+            # очередь разберёт периодическая задача
+            logger.warning("Не удалось поставить отправку в Celery: %s", e)
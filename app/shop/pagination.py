@@ -1,6 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 class ShopPagination(PageNumberPagination):
     page_size = 3
     page_size_query_param = "page_size"
-    max_page_size = 10
\ No newline at end of file
+    max_page_size = 10
+
+
+class ShopCursorPagination(CursorPagination):
+    """Keyset-пагинация для глубоких страниц: без COUNT(*) и OFFSET."""
+    page_size = ShopPagination.page_size
+    page_size_query_param = ShopPagination.page_size_query_param
+    max_page_size = ShopPagination.max_page_size
+    ordering = "id"
@@ -0,0 +1,177 @@
+"""
+Расчёт заказа (quote): позиции по ценам из каталога, доставка по правилам
+из CHECKOUT_SHIPPING, дата и текст доставки. Один расчёт на предпросмотр
+(GET checkout/) и оформление (POST checkout/).
+
+Предпросмотр кладёт quote в кэш на CHECKOUT_QUOTE_TTL и отдаёт quote_id.
+Оформление всегда считает заново; с quote_id заказ создаётся, только если
+позиции, цены и доставка совпали с показанными клиенту. Дата доставки
+берётся из нового расчёта. Цены читаются с основной БД: на отстающей реплике
+предпросмотр показал бы старые цены.
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from app.shop.models import Product
+from core.routers import PRIMARY
+
+QUOTE_KEY = "checkout_quote:{}"
+
+DEFAULT_SHIPPING = {
+    "standard": {"cost": "0", "eta_hours": 24},
+    "express": {"cost": "700", "eta_hours": 24},
+}
+
+
+class QuoteError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class QuoteLine:
+    product_id: int
+    name: str
+    price: Decimal
+    quantity: int
+
+    @property
+    def line_total(self):
+        return self.price * self.quantity
+
+
+@dataclass(frozen=True)
+class Quote:
+    id: str
+    lines: tuple
+    missing: tuple
+    delivery_type: str
+    preferred_time: time | None
+    shipping_cost: Decimal
+    delivery_eta_hours: int
+    delivery_datetime: object
+    delivery_note: str
+
+    @property
+    def quantities(self):
+        return {line.product_id: line.quantity for line in self.lines}
+
+    @property
+    def priced_lines(self):
+        # название товара на сумму не влияет
+        return [(line.product_id, line.price, line.quantity) for line in self.lines]
+
+    @property
+    def subtotal(self):
+        return sum((line.line_total for line in self.lines), Decimal("0"))
+
+    @property
+    def total(self):
+        return self.subtotal + self.shipping_cost
+
+    def matches(self, other):
+        """Те же позиции по тем же ценам и та же доставка — суммы не изменились."""
+        return (
+            not self.missing
+            and not other.missing
+            and self.priced_lines == other.priced_lines
+            and self.delivery_type == other.delivery_type
+            and self.preferred_time == other.preferred_time
+            and self.shipping_cost == other.shipping_cost
+        )
+
+    def as_preview(self):
+        return {
+            "preview": True,
+            "quote_id": self.id,
+            "delivery_type": self.delivery_type,
+            "preferred_time": self.preferred_time.strftime("%H:%M") if self.preferred_time else None,
+            "delivery_eta_hours": self.delivery_eta_hours,
+            "delivery_datetime": self.delivery_datetime,
+            "delivery_note": self.delivery_note,
+            "subtotal": round(self.subtotal, 2),
+            "shipping_cost": round(self.shipping_cost, 2),
+            "total": round(self.total, 2),
+            "items": [
+                {
+                    "name": line.name,
+                    "price": float(line.price),
+                    "quantity": line.quantity,
+                    "line_total": round(float(line.line_total), 2),
+                } for line in self.lines
+            ],
+        }
+
+
+def shipping_rule(delivery_type):
+    rules = getattr(settings, "CHECKOUT_SHIPPING", DEFAULT_SHIPPING)
+    try:
+        rule = rules[delivery_type]
+    except KeyError:
+        raise QuoteError(f"Неизвестный способ доставки: {delivery_type}")
+    return Decimal(str(rule["cost"])), int(rule["eta_hours"])
+
+
+def delivery_datetime(min_hours, preferred=None, now=None):
+    """Не раньше чем через min_hours; с preferred — ближайшее такое время после этого."""
+    earliest = (now or timezone.now()) + timedelta(hours=min_hours)
+    if not preferred:
+        return earliest
+    candidate = earliest.replace(hour=preferred.hour, minute=preferred.minute, second=0, microsecond=0)
+    if candidate < earliest:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def _hours(n):
+    if n % 10 == 1 and n % 100 != 11:
+        return f"{n} час"
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return f"{n} часа"
+    return f"{n} часов"
+
+
+def delivery_note(min_hours, preferred, delivery_dt):
+    note = f"Товар будет доставлен через {_hours(min_hours)}."
+    if preferred:
+        note += f" Вы выбрали время {preferred.strftime('%H:%M')}."
+    return f"{note} Доставка назначена на {timezone.localtime(delivery_dt).strftime('%d.%m.%Y %H:%M')}."
+
+
+def build_quote(quantities, delivery_type, preferred_time=None):
+    """quantities — {product_id: qty}; цены и названия одним запросом."""
+    quantities = {int(pid): int(qty) for pid, qty in quantities.items()}
+    shipping_cost, eta_hours = shipping_rule(delivery_type)
+    rows = (
+        Product.objects.using(PRIMARY)
+        .filter(id__in=quantities)
+        .order_by("id")
+        .values_list("id", "name", "price")
+    )
+    lines = tuple(QuoteLine(pid, name, price, quantities[pid]) for pid, name, price in rows)
+    found = {line.product_id for line in lines}
+    delivery_dt = delivery_datetime(eta_hours, preferred_time)
+    return Quote(
+        id=uuid.uuid4().hex,
+        lines=lines,
+        missing=tuple(sorted(set(quantities) - found)),
+        delivery_type=delivery_type,
+        preferred_time=preferred_time,
+        shipping_cost=shipping_cost,
+        delivery_eta_hours=eta_hours,
+        delivery_datetime=delivery_dt,
+        delivery_note=delivery_note(eta_hours, preferred_time, delivery_dt),
+    )
+
+
+def save_quote(quote):
+    cache.set(QUOTE_KEY.format(quote.id), quote, timeout=getattr(settings, "CHECKOUT_QUOTE_TTL", 15 * 60))
+
+
+def load_quote(quote_id):
+    return cache.get(QUOTE_KEY.format(quote_id))
@@ -0,0 +1,65 @@
+"""
+Рейтинг товара по активным отзывам: rating_count, rating_sum, rating_avg.
+
+Меняются одним UPDATE на отзыв (сигналы в app/shop/signals.py), поэтому
+сортировка каталога и «лучшие товары» читают готовую индексированную колонку,
+а не считают GROUP BY по отзывам. rebuild_ratings() пересчитывает всё с нуля —
+после bulk-операций с отзывами, которые сигналы не видят.
+"""
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from app.shop.models import Product, Reviews
+
+# вклад отзыва, загруженного без нужных полей (.only()/.defer())
+UNKNOWN = object()
+
+
+def review_contribution(product_id, rating, is_active):
+    """(product_id, оценка), если отзыв учитывается в рейтинге, иначе None."""
+    if is_active and product_id:
+        return product_id, rating
+    return None
+
+
+def apply_review_delta(product_id, count_delta, sum_delta):
+    count = F("rating_count") + count_delta
+    total = F("rating_sum") + sum_delta
+    # в SET все F() видят старые значения строки, гонок между отзывами нет
+    return Product.objects.filter(pk=product_id).update(
+        rating_count=count,
+        rating_sum=total,
+        rating_avg=Coalesce(
+            Cast(total, FloatField()) / NullIf(count, Value(0)), Value(0.0), output_field=FloatField()
+        ),
+    )
+
+
+def move_review(old, new):
+    """old/new — результаты review_contribution до и после изменения отзыва."""
+    if old == new:
+        return False
+    if old is not None:
+        apply_review_delta(old[0], -1, -old[1])
+    if new is not None:
+        apply_review_delta(new[0], 1, new[1])
+    return True
+
+
+def rebuild_ratings():
+    stats = {
+        row["product_id"]: row
+        for row in Reviews.objects.filter(is_active=True, product__isnull=False)
+        .values("product_id")
+        .annotate(count=Count("id"), total=Sum("rating"))
+    }
+    products = list(Product.objects.only("id", "rating_count", "rating_sum", "rating_avg"))
+    changed = []
+    for product in products:
+        row = stats.get(product.pk, {"count": 0, "total": 0})
+        avg = row["total"] / row["count"] if row["count"] else 0.0
+        if (product.rating_count, product.rating_sum, product.rating_avg) != (row["count"], row["total"], avg):
+            product.rating_count, product.rating_sum, product.rating_avg = row["count"], row["total"], avg
+            changed.append(product)
+    Product.objects.bulk_update(changed, ["rating_count", "rating_sum", "rating_avg"], batch_size=1000)
+    return len(changed)
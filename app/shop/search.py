@@ -0,0 +1,174 @@
+import re
+from html import unescape
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+from app.shop.models import Product
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_QUERY_TOKENS = 8
+SEARCH_LIMIT = getattr(settings, "SHOP_SEARCH_LIMIT", 500)
+
+
+def document_text(value):
+    """HTML из CKEditor -> плоский текст для индекса."""
+    return " ".join(unescape(strip_tags(value or "")).split())
+
+
+def query_tokens(query):
+    return TOKEN_RE.findall(query.lower())[:MAX_QUERY_TOKENS]
+
+
+class BaseSearchBackend:
+    def index(self, products):
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Возвращает id товаров, отсортированные по релевантности."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        self.clear()
+        total = 0
+        batch = []
+        queryset = Product.objects.only("id", "name", "description").order_by("id")
+        for product in queryset.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+            total += len(batch)
+        return total
+
+    @staticmethod
+    def _rows(products):
+        return [(p.pk, document_text(p.name), document_text(p.description)) for p in products]
+
+
+class SqliteFTSBackend(BaseSearchBackend):
+    table = "shop_product_fts"
+    # построчный DELETE по rowid в fts5 на порядки медленнее одного IN (...)
+    delete_chunk = 500
+
+    def _delete(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), self.delete_chunk):
+            chunk = product_ids[start:start + self.delete_chunk]
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+
+    def index(self, products):
+        rows = self._rows(products)
+        if not rows:
+            return
+        # одна транзакция на пачку: в autocommit каждая строка executemany — отдельный коммит
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, [r[0] for r in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)", rows
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        # "токен"* — префиксный поиск, название весит больше описания
+        match = " ".join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, 10.0, 1.0) LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    table = "shop_product_search"
+    config = "simple"
+
+    def index(self, products):
+        rows = self._rows(products)
+        if not rows:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (product_id, document) VALUES "
+                f"(%s, setweight(to_tsvector('{self.config}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'B')) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = ANY(%s)", [list(product_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table}, to_tsquery('{self.config}', %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s",
+                [tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SqliteFTSBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """Бэкенд из SHOP_SEARCH_BACKEND или по типу БД; None — поиск через icontains."""
+    path = getattr(settings, "SHOP_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    backend = get_search_backend()
+    if backend is not None and not raw:
+        backend.index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove([instance.pk])
@@ -1,10 +1,12 @@
 from rest_framework import serializers
-from app.shop.models import Product, Order, ProductImage, Reviews, Category, CheckoutOrder, CheckoutItem, Contact
-from decimal import Decimal
-from datetime import timedelta, time as dt_time   
-from django.utils import timezone
+from app.shop.models import Product, Order, ProductImage, Reviews, Category, CheckoutOrder, CheckoutItem, Contact, TelegramOutbox
+from app.shop.stock import reserve_stock, OutOfStock
+from app.shop.images import srcset
+from app.shop.favorites import get_favorites
+from app.shop.pricing import QuoteError, build_quote, load_quote
+from app.analytics.metrics import TimedListSerializer
 from django.db import transaction
-from app.shop.utils import send_telegram_message
+from html import escape
 
 class ContactSerializers(serializers.ModelSerializer):
     class Meta:
@@ -17,9 +19,16 @@ class CategorySerializers(serializers.ModelSerializer):
         fields = ['id', 'name', 'is_active']
 
 class ProductImageSerializer(serializers.ModelSerializer):    
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image"]
+        fields = ["id", "image", "width", "height", "srcset"]
+        read_only_fields = ["width", "height"]
+
+    def get_srcset(self, obj):
+        request = self.context.get("request")
+        return srcset(obj.variants, request.build_absolute_uri if request else str)
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, required=False)
@@ -28,14 +37,23 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ["id", "name", "description", "price", "stock", "images", "rating", "is_favorites", "category"]
+        fields = [
+            "id", "name", "description", "price", "stock", "images", "rating",
+            "rating_avg", "rating_count", "is_favorites", "category",
+        ]
+        read_only_fields = ("rating_avg", "rating_count")
+        list_serializer_class = TimedListSerializer
 
     def get_is_favorites(self, obj):
-        request = self.context.get("request")
-        if request:
-            favorites = request.session.get("favorites", [])
-            return obj.id in favorites
-        return False
+        # набор избранного кладут в context заранее (async-представления, общий кэш
+        # каталога); иначе читаем сессию один раз на весь список
+        favorites = self.context.get("favorites")
+        if favorites is None:
+            request = self.context.get("request")
+            if not request:
+                return False
+            favorites = self.context["favorites"] = get_favorites(request)
+        return obj.id in favorites
 
     def create(self, validated_data):
         images_data = validated_data.pop("images", [])
@@ -50,6 +68,7 @@ class ReviewsSerializer(serializers.ModelSerializer):
         model = Reviews
         fields = "__all__"
         read_only_fields = ("is_active",)
+        list_serializer_class = TimedListSerializer
 
 
 class CheckoutItemReadSerializer(serializers.ModelSerializer):
@@ -86,68 +105,45 @@ class CheckoutCreateSerializer(serializers.Serializer):
     address = serializers.CharField(max_length=255)
     postcode = serializers.CharField(max_length=20, required=False, allow_blank=True)
     note = serializers.CharField(required=False, allow_blank=True)
-
-    @staticmethod
-    def _compute_delivery_datetime(min_hours: int, preferred: dt_time | None):
-        now = timezone.now()
-        earliest = now + timedelta(hours=min_hours)
-        if not preferred:
-            return earliest
-        candidate = earliest.replace(
-            hour=preferred.hour, minute=preferred.minute, second=0, microsecond=0
-        )
-        if candidate < earliest:
-            candidate += timedelta(days=1)
-        return candidate
+    quote_id = serializers.CharField(required=False, allow_blank=True)
 
     def validate(self, attrs):
         cart = self.context.get("cart") or {}
         if not cart:
             raise serializers.ValidationError("Корзина пуста.")
-        ids = [int(k) for k in cart.keys()]
-        exists = Product.objects.filter(id__in=ids).count()
-        if exists != len(ids):
+        preferred_time = attrs.get("preferred_time")
+
+        try:
+            quote = build_quote(cart, attrs["delivery_type"], preferred_time)
+        except QuoteError as e:
+            raise serializers.ValidationError({"delivery_type": str(e)})
+        if quote.missing:
             raise serializers.ValidationError("В корзине есть недоступные товары.")
+
+        quote_id = attrs.get("quote_id")
+        if quote_id:
+            # клиент согласился с суммами предпросмотра — только их и списываем
+            previewed = load_quote(quote_id)
+            if previewed is None or not previewed.matches(quote):
+                raise serializers.ValidationError(
+                    {"quote_id": "Расчёт устарел: цены или корзина изменились, обновите предпросмотр."}
+                )
+        attrs["quote"] = quote
         return attrs
 
     def create(self, validated_data):
-        request = self.context.get("request")
-        cart = (self.context.get("cart") or {}).copy()
-
-        shipping_cost = Decimal("0")
-        if validated_data["delivery_type"] == CheckoutOrder.DELIVERY_EXPRESS:
-            shipping_cost = Decimal("700")
-
-        product_ids = [int(pid) for pid in cart.keys()]
-        products = {p.id: p for p in Product.objects.filter(id__in=product_ids)}
-
-        subtotal = Decimal("0")
-        items_payload = []
-        for pid_str, it in cart.items():
-            pid = int(pid_str)
-            qty = int(it["quantity"])
-            price = Decimal(str(it["price"]))
-            line_total = price * qty
-            subtotal += line_total
-            items_payload.append((pid, price, qty, line_total))
-
-        total = subtotal + shipping_cost
-        min_hours = 24
-        preferred_time = validated_data.get("preferred_time")
-        delivery_dt = self._compute_delivery_datetime(min_hours, preferred_time)
-
-        base_note = "Товар будет доставлен через 24 часа."
-        if preferred_time:
-            delivery_note = (
-                f"{base_note} Вы выбрали время {preferred_time.strftime('%H:%M')}. "
-                f"Доставка назначена на {timezone.localtime(delivery_dt).strftime('%d.%m.%Y %H:%M')}."
-            )
-        else:
-            delivery_note = (
-                f"{base_note} Доставка назначена на {timezone.localtime(delivery_dt).strftime('%d.%m.%Y %H:%M')}."
-            )
+        quote = validated_data["quote"]
+        quantities = quote.quantities
 
         with transaction.atomic():
+            try:
+                products = reserve_stock(quantities)
+            except OutOfStock as e:
+                names = ", ".join(
+                    Product.objects.filter(id__in=e.product_ids).values_list("name", flat=True)
+                )
+                raise serializers.ValidationError(f"Недостаточно товара на складе: {names}.")
+
             order = CheckoutOrder.objects.create(
                 first_name=validated_data["first_name"],
                 last_name=validated_data.get("last_name", ""),
@@ -159,51 +155,49 @@ class CheckoutCreateSerializer(serializers.Serializer):
                 address=validated_data["address"],
                 postcode=validated_data.get("postcode", ""),
                 note=validated_data.get("note", ""),
-                shipping_cost=shipping_cost,
-                subtotal=subtotal,
-                total=total,
-                delivery_eta_hours=min_hours,
-                preferred_time=preferred_time,
-                delivery_datetime=delivery_dt,
-                delivery_note=delivery_note,
+                shipping_cost=quote.shipping_cost,
+                subtotal=quote.subtotal,
+                total=quote.total,
+                delivery_eta_hours=quote.delivery_eta_hours,
+                preferred_time=quote.preferred_time,
+                delivery_datetime=quote.delivery_datetime,
+                delivery_note=quote.delivery_note,
             )
 
             CheckoutItem.objects.bulk_create([
                 CheckoutItem(
                     order=order,
-                    product=products[int(pid)],
-                    price=price,
-                    quantity=qty,
-                    line_total=line_total,
+                    product=products[line.product_id],
+                    price=line.price,
+                    quantity=line.quantity,
+                    line_total=line.line_total,
                 )
-                for pid, price, qty, line_total in items_payload
+                for line in quote.lines
             ])
-        msg_lines = [
-            f"🛒 <b>Новый заказ #{order.id}</b>",
-            f"👤 {order.first_name} {order.last_name}",
-            f"📞 {order.phone}",
-            f"📧 {order.email}",
-            "",
-            f"🏙️ {order.country}, {order.city}",
-            f"📦 Адрес: {order.address}",
-            f"🚚 Тип доставки: {order.delivery_type}",
-            f"⏰ {order.delivery_note}",
-            "",
-            "<b>Товары:</b>",
-        ]
-
-        for pid_str, it in cart.items():
-            msg_lines.append(
-                f"• {it['name']} — {it['quantity']} шт × {it['price']} ₽"
-            )
 
-        msg_lines.append("")
-        msg_lines.append(f"💰 <b>Итого: {order.total} ₽</b>")
+            # поля клиента — в HTML-разметке: один «<» ломал бы всё сообщение
+            msg_lines = [
+                f"🛒 <b>Новый заказ #{order.id}</b>",
+                f"👤 {escape(order.first_name)} {escape(order.last_name)}",
+                f"📞 {escape(order.phone)}",
+                f"📧 {escape(order.email)}",
+                "",
+                f"🏙️ {escape(order.country)}, {escape(order.city)}",
+                f"📦 Адрес: {escape(order.address)}",
+                f"🚚 Тип доставки: {escape(order.delivery_type)}",
+                f"⏰ {escape(order.delivery_note)}",
+                "",
+                "<b>Товары:</b>",
+            ]
+
+            for line in quote.lines:
+                msg_lines.append(
+                    f"• {escape(line.name)} — {line.quantity} шт × {line.price} ₽"
+                )
 
-        send_telegram_message("\n".join(msg_lines))  
+            msg_lines.append("")
+            msg_lines.append(f"💰 <b>Итого: {order.total} ₽</b>")
 
-        if request is not None:
-            request.session["cart"] = {}
-            request.session.modified = True
+            TelegramOutbox.enqueue("\n".join(msg_lines))
 
         return order
\ No newline at end of file
@@ -1,21 +1,95 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from app.shop.models import Order
-from django.conf import settings
-from aiogram import Bot
+from app.shop.models import Order, ProductImage, Reviews, TelegramOutbox
+from app.shop.cache import bump_catalog_version
+from app.shop.ratings import UNKNOWN, review_contribution, move_review
+
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Order)
 def send_telegram_notification(sender, instance, created, **kwargs):
     if created:
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
         text = (
             f"🆕 Новый заказ #{instance.id}\n"
             f"📦 Товар: {instance.product.name}\n"
-            f"💰 Цена: {instance.product.price}\n"
+            f"💰 Цена: {instance.price}\n"
             f"🔢 Кол-во: {instance.quantity}\n"
+            f"🧑‍💼 Имя: {instance.user_name}\n"
+            f"📞 Телефон: {instance.user_phone}\n"
+            f"🏠 Адрес: {instance.user_address}\n"
         )
-        try:
-            import asyncio
-            asyncio.run(bot.send_message(settings.ADMIN_CHAT_ID, text))
-        except Exception as e:
-            print(f"Ошибка отправки Telegram: {e}")
+        TelegramOutbox.enqueue(text, parse_mode="")
+
+
+def schedule_image_variants(image_id):
+    from app.shop.tasks import generate_image_variants
+
+    try:
+        generate_image_variants.delay(image_id)
+    except Exception:
+        # копии догенерирует manage.py generate_image_variants
+        logger.exception("Не удалось поставить генерацию копий фотографии %s в Celery", image_id)
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and "image" not in update_fields):
+        return
+    # задача стартует после коммита, сохранение в админке её не ждёт
+    transaction.on_commit(lambda: schedule_image_variants(instance.pk))
+
+
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    from app.shop.images import delete_variants
+
+    variants = instance.variants
+    transaction.on_commit(lambda: delete_variants(variants))
+
+
+RATING_FIELDS = {"product_id", "rating", "is_active"}
+
+
+@receiver(post_init, sender=Reviews)
+def review_loaded(sender, instance, **kwargs):
+    # что отзыв вносил в рейтинг до правки (list_editable, API); новый — ничего
+    if instance.pk is None:
+        instance._rating_contribution = None
+    elif RATING_FIELDS & instance.get_deferred_fields():
+        # .only()/.defer(): не дочитываем поля на каждый экземпляр, разберёмся в pre_save
+        instance._rating_contribution = UNKNOWN
+    else:
+        instance._rating_contribution = review_contribution(
+            instance.product_id, instance.rating, instance.is_active
+        )
+
+
+@receiver(pre_save, sender=Reviews)
+def review_saving(sender, instance, raw=False, **kwargs):
+    if raw or instance._rating_contribution is not UNKNOWN:
+        return
+    old = Reviews.objects.filter(pk=instance.pk).values_list("product_id", "rating", "is_active").first()
+    instance._rating_contribution = review_contribution(*old) if old else None
+
+
+@receiver(post_save, sender=Reviews)
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    new = review_contribution(instance.product_id, instance.rating, instance.is_active)
+    if move_review(instance._rating_contribution, new):
+        transaction.on_commit(bump_catalog_version)
+    instance._rating_contribution = new
+
+
+@receiver(post_delete, sender=Reviews)
+def review_deleted(sender, instance, **kwargs):
+    old = instance._rating_contribution
+    if old is UNKNOWN:
+        # строки уже нет, а поля не загружены — рейтинг поправит rebuild_ratings
+        return
+    if move_review(old, None):
+        transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,39 @@
+from django.db.models import Case, When, Value, F, PositiveIntegerField
+
+from app.shop.models import Product
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Недостаточно товара на складе: {product_ids}")
+        self.product_ids = product_ids
+
+
+def reserve_stock(quantities):
+    """
+    Списывает остатки {product_id: qty} одним UPDATE ... WHERE stock >= qty.
+    Вызывать внутри transaction.atomic(): строки товаров блокируются
+    (SELECT ... FOR UPDATE в порядке id), таблица целиком — нет.
+    Возвращает {id: Product} с ценами на момент списания.
+    """
+    ids = sorted(quantities)
+    products = {
+        p.id: p
+        for p in Product.objects.select_for_update().filter(id__in=ids).order_by("id")
+    }
+    short = [pk for pk in ids if pk not in products or products[pk].stock < quantities[pk]]
+    if short:
+        raise OutOfStock(short)
+
+    qty = Case(
+        *[When(id=pk, then=Value(quantities[pk])) for pk in ids],
+        output_field=PositiveIntegerField(),
+    )
+    updated = Product.objects.filter(id__in=ids, stock__gte=qty).update(stock=F("stock") - qty)
+    if updated != len(ids):
+        # БД без блокировок строк (SQLite): остаток успел уйти между SELECT и UPDATE
+        raise OutOfStock(ids)
+
+    for pk in ids:
+        products[pk].stock -= quantities[pk]
+    return products
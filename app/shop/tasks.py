@@ -1,27 +1,248 @@
+import time
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
-from .models import Order, Report
-from django.db.models import F, Sum
+from collections import Counter, defaultdict
+from django.utils.dateparse import parse_datetime
+from .models import Report, Visit, VisitHourlyStat, VisitDailyStat, TelegramOutbox, sales_timezone
+from .utils import post_telegram_message, TelegramError, TELEGRAM_MESSAGE_LIMIT
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour, TruncDay
+
+TOP_USER_AGENTS = 5
+
+OUTBOX_LOCK_KEY = "telegram_outbox:drain"
+OUTBOX_LOCK_TIMEOUT = 5 * 60
+# запас до истечения блокировки: один вызов Telegram — до 10 с таймаута плюс лимит чата
+OUTBOX_DRAIN_BUDGET = OUTBOX_LOCK_TIMEOUT - 60
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 30  # секунд, удваивается с каждой попыткой
 
 @shared_task
 def generate_sales_reports():
     """Создаёт дневной, недельный и месячный отчёты по заказам"""
-    now = timezone.now()
-    periods = {
-        "daily": now - timedelta(days=1),
-        "weekly": now - timedelta(weeks=1),
-        "monthly": now - timedelta(days=30),
-    }
-
-    for report_type, start_date in periods.items():
-        orders = Order.objects.filter(created_at__gte=start_date)
-
-        total_orders = orders.count()
-        total_revenue = orders.aggregate(total=Sum(F("product__price") * F("quantity")))["total"] or 0
-
-        Report.objects.create(
-            report_type=report_type,
-            total_orders=total_orders,
-            total_revenue=total_revenue,
+    Report.generate_reports()
+
+
+@shared_task
+def record_visits(rows):
+    """Пачка визитов из VisitMiddleware (VISIT_FLUSH_VIA_CELERY = True)"""
+    Visit.objects.bulk_create([
+        Visit(
+            visitor_id=row["visitor_id"],
+            ip=row["ip"],
+            user_agent=row["user_agent"],
+            started_at=parse_datetime(row["started_at"]),
         )
+        for row in rows
+    ])
+
+
+def _rollup(model, trunc, start, end):
+    """Пересчитывает корзины model за [start, end) одним проходом по Visit."""
+    visits = Visit.objects.filter(started_at__gte=start, started_at__lt=end).order_by()
+    totals = (
+        visits.annotate(bucket=trunc("started_at"))
+        .values("bucket")
+        .annotate(visits=Count("id"), unique_visitors=Count("visitor_id", distinct=True))
+    )
+    agents = defaultdict(list)
+    agent_rows = (
+        visits.annotate(bucket=trunc("started_at"))
+        .values("bucket", "user_agent")
+        .annotate(count=Count("id"))
+        .order_by("bucket", "-count")
+    )
+    for row in agent_rows:
+        if len(agents[row["bucket"]]) < TOP_USER_AGENTS:
+            agents[row["bucket"]].append({"user_agent": row["user_agent"], "count": row["count"]})
+
+    model.objects.bulk_create(
+        [
+            model(
+                period_start=row["bucket"],
+                visits=row["visits"],
+                unique_visitors=row["unique_visitors"],
+                top_user_agents=agents[row["bucket"]],
+            )
+            for row in totals
+        ],
+        update_conflicts=True,
+        unique_fields=["period_start"],
+        update_fields=["visits", "unique_visitors", "top_user_agents", "updated_at"],
+    )
+
+
+@shared_task
+def rollup_visits():
+    """Дополняет почасовую и дневную статистику посещений новыми часами"""
+    current_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    last = VisitHourlyStat.objects.order_by("-period_start").first()
+    if last is not None:
+        # последний час пересчитываем: визиты из буфера могли дописаться позже
+        start = last.period_start
+    else:
+        first_visit = Visit.objects.order_by("started_at").values_list("started_at", flat=True).first()
+        if first_visit is None:
+            return
+        start = first_visit.replace(minute=0, second=0, microsecond=0)
+
+    if current_hour <= start:
+        return
+
+    _rollup(VisitHourlyStat, TruncHour, start, current_hour)
+    _rollup_days(start, current_hour)
+
+
+def _rollup_days(start, end):
+    """
+    Дневные итоги из почасовых: визиты — сумма часов, User-Agent — сумма
+    часовых топов. Уникальных посетителей из часов не сложить, поэтому они —
+    один COUNT(DISTINCT) по Visit за затронутые дни. Дни — по часовому поясу
+    магазина, как и отчёты продаж.
+    """
+    tz = sales_timezone()
+    day_start = timezone.localtime(start, tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = defaultdict(lambda: {"visits": 0, "agents": Counter()})
+    for hour in VisitHourlyStat.objects.filter(period_start__gte=day_start, period_start__lt=end).order_by():
+        day = days[timezone.localtime(hour.period_start, tz).replace(hour=0)]
+        day["visits"] += hour.visits
+        for agent in hour.top_user_agents:
+            day["agents"][agent["user_agent"]] += agent["count"]
+
+    unique = dict(
+        Visit.objects.filter(started_at__gte=day_start, started_at__lt=end)
+        .order_by()
+        .annotate(day=TruncDay("started_at", tzinfo=tz))
+        .values("day")
+        .annotate(unique_visitors=Count("visitor_id", distinct=True))
+        .values_list("day", "unique_visitors")
+    )
+
+    VisitDailyStat.objects.bulk_create(
+        [
+            VisitDailyStat(
+                period_start=period_start,
+                visits=day["visits"],
+                unique_visitors=unique.get(period_start, 0),
+                top_user_agents=[
+                    {"user_agent": agent, "count": count}
+                    for agent, count in day["agents"].most_common(TOP_USER_AGENTS)
+                ],
+            )
+            for period_start, day in days.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["period_start"],
+        update_fields=["visits", "unique_visitors", "top_user_agents", "updated_at"],
+    )
+
+
+def _outbox_batches(messages):
+    """Подряд идущие сообщения в один чат склеиваются в одно (до лимита Telegram)."""
+    batch = []
+    for message in messages:
+        if batch and (
+            message.chat_id != batch[0].chat_id
+            or message.parse_mode != batch[0].parse_mode
+            or sum(len(m.text) + 2 for m in batch) + len(message.text) > TELEGRAM_MESSAGE_LIMIT
+        ):
+            yield batch
+            batch = []
+        batch.append(message)
+    if batch:
+        yield batch
+
+
+@shared_task
+def drain_telegram_outbox():
+    """
+    Отправляет накопившиеся уведомления; одновременно работает один обработчик.
+    Прогон укладывается в OUTBOX_DRAIN_BUDGET, чтобы блокировка не истекла
+    посреди отправки, — остаток разберёт следующий запуск.
+    """
+    if not cache.add(OUTBOX_LOCK_KEY, 1, timeout=OUTBOX_LOCK_TIMEOUT):
+        return
+    batch_size = getattr(settings, "TELEGRAM_OUTBOX_BATCH_SIZE", 50)
+    deadline = time.monotonic() + OUTBOX_DRAIN_BUDGET
+    try:
+        while time.monotonic() < deadline:
+            due = list(
+                TelegramOutbox.objects.filter(
+                    status=TelegramOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+                ).order_by("id")[:batch_size]
+            )
+            if not due:
+                break
+            for batch in _outbox_batches(due):
+                if time.monotonic() >= deadline:
+                    break
+                _deliver(batch)
+    finally:
+        cache.delete(OUTBOX_LOCK_KEY)
+
+
+def _deliver(batch):
+    try:
+        post_telegram_message(
+            "\n\n".join(m.text for m in batch),
+            chat_id=batch[0].chat_id or None,
+            parse_mode=batch[0].parse_mode,
+        )
+    except TelegramError as e:
+        if e.permanent and len(batch) > 1:
+            # битая разметка одного сообщения не должна топить склеенные с ним
+            for message in batch:
+                _deliver([message])
+            return
+        _reschedule(batch, e)
+    else:
+        TelegramOutbox.objects.filter(id__in=[m.id for m in batch]).update(
+            status=TelegramOutbox.STATUS_SENT, sent_at=timezone.now(), last_error=""
+        )
+
+
+def _reschedule(batch, error):
+    attempts = max(m.attempts for m in batch) + 1
+    if error.retry_after:
+        delay = int(error.retry_after)
+    else:
+        delay = OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1)
+    TelegramOutbox.objects.filter(id__in=[m.id for m in batch]).update(
+        attempts=F("attempts") + 1,
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        last_error=str(error)[:1000],
+        status=(
+            TelegramOutbox.STATUS_FAILED if error.permanent or attempts >= OUTBOX_MAX_ATTEMPTS
+            else TelegramOutbox.STATUS_PENDING
+        ),
+    )
+
+
+@shared_task
+def purge_expired_carts():
+    """Удаляет из БД корзины, которые не менялись дольше CART_TTL"""
+    from .cart import DatabaseCartStore
+
+    return DatabaseCartStore.purge_expired()
+
+
+@shared_task
+def purge_idempotency_records():
+    """Удаляет ответы по Idempotency-Key старше IDEMPOTENCY_TTL"""
+    from .idempotency import purge_expired
+
+    return purge_expired()
+
+
+@shared_task
+def generate_image_variants(image_id):
+    """Уменьшенные копии фотографии товара; выдача каталога сбрасывается, чтобы появился srcset"""
+    from .cache import bump_catalog_version
+    from .images import generate_variants
+
+    if generate_variants(image_id) is not None:
+        bump_catalog_version()
@@ -1,3 +1,1580 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, quote
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.http import HttpResponse, QueryDict
+from django.utils import timezone
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from aiogram.exceptions import TelegramRetryAfter
+from asgiref.sync import async_to_sync
+from PIL import Image
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.exceptions import ValidationError
+
+from app.analytics import metrics
+from app.analytics.middleware import VisitRecorder
+from app.shop.models import (
+    Category, Product, ProductImage, Reviews, TelegramOutbox, CheckoutOrder, CartItem, Visit, Order, Report, SalesDay,
+    VisitDailyStat, VisitHourlyStat, IdempotencyRecord, sales_timezone,
+)
+from app.shop import cart as cart_module, images
+from app.shop.cache import (
+    acache_get_bytes, acache_set_bytes, acatalog_fill_reads, aproduct_list_cache_key, bump_catalog_version,
+    catalog_fill_reads, product_list_cache_key,
+)
+from app.shop.cart import CART_TTL, DatabaseCartStore, RedisCartStore
+from app.shop.exports import EXPORTS, export_lines
+from app.shop.idempotency import LOCK_KEY, RESULT_KEY, request_fingerprint, scoped_key
+from app.shop.importer import import_products
+from app.shop.ratings import rebuild_ratings
+from app.shop.serializers import CheckoutCreateSerializer
+from app.shop.tasks import drain_telegram_outbox, rollup_visits
+from app.shop.utils import RateLimiter
+from core import sessions
+from core.routers import PrimaryReplicaRouter, ReplicaPinMiddleware
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductListQueryCountTests(TestCase):
+    PRODUCTS = 10_000
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            Category(name=f"Категория {i}", is_active=True) for i in range(10)
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Товар {i}",
+                description="<p>Описание</p>",
+                price=100 + i,
+                stock=i % 50,
+                category=categories[i % len(categories)],
+            )
+            for i in range(cls.PRODUCTS)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"products/{product.pk}.jpg")
+            for product in products
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, url):
+        # visit-трекинг и сессия не относятся к выдаче каталога
+        with self.modify_settings(MIDDLEWARE={"remove": "app.analytics.middleware.VisitMiddleware"}):
+            return self.client.get(url)
+
+    def test_page_number_listing_query_count(self):
+        # COUNT(*) + страница товаров с категориями + префетч фотографий
+        with self.assertNumQueries(3):
+            response = self._get("/ru/api/v1/shop/product/?page=500&page_size=10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], self.PRODUCTS)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(len(response.data["results"][0]["images"]), 1)
+        self.assertIsNotNone(response.data["results"][0]["category"])
+
+    def test_cursor_listing_query_count(self):
+        with self.assertNumQueries(2):
+            response = self._get("/ru/api/v1/shop/product/?cursor=&page_size=10")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("count", response.data)
+        self.assertIsNotNone(response.data["next"])
+
+        with self.assertNumQueries(2):
+            response = self._get(response.data["next"])
+        self.assertEqual(response.data["results"][0]["id"], Product.objects.order_by("id")[10].id)
+
+    def test_cached_listing_does_not_query(self):
+        self._get("/ru/api/v1/shop/product/?page=2")
+        with self.assertNumQueries(0):
+            response = self._get("/ru/api/v1/shop/product/?page=2")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mower = Product.objects.create(
+            name="Газонокосилка радиоуправляемая",
+            description="<p>Для <b>крутых</b> склонов</p>",
+            price=1000,
+        )
+        cls.trimmer = Product.objects.create(
+            name="Триммер", description="<p>Лёгкий, для газона</p>", price=500
+        )
+
+    def _search(self, query):
+        cache.clear()
+        response = self.client.get("/ru/api/v1/shop/product/", {"search": query})
+        return [item["id"] for item in response.data["results"]]
+
+    def test_prefix_match_ranks_name_above_description(self):
+        self.assertEqual(self._search("газон"), [self.mower.id, self.trimmer.id])
+
+    def test_cursor_is_ignored_when_searching(self):
+        cache.clear()
+        response = self.client.get("/ru/api/v1/shop/product/", {"search": "газон", "cursor": ""})
+        # порядок релевантности, листание по номерам страниц
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.mower.id, self.trimmer.id])
+        self.assertEqual(response.data["count"], 2)
+
+    def test_html_is_stripped_from_index(self):
+        self.assertEqual(self._search("крутых"), [self.mower.id])
+        self.assertEqual(self._search("span"), [])
+
+    def test_index_follows_save_and_delete(self):
+        self.trimmer.name = "Аэратор"
+        self.trimmer.description = ""
+        self.trimmer.save()
+        self.assertEqual(self._search("аэратор"), [self.trimmer.id])
+        self.trimmer.delete()
+        self.assertEqual(self._search("аэратор"), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductImportTests(TestCase):
+    CSV_HEADER = "sku,name,description,price,stock,rating,category,images\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.garden = Category.objects.create(name="Сад", is_active=True)
+        cls.mower = Product.objects.create(sku="M-1", name="Косилка", description="", price=1000, stock=1)
+        cls.hose = Product.objects.create(name="Шланг", description="", price=200, stock=3)
+
+    def _import(self, text, fmt="csv", **options):
+        return import_products(StringIO(text), fmt, batch_size=2, **options)
+
+    def test_create_and_update_by_sku_and_name(self):
+        result = self._import(
+            self.CSV_HEADER
+            + "M-1,Косилка 2.0,новая,\"1200,50\",4,5,сад,\n"
+            + "T-1,Триммер,,500,10,5,Сад,\n"
+            + ",Шланг,,250,7,5,,\n"
+            + ",Грабли,,90,2,4,,\n"
+        )
+        self.assertEqual((result.created, result.updated, result.errors), (2, 2, []))
+
+        self.mower.refresh_from_db()
+        self.assertEqual(
+            (self.mower.name, self.mower.price, self.mower.stock, self.mower.category),
+            ("Косилка 2.0", Decimal("1200.50"), 4, self.garden),
+        )
+        self.assertEqual(Product.objects.get(pk=self.hose.pk).price, 250)
+        self.assertEqual(Product.objects.get(sku="T-1").category, self.garden)
+        self.assertTrue(Product.objects.filter(name="Грабли", sku__isnull=True).exists())
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        long_category = "к" * 156
+        result = self._import("\n".join(json.dumps(row) for row in [
+            {"sku": "T-1", "name": "Триммер", "price": "500"},
+            {"name": "", "price": "1"},
+            {"name": "Лопата", "price": "дорого"},
+            {"name": "Лейка", "price": "10", "stock": "-1"},
+            {"name": "Секатор", "price": "10", "rating": 6},
+            {"name": "Тачка", "price": "10", "category": "Нет такой"},
+            {"name": "Грабли", "price": "10", "category": long_category},
+            {"name": "Ведро", "price": "10", "images": ["products/missing.jpg"]},
+        ]) + "\n{broken\n[1]\n", fmt="jsonl", create_categories=True)
+
+        self.assertEqual((result.created, result.updated), (2, 0))  # Триммер и Тачка с новой категорией
+        self.assertEqual([error.line for error in result.errors], [2, 3, 4, 5, 7, 8, 9, 10])
+        self.assertIn("длиннее 155", str(result.errors[4]))
+        self.assertFalse(Category.objects.filter(name=long_category).exists())
+        self.assertTrue(Category.objects.filter(name="Нет такой").exists())
+
+    def test_rejected_rows_do_not_create_categories(self):
+        result = self._import(
+            self.CSV_HEADER
+            + ",Ведро,,10,1,5,Новая кат,products/missing.jpg\n"
+            + ",Грабли,,90,2,4,,\n"
+            # та же пачка (batch_size=2): строку вытесняет следующая с тем же артикулом
+            + "T-1,Триммер,,500,10,5,Вытесненная,\n"
+            + "T-1,Триммер,,500,10,5,Сад,\n",
+            create_categories=True,
+        )
+        self.assertEqual((result.created, len(result.errors)), (2, 1))
+        self.assertEqual(str(result.errors[0]), "строка 2: нет файлов: products/missing.jpg")
+        self.assertEqual(list(Category.objects.values_list("name", flat=True)), ["Сад"])
+
+    def test_unknown_category_without_create(self):
+        result = self._import(self.CSV_HEADER + ",Тачка,,10,1,5,Нет такой,\n")
+        self.assertEqual(str(result.errors[0]), "строка 2: нет категории «Нет такой»")
+        self.assertFalse(Product.objects.filter(name="Тачка").exists())
+
+    def test_dry_run_writes_nothing(self):
+        result = self._import(
+            self.CSV_HEADER + "M-1,Косилка 2.0,,1200,4,5,,\nT-1,Триммер,,500,10,5,Новая,\n,Лопата,,-5,1,5,,\n",
+            dry_run=True, create_categories=True,
+        )
+        self.assertEqual((result.total, len(result.errors)), (0, 1))
+        self.assertEqual(Product.objects.get(pk=self.mower.pk).name, "Косилка")
+        self.assertFalse(Product.objects.filter(sku="T-1").exists())
+        self.assertFalse(Category.objects.filter(name="Новая").exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AsyncViewParityTests(TestCase):
+    SYNC = "/ru/api/v1/shop/"
+    ASYNC = "/ru/api/v1/shop/async/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=name, description="<p>Для газона</p>", price=price, stock=stock)
+            for name, price, stock in (
+                ("Газонокосилка", 1000, 2), ("Триммер", 500, 5), ("Аэратор", 700, 0),
+                ("Косилка ручная", 300, 1), ("Грабли", 90, 9),
+            )
+        ]
+        ProductImage.objects.create(product=cls.products[0], image="products/mower.jpg")
+        mower, trimmer = cls.products[:2]
+        Reviews.objects.create(product=mower, title="Отлично", name="Иван", description="", email="i@example.com", is_active=True)
+        Reviews.objects.create(product=trimmer, title="Норм", name="Пётр", description="", email="p@example.com", is_active=True)
+        Reviews.objects.create(product=trimmer, title="Скрыт", name="Бот", description="", email="b@example.com")
+
+    def setUp(self):
+        cache.clear()
+
+    def _pair(self, path):
+        path = quote(path, safe="/?=&")
+        sync = self.client.get(self.SYNC + path)
+        # каждый запрос через свежий кэш: сравниваем выдачу, а не закэшированное
+        cache.clear()
+        response = async_to_sync(self.async_client.get)(self.ASYNC + path)
+        self.assertEqual(response.status_code, sync.status_code, path)
+        body = response.json()
+        if isinstance(body, dict):
+            for link in ("next", "previous"):
+                if body.get(link):
+                    body[link] = body[link].replace("/async/", "/")
+        return sync.json(), body
+
+    def test_product_list(self):
+        for query in (
+            "", "?page=2", "?page_size=2&page=3", "?page_size=50", "?ordering=-price", "?ordering=rating_avg", "?ordering=-id", "?ordering=name,-price", "?ordering=rating_count,-price",
+            "?min_price=400&max_price=800", "?search=косилка", "?search=газон&ordering=price",
+            "?page=99", "?page=abc", "?page=0", "?page=last", "?page_size=0", "?min_price=x",
+        ):
+            sync, body = self._pair("product/" + query)
+            self.assertEqual(body, sync, query)
+
+    def test_product_detail(self):
+        for pk in (self.products[0].pk, 999):
+            sync, body = self._pair(f"product/{pk}/")
+            self.assertEqual(body, sync)
+
+    def test_reviews(self):
+        for query in ("", f"?product={self.products[1].pk}", "?product=abc"):
+            sync, body = self._pair("reviews/" + query)
+            self.assertEqual(body, sync, query)
+
+    def test_async_cache_helpers_match_sync(self):
+        query = QueryDict("page=2&utm_source=x&ordering=-price")
+        self.assertEqual(
+            async_to_sync(aproduct_list_cache_key)(query, prefix="products_list"), product_list_cache_key(query)
+        )
+        bump_catalog_version()
+        self.assertEqual(
+            async_to_sync(aproduct_list_cache_key)(query, prefix="products_list"), product_list_cache_key(query)
+        )
+
+        async_to_sync(acache_set_bytes)("parity", b"{}", 60)
+        self.assertEqual(cache.get("parity"), b"{}")
+        self.assertEqual(async_to_sync(acache_get_bytes)("parity"), b"{}")
+
+        # сразу после правки каталога обе выдачи читают с основной БД
+        self.assertIsInstance(async_to_sync(acatalog_fill_reads)(), type(catalog_fill_reads()))
+
+
+class TelegramStubServer:
+    """Локальная замена api.telegram.org: запоминает запросы, отвечает по очереди из responses."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                stub.requests.append(
+                    {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                )
+                status, body = stub.responses.pop(0) if stub.responses else (200, {"ok": True})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TelegramOutboxTests(TestCase):
+    def test_pending_messages_are_batched_per_chat(self):
+        TelegramOutbox.enqueue("первый", chat_id="1")
+        TelegramOutbox.enqueue("второй", chat_id="1")
+        with TelegramStubServer() as stub, self.settings(TELEGRAM_API_URL=stub.url):
+            drain_telegram_outbox()
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(stub.requests[0]["text"], "первый\n\nвторой")
+        self.assertFalse(TelegramOutbox.objects.exclude(status=TelegramOutbox.STATUS_SENT).exists())
+
+    def test_rate_limited_message_is_rescheduled(self):
+        message = TelegramOutbox.enqueue("текст", chat_id="2")
+        with TelegramStubServer() as stub, self.settings(TELEGRAM_API_URL=stub.url):
+            stub.responses.append((429, {"ok": False, "parameters": {"retry_after": 17}}))
+            drain_telegram_outbox()
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, TelegramOutbox.STATUS_PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, message.created_at)
+
+    def test_broken_message_does_not_fail_merged_ones(self):
+        good = TelegramOutbox.enqueue("<b>заказ</b>", chat_id="3")
+        broken = TelegramOutbox.enqueue("<b>заказ", chat_id="3")
+        with TelegramStubServer() as stub, self.settings(TELEGRAM_API_URL=stub.url):
+            stub.responses += [(400, {"ok": False, "description": "can't parse entities"})] * 2
+            stub.responses.insert(1, (200, {"ok": True}))
+            drain_telegram_outbox()
+
+        self.assertEqual(len(stub.requests), 3)
+        good.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((good.status, broken.status), (TelegramOutbox.STATUS_SENT, TelegramOutbox.STATUS_FAILED))
+
+    @override_settings(TELEGRAM_OUTBOX_EAGER_DRAIN=False)
+    def test_order_fields_are_escaped(self):
+        product = Product.objects.create(name="Косилка <Pro>", description="", price=1000, stock=5)
+        data = dict(CheckoutStockTests.DATA, first_name="<Иван>", address="дом 1 & 2")
+        serializer = CheckoutCreateSerializer(data=data, context={"cart": {product.pk: 1}})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        text = TelegramOutbox.objects.get().text
+        self.assertIn("&lt;Иван&gt;", text)
+        self.assertIn("дом 1 &amp; 2", text)
+        self.assertIn("Косилка &lt;Pro&gt;", text)
+
+
+class CheckoutStockTests(TestCase):
+    DATA = {
+        "first_name": "Иван",
+        "email": "ivan@example.com",
+        "phone": "+996700000000",
+        "delivery_type": CheckoutOrder.DELIVERY_STANDARD,
+        "country": "KG",
+        "city": "Бишкек",
+        "address": "ул. Пушкина, 1",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mower = Product.objects.create(name="Косилка", description="", price=1000, stock=2)
+        cls.trimmer = Product.objects.create(name="Триммер", description="", price=500, stock=5)
+
+    def _checkout(self, cart):
+        serializer = CheckoutCreateSerializer(data=self.DATA, context={"cart": cart})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_checkout_decrements_stock_and_prices_from_catalog(self):
+        order = self._checkout({self.mower.id: 2, self.trimmer.id: 1})
+        self.assertEqual(order.subtotal, 2500)
+        self.mower.refresh_from_db()
+        self.trimmer.refresh_from_db()
+        self.assertEqual((self.mower.stock, self.trimmer.stock), (0, 4))
+
+    def test_oversell_is_rejected_without_partial_decrement(self):
+        with self.assertRaises(ValidationError):
+            self._checkout({self.mower.id: 3, self.trimmer.id: 1})
+        self.trimmer.refresh_from_db()
+        self.assertEqual(self.trimmer.stock, 5)
+        self.assertFalse(CheckoutOrder.objects.exists())
+
+
+def jpeg_upload(name="mower.jpg", size=(1000, 500)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "green").save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class ProductImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        product = Product.objects.create(name="Косилка", description="", price=1000)
+        with patch("app.shop.tasks.generate_image_variants.delay"):
+            self.image = ProductImage.objects.create(product=product, image=jpeg_upload())
+
+    def test_variants_are_built_per_width_and_format(self):
+        variants = images.generate_variants(self.image.pk)
+        self.image.refresh_from_db()
+        self.assertEqual((self.image.width, self.image.height), (1000, 500))
+        self.assertEqual(
+            sorted((v["width"], v["height"], v["format"]) for v in variants),
+            [(w, w // 2, fmt) for w in (320, 640, 1000) for fmt in ("jpeg", "webp")],
+        )
+        for variant in variants:
+            with default_storage.open(variant["name"]) as f:
+                self.assertEqual(Image.open(f).size, (variant["width"], variant["height"]))
+
+    def test_srcset_lists_better_formats_first(self):
+        images.generate_variants(self.image.pk)
+        self.image.refresh_from_db()
+        entries = images.srcset(self.image.variants, str)
+        self.assertEqual(
+            [(e["type"], e["width"]) for e in entries],
+            [("image/webp", 320), ("image/webp", 640), ("image/webp", 1000),
+             ("image/jpeg", 320), ("image/jpeg", 640), ("image/jpeg", 1000)],
+        )
+        self.assertTrue(entries[0]["url"].startswith("/media/products/variants/"))
+
+    def test_delete_removes_variant_files(self):
+        variants = images.generate_variants(self.image.pk)
+        self.image.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.delete()
+        self.assertFalse(any(default_storage.exists(v["name"]) for v in variants))
+
+    def test_save_schedules_generation_and_logs_broker_errors(self):
+        with patch("app.shop.tasks.generate_image_variants.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.image.save()
+        delay.assert_called_once_with(self.image.pk)
+
+        with patch("app.shop.tasks.generate_image_variants.delay", side_effect=OSError("broker down")):
+            with self.assertLogs("app.shop.signals", "ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.image.save()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TELEGRAM_OUTBOX_EAGER_DRAIN=False, CELERY_TIMEZONE="Asia/Bishkek")
+class SalesReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Косилка", description="", price=1000)
+
+    def _order(self, created_at, quantity=1):
+        order = Order.objects.create(product=self.product, quantity=quantity)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def test_days_follow_shop_timezone(self):
+        # 19:00 UTC 1 марта — уже 2 марта в Бишкеке (UTC+6)
+        self._order(datetime(2026, 3, 1, 19, 0, tzinfo=dt_timezone.utc))
+        self._order(datetime(2026, 3, 1, 17, 0, tzinfo=dt_timezone.utc), quantity=2)
+
+        SalesDay.fill(date(2026, 3, 2), max_days=2)
+        days = dict(SalesDay.objects.values_list("date", "orders"))
+        self.assertEqual(days, {date(2026, 3, 1): 1, date(2026, 3, 2): 1})
+
+    def test_revenue_uses_price_at_order_time(self):
+        order = self._order(datetime(2026, 3, 1, 12, 0, tzinfo=dt_timezone.utc), quantity=2)
+        self.assertEqual(order.price, 1000)
+        Product.objects.filter(pk=self.product.pk).update(price=5000)
+
+        SalesDay.fill(date(2026, 3, 1), max_days=1)
+        self.assertEqual(SalesDay.objects.get(date=date(2026, 3, 1)).orders_revenue, 2000)
+
+    def test_generate_reports_sums_windows_and_is_idempotent(self):
+        self._order(datetime(2026, 3, 9, 12, 0, tzinfo=dt_timezone.utc))
+        self._order(datetime(2026, 3, 5, 12, 0, tzinfo=dt_timezone.utc))
+        self._order(datetime(2026, 2, 20, 12, 0, tzinfo=dt_timezone.utc))
+        CheckoutOrder.objects.create(
+            first_name="Иван", email="ivan@example.com", phone="+996700000000",
+            country="KG", city="Бишкек", address="ул. Пушкина, 1", total=300,
+        )
+        CheckoutOrder.objects.update(created_at=datetime(2026, 3, 9, 12, 0, tzinfo=dt_timezone.utc))
+
+        Report.generate_reports(today=date(2026, 3, 10))
+        Report.generate_reports(today=date(2026, 3, 10))
+
+        totals = {
+            r.report_type: (r.total_orders, r.total_revenue, r.period_start)
+            for r in Report.objects.filter(period_end=date(2026, 3, 9))
+        }
+        self.assertEqual(totals, {
+            "daily": (2, 1300, date(2026, 3, 9)),
+            "weekly": (3, 2300, date(2026, 3, 3)),
+            "monthly": (4, 3300, date(2026, 2, 8)),
+        })
+        self.assertEqual(Report.objects.count(), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="db", TELEGRAM_OUTBOX_EAGER_DRAIN=False)
+class LoadtestScenarioTests(TestCase):
+    """Сценарии нагрузочного прогона работают на маленьком наборе данных."""
+
+    def test_every_scenario_runs_without_errors(self):
+        from app.shop import loadtest
+
+        loadtest.seed(products=30, categories=2, reviews=5, visits=20, orders=3, log=lambda *a: None)
+        product_ids = loadtest.perf_product_ids()
+        for name, scenario in loadtest.SCENARIOS.items():
+            with self.subTest(name):
+                summary = loadtest.run_in_process(scenario, product_ids, iterations=3, warmup=1)
+                self.assertEqual(summary["errors"], 0)
+                self.assertEqual(summary["requests"], 3)
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Маршрутизация без реальной реплики: проверяем только решения роутера."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.router.has_replica = True
+        self.factory = RequestFactory()
+
+    def _route(self, request, *steps):
+        """Прогоняет steps внутри ReplicaPinMiddleware, возвращает (решения, ответ)."""
+        decisions = []
+
+        def view(request):
+            for op, model in steps:
+                if op == "read":
+                    decisions.append(self.router.db_for_read(model))
+                elif op == "fill":
+                    with catalog_fill_reads():
+                        decisions.append(self.router.db_for_read(model))
+                else:
+                    self.router.db_for_write(model)
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(view)(request)
+        return decisions, response
+
+    def test_outside_request_reads_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_catalog_reads_go_to_replica_and_cart_to_primary(self):
+        decisions, response = self._route(
+            self.factory.get("/"), ("read", Product), ("read", CartItem), ("write", Visit), ("read", Product),
+        )
+        self.assertEqual(decisions, ["replica", "default", "replica"])
+        self.assertNotIn("db_pin", response.cookies)
+
+    def test_catalog_write_pins_request_and_sets_cookie(self):
+        decisions, response = self._route(
+            self.factory.get("/"), ("read", Product), ("write", Product), ("read", Product),
+        )
+        self.assertEqual(decisions, ["replica", "default"])
+        self.assertIn("db_pin", response.cookies)
+
+        request = self.factory.get("/")
+        request.COOKIES["db_pin"] = response.cookies["db_pin"].value
+        decisions, _ = self._route(request, ("read", Product))
+        self.assertEqual(decisions, ["default"])
+
+    def test_unsafe_methods_read_primary(self):
+        decisions, _ = self._route(self.factory.post("/"), ("read", Product))
+        self.assertEqual(decisions, ["default"])
+
+    @override_settings(CACHES=LOCMEM_CACHE, REPLICA_PIN_SECONDS=60)
+    def test_cache_fill_after_catalog_change_reads_primary(self):
+        cache.clear()
+        decisions, _ = self._route(self.factory.get("/"), ("fill", Product))
+        self.assertEqual(decisions, ["replica"])
+
+        # правка каталога в другом запросе: реплика могла не догнать новую версию
+        bump_catalog_version()
+        decisions, response = self._route(self.factory.get("/"), ("fill", Product), ("read", Product))
+        self.assertEqual(decisions, ["default", "replica"])
+        self.assertNotIn("db_pin", response.cookies)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="db")
+class SessionWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Товар", description="", price=100, stock=5)
+
+    def test_reads_do_not_save_session(self):
+        self.client.post(f"/ru/api/v1/shop/favorites/{self.product.pk}/toggle/")
+        self.assertIn("sessionid", self.client.cookies)
+
+        for path in ("/ru/api/v1/shop/product/", "/ru/api/v1/shop/cart/"):
+            response = self.client.get(path)
+            self.assertNotIn("sessionid", response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    @override_settings(SESSION_REFRESH_INTERVAL=0)
+    def test_expiry_refreshed_after_interval(self):
+        self.client.post(f"/ru/api/v1/shop/favorites/{self.product.pk}/toggle/")
+        response = self.client.get("/ru/api/v1/shop/cart/")
+        self.assertIn("sessionid", response.cookies)
+
+
+class FlakyCache:
+    """Обёртка над кэшем: перечисленные в down методы падают, как при недоступном Redis."""
+
+    def __init__(self, cache):
+        self._cache = cache
+        self.down = set()
+
+    def __getattr__(self, name):
+        method = getattr(self._cache, name)
+        if name not in self.down:
+            return method
+
+        def fail(*args, **kwargs):
+            raise RedisConnectionError("Redis недоступен")
+        return fail
+
+    def __contains__(self, key):
+        return self.has_key(key)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SessionFallbackTests(TestCase):
+    READS = {"get", "has_key"}
+    WRITES = {"set", "add", "delete"}
+
+    def setUp(self):
+        cache.clear()
+        sessions._pending.clear()
+        self.addCleanup(sessions._pending.clear)
+        self.cache = FlakyCache(cache)
+        patcher = patch("django.contrib.sessions.backends.cache.caches", {"default": self.cache})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        session = sessions.SessionStore()
+        session["favorites"] = [1]
+        session.save()
+        self.key = session.session_key
+
+    def _load(self):
+        return dict(sessions.SessionStore(self.key).load())
+
+    def test_created_during_outage_is_found_after_recovery(self):
+        self.cache.down = self.READS | self.WRITES
+        with self.assertLogs("core.sessions", "WARNING"):
+            session = sessions.SessionStore()
+            session["favorites"] = [2]
+            session.save()
+        self.assertEqual(dict(sessions.SessionStore(session.session_key).load()), {"favorites": [2]})
+
+        self.cache.down = set()
+        self.assertEqual(dict(sessions.SessionStore(session.session_key).load()), {"favorites": [2]})
+        # перенесена в кэш, строка в БД больше не нужна
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(cache.get(sessions.SessionStore.cache_key_prefix + session.session_key), {"favorites": [2]})
+
+    def test_change_during_outage_beats_stale_cache_copy(self):
+        # запись в Redis не проходит, чтение ещё отдаёт старую копию
+        self.cache.down = set(self.WRITES)
+        session = sessions.SessionStore(self.key)
+        session["favorites"] = [1, 2]
+        with self.assertLogs("core.sessions", "WARNING"):
+            session.save()
+        self.assertEqual(Session.objects.count(), 1)
+
+        self.cache.down = set()
+        self.assertEqual(self._load(), {"favorites": [1, 2]})
+        self.assertFalse(Session.objects.exists())
+
+    def test_delete_during_outage_is_applied_after_recovery(self):
+        self.cache.down = set(self.WRITES)
+        sessions.SessionStore(self.key).delete()
+
+        self.cache.down = set()
+        self.assertEqual(self._load(), {})
+        self.assertIsNone(cache.get(sessions.SessionStore.cache_key_prefix + self.key))
+
+    def test_sync_waits_while_cache_is_down(self):
+        self.cache.down = set(self.WRITES)
+        session = sessions.SessionStore(self.key)
+        session["favorites"] = [3]
+        with self.assertLogs("core.sessions", "WARNING"):
+            session.save()
+            # кэш всё ещё лежит — сессия читается из БД и остаётся в очереди
+            self.cache.down = self.READS | self.WRITES
+            self.assertEqual(self._load(), {"favorites": [3]})
+        self.assertEqual(sessions._pending, {self.key})
+
+        self.cache.down = set()
+        self.assertEqual(self._load(), {"favorites": [3]})
+        self.assertEqual(sessions._pending, set())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FavoritesOverlayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = Product.objects.bulk_create(
+            Product(name=f"Товар {i}", description="", price=100 + i, stock=5) for i in range(3)
+        )
+
+    def _flags(self, client, path):
+        return {item["id"]: item["is_favorites"] for item in client.get(path).json()["results"]}
+
+    def test_shared_cache_with_per_user_flags(self):
+        favorite = self.products[0].pk
+        fan, other = self.client_class(), self.client_class()
+        fan.post(f"/ru/api/v1/shop/favorites/{favorite}/toggle/")
+
+        for path in ("/ru/api/v1/shop/product/", "/ru/api/v1/shop/async/product/"):
+            self.assertTrue(self._flags(fan, path)[favorite])
+            # второй пользователь получает ту же закэшированную страницу без чужих флагов
+            self.assertFalse(any(self._flags(other, path).values()))
+            self.assertTrue(self._flags(fan, path)[favorite])
+
+        self.assertEqual(fan.get("/ru/api/v1/shop/favorites/ids/").json(), {"ids": [favorite]})
+
+    @override_settings(TOP_RATED_MIN_REVIEWS=0)
+    def test_first_requester_flags_never_reach_cache(self):
+        # страницу кэширует пользователь с избранным — остальные не видят его флагов
+        favorite = self.products[1].pk
+        fan, anonymous = self.client_class(), self.client_class()
+        fan.post(f"/ru/api/v1/shop/favorites/{favorite}/toggle/")
+
+        for path in ("/ru/api/v1/shop/product/?cursor=", "/ru/api/v1/shop/product/top-rated/?limit=5"):
+            first = fan.get(path).json()
+            first = first["results"] if isinstance(first, dict) else first
+            self.assertEqual([item["id"] for item in first if item["is_favorites"]], [favorite])
+
+            later = anonymous.get(path).json()
+            later = later["results"] if isinstance(later, dict) else later
+            self.assertFalse(any(item["is_favorites"] for item in later))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TOP_RATED_MIN_REVIEWS=2)
+class ProductRatingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.good, self.bad = Product.objects.bulk_create(
+            Product(name=name, description="", price=100, stock=5) for name in ("Хороший", "Плохой")
+        )
+
+    def _review(self, product, rating, is_active=True):
+        return Reviews.objects.create(
+            product=product, title="t", name="n", description="d", email="e@example.test",
+            rating=rating, is_active=is_active,
+        )
+
+    def _rating(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum, product.rating_avg
+
+    def test_incremental_updates(self):
+        self._review(self.good, 5)
+        pending = self._review(self.good, 3, is_active=False)
+        self.assertEqual(self._rating(self.good), (1, 5, 5.0))
+
+        # как list_editable в админке: отзыв читается из БД и сохраняется
+        review = Reviews.objects.get(pk=pending.pk)
+        review.is_active = True
+        review.save()
+        self.assertEqual(self._rating(self.good), (2, 8, 4.0))
+
+        review.rating, review.product = 1, self.bad
+        review.save()
+        self.assertEqual(self._rating(self.good), (1, 5, 5.0))
+        self.assertEqual(self._rating(self.bad), (1, 1, 1.0))
+
+        Reviews.objects.get(pk=review.pk).delete()
+        self.assertEqual(self._rating(self.bad), (0, 0, 0.0))
+        self.assertEqual(rebuild_ratings(), 0)
+
+    def test_top_rated_and_ordering(self):
+        for rating in (5, 4):
+            self._review(self.good, rating)
+        for rating in (2, 1):
+            self._review(self.bad, rating)
+        lonely = Product.objects.create(name="Один отзыв", description="", price=100, stock=5)
+        self._review(lonely, 5)
+
+        response = self.client.get("/ru/api/v1/shop/product/top-rated/")
+        self.assertEqual([p["id"] for p in response.json()], [self.good.pk, self.bad.pk])
+
+        response = self.client.get("/ru/api/v1/shop/product/", {"ordering": "-rating_avg"})
+        self.assertEqual([p["id"] for p in response.json()["results"]], [lonely.pk, self.good.pk, self.bad.pk])
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="db", TELEGRAM_OUTBOX_EAGER_DRAIN=False)
+class CheckoutQuoteTests(TestCase):
+    URL = "/ru/api/v1/shop/checkout/"
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Косилка", description="", price=1000, stock=5)
+        self.client.post(f"/ru/api/v1/shop/cart/{self.product.pk}/add/")
+
+    def _preview(self):
+        response = self.client.get(self.URL, {"delivery_type": "express", "preferred_time": "10:30"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _create(self, quote_id):
+        data = dict(CheckoutStockTests.DATA, delivery_type="express", preferred_time="10:30", quote_id=quote_id)
+        return self.client.post(self.URL, data, content_type="application/json")
+
+    def test_create_charges_previewed_totals(self):
+        preview = self._preview()
+        self.assertEqual((preview["subtotal"], preview["shipping_cost"]), (1000, 700))
+
+        response = self._create(preview["quote_id"])
+        self.assertEqual(response.status_code, 201)
+        order = CheckoutOrder.objects.get()
+        self.assertEqual((order.total, order.delivery_note), (1700, preview["delivery_note"]))
+
+    def test_stale_quote_is_rejected(self):
+        preview = self._preview()
+        Product.objects.filter(pk=self.product.pk).update(price=1200)
+
+        response = self._create(preview["quote_id"])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quote_id", response.json())
+        self.assertFalse(CheckoutOrder.objects.exists())
+
+    def test_unrelated_catalog_change_keeps_quote(self):
+        preview = self._preview()
+        bump_catalog_version()  # модерация отзыва, новые копии фото и т. п.
+        self.assertEqual(self._create(preview["quote_id"]).status_code, 201)
+
+    @override_settings(CHECKOUT_SHIPPING={"standard": {"cost": "0", "eta_hours": 24}})
+    def test_unknown_shipping_rule_is_validation_error(self):
+        response = self._create("")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("delivery_type", response.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="db", TELEGRAM_OUTBOX_EAGER_DRAIN=False, IDEMPOTENCY_WAIT=0.3)
+class IdempotentCheckoutTests(TestCase):
+    URL = "/ru/api/v1/shop/checkout/"
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Косилка", description="", price=1000, stock=5)
+        self.client.post(f"/ru/api/v1/shop/cart/{self.product.pk}/add/")
+
+    def _create(self, key, **data):
+        return self.client.post(
+            self.URL, dict(CheckoutStockTests.DATA, **data), content_type="application/json",
+            headers={"Idempotency-Key": key},
+        )
+
+    def _scoped(self, key):
+        return scoped_key(self.client.cookies["visitor_id"].value, key)
+
+    def test_repeat_returns_stored_response_without_db(self):
+        first = self._create("order-1")
+        self.assertEqual((first.status_code, first["Idempotent-Replayed"]), (201, "false"))
+
+        with self.assertNumQueries(0):
+            second = self._create("order-1")
+        self.assertEqual((second.status_code, second["Idempotent-Replayed"]), (201, "true"))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(CheckoutOrder.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 4)
+
+        # кэш потерян — ответ восстанавливается из БД
+        cache.delete(RESULT_KEY.format(self._scoped("order-1")))
+        self.assertEqual(self._create("order-1").json(), first.json())
+        self.assertEqual(CheckoutOrder.objects.count(), 1)
+
+    def test_expired_key_can_be_reused(self):
+        first = self._create("order-1")
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(days=2))
+        cache.clear()
+        self.client.post(f"/ru/api/v1/shop/cart/{self.product.pk}/add/")
+
+        second = self._create("order-1")
+        self.assertEqual((second.status_code, second["Idempotent-Replayed"]), (201, "false"))
+        self.assertNotEqual(second.json(), first.json())
+        self.assertEqual(CheckoutOrder.objects.count(), 2)
+        self.assertEqual(IdempotencyRecord.objects.get().order_id, second.json()["id"])
+
+    def test_same_key_with_other_payload_is_rejected(self):
+        self.assertEqual(self._create("order-1").status_code, 201)
+        self.assertEqual(self._create("order-1", city="Ош").status_code, 422)
+
+    def test_errors_are_not_stored(self):
+        self.assertEqual(self._create("order-1", email="bad").status_code, 400)
+        self.assertEqual(self._create("order-1").status_code, 201)
+
+    def test_in_flight_duplicate_waits_for_first_response(self):
+        key = self._scoped("order-1")
+        cache.add(LOCK_KEY.format(key), 1)
+        self.assertEqual(self._create("order-1").status_code, 409)
+
+        # первый запрос заканчивает, пока дубль ждёт
+        body = {"id": 42}
+        fingerprint = request_fingerprint(CheckoutStockTests.DATA)
+        timer = threading.Timer(0.1, cache.set, (RESULT_KEY.format(key), (fingerprint, 201, body)))
+        timer.start()
+        response = self._create("order-1")
+        timer.join()
+        self.assertEqual((response.status_code, response.json()), (201, body))
+        self.assertFalse(CheckoutOrder.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class VisitRecorderTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _recorder(self, **kwargs):
+        options = dict(
+            session_timeout=timedelta(minutes=30), buffer_size=3, flush_interval=3600, max_visitors=100
+        )
+        options.update(kwargs)
+        return VisitRecorder(**options)
+
+    def test_visits_are_buffered_until_batch_is_full(self):
+        recorder = self._recorder()
+        recorder.track("a", "127.0.0.1", "", is_new=True)
+        recorder.track("a", "127.0.0.1", "")
+        recorder.track("b", "127.0.0.1", "", is_new=True)
+        self.assertFalse(Visit.objects.exists())
+
+        recorder.track("c", "127.0.0.1", "", is_new=True)
+        self.assertEqual(sorted(Visit.objects.values_list("visitor_id", flat=True)), ["a", "b", "c"])
+
+    def test_track_without_io_only_buffers(self):
+        recorder = self._recorder(buffer_size=1, flush_interval=0)
+        self.assertFalse(recorder.track("a", "127.0.0.1", "", is_new=True, allow_io=False))
+        self.assertTrue(recorder.track("a", "127.0.0.1", "", is_new=True))
+        recorder.track("b", "127.0.0.1", "", is_new=True)
+        recorder._buffer.append(Visit(visitor_id="c", started_at=datetime.now(dt_timezone.utc)))
+
+        # сброс стал положен, но без I/O пачку не забираем и не пишем
+        with patch.object(recorder, "_write") as write, self.assertNumQueries(0):
+            self.assertTrue(recorder.track("a", "127.0.0.1", "", allow_io=False))
+        write.assert_not_called()
+        self.assertEqual(len(recorder._buffer), 1)
+        recorder.flush()
+        self.assertEqual(Visit.objects.count(), 3)
+
+    def test_workers_share_visit_start(self):
+        first, second = self._recorder(), self._recorder()
+        first.track("a", "127.0.0.1", "", is_new=True)
+        second.track("a", "127.0.0.1", "")
+        first.flush()
+        second.flush()
+        self.assertEqual(Visit.objects.count(), 1)
+
+    def test_flusher_writes_without_new_requests(self):
+        recorder = self._recorder(flush_interval=0.05)
+        recorder.start_flusher()
+        try:
+            recorder.track("a", "127.0.0.1", "", is_new=True)
+            deadline = time.monotonic() + 2
+            while not Visit.objects.exists() and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            recorder.stop()
+        self.assertEqual(Visit.objects.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, METRICS_ALLOWED_IPS=["127.0.0.1"])
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _series(self, histogram, *labels):
+        return histogram._series.get(tuple(labels))
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("test_seconds", "Тест", ("view",), (0.1, 1))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 4.25',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
+
+    def test_middleware_records_view_and_sql(self):
+        Product.objects.create(name="Косилка", description="", price=1000)
+        view = "product-list"
+        before = self._series(metrics.DB_QUERIES, view)
+        before_count = before[1] if before else 0
+
+        self.assertEqual(self.client.get("/ru/api/v1/shop/product/?page=1").status_code, 200)
+        series = self._series(metrics.DB_QUERIES, view)
+        self.assertEqual(series[1], before_count + 1)
+        self.assertGreater(series[2], 0)  # SQL-запросы посчитаны
+        self.assertIsNotNone(self._series(metrics.REQUEST_SECONDS, view, "GET", 200))
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs("app.analytics.middleware", "WARNING") as logs:
+            self.client.get("/ru/api/v1/shop/product/?page=1")
+        self.assertIn("SELECT", logs.output[0])
+
+    def test_metrics_view(self):
+        self.client.get("/ru/api/v1/shop/product/?page=1")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("shop_http_request_duration_seconds_bucket", response.content.decode())
+        # опрос Prometheus не считается визитом
+        self.assertNotIn("visitor_id", response.cookies)
+
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TELEGRAM_OUTBOX_EAGER_DRAIN=False)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(name="Косилка", description="", price=1000)
+        cls.orders = [
+            Order.objects.create(product=product, user_name="Иван", user_phone="+996700000000", user_address="Бишкек"),
+            Order.objects.create(product=product, user_name='=HYPERLINK("http://evil")', user_address="@SUM(A1)"),
+            Order.objects.create(product=product, user_name="Пётр"),
+        ]
+        Order.objects.filter(pk=cls.orders[2].pk).update(created_at=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_csv_cells_cannot_start_formulas(self):
+        spec = EXPORTS["orders"]
+        rows = list(csv.reader("".join(export_lines(spec, "csv", spec.queryset(), chunk_size=2)).splitlines()))
+        self.assertEqual(rows[0], list(spec.fields))
+        self.assertEqual(rows[1][5:], ["Иван", "'+996700000000", "Бишкек"])
+        self.assertEqual(rows[2][5:], ["'=HYPERLINK(\"http://evil\")", "", "'@SUM(A1)"])
+
+    def test_admin_actions_export_selected_rows(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(admin)
+        selected = [self.orders[0].pk, self.orders[1].pk]
+
+        response = self.client.post(
+            "/admin/shop/order/", {"action": "export_jsonl", "_selected_action": selected}
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        self.assertTrue(response["Content-Disposition"].startswith('attachment; filename="orders-'))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        # JSONL не открывают в Excel — значения как есть
+        self.assertEqual(
+            sorted(json.loads(line)["user_name"] for line in lines), ['=HYPERLINK("http://evil")', "Иван"]
+        )
+
+        response = self.client.post("/admin/shop/order/", {"action": "export_csv", "_selected_action": selected})
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 3)
+
+    def test_export_data_command_filters_by_date(self):
+        output = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
+        output.close()
+        self.addCleanup(os.unlink, output.name)
+
+        call_command(
+            "export_data", "orders", "--format", "jsonl", "--since", "2026-01-01", "--until", "2026-01-02",
+            "--output", output.name, stderr=StringIO(),
+        )
+        with open(output.name, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row["id"] for row in rows], [self.orders[2].pk])
+        self.assertEqual(rows[0]["product__name"], "Косилка")
+
+
+class VisitRollupTests(TestCase):
+    # время магазина (Asia/Bishkek, UTC+6): дневные итоги считаются по нему
+    NOW = datetime(2026, 3, 2, 1, 30, tzinfo=sales_timezone())
+
+    def _visit(self, visitor, hours_ago, agent="Firefox", now=NOW):
+        Visit.objects.create(visitor_id=visitor, user_agent=agent, started_at=now - timedelta(hours=hours_ago))
+
+    def _rollup(self, now=NOW):
+        with patch("django.utils.timezone.now", return_value=now):
+            rollup_visits()
+
+    def _daily(self, day):
+        stat = VisitDailyStat.objects.get(period_start=datetime(2026, 3, day, tzinfo=sales_timezone()))
+        return stat.visits, stat.unique_visitors, [a["user_agent"] for a in stat.top_user_agents]
+
+    def test_hourly_and_daily_stats(self):
+        self._visit("a", 3)  # 1 марта, 22:30
+        self._visit("b", 3, agent="Chrome")
+        self._visit("a", 2)  # 23:30 — тот же посетитель, другой час
+        self._visit("c", 1)  # 2 марта, 00:30
+        self._visit("d", 0)  # текущий час не закрыт
+        self._rollup()
+
+        self.assertEqual(
+            list(VisitHourlyStat.objects.order_by("period_start").values_list("visits", "unique_visitors")),
+            [(2, 2), (1, 1), (1, 1)],
+        )
+        self.assertEqual(self._daily(1), (3, 2, ["Firefox", "Chrome"]))
+        self.assertEqual(self._daily(2), (1, 1, ["Firefox"]))
+
+    def test_next_run_recomputes_only_new_hours(self):
+        now = self.NOW + timedelta(hours=4)  # 2 марта, 05:30
+        self._visit("a", 4, now=now)  # 01:30
+        self._visit("b", 1, now=now)  # 04:30
+        self._rollup(now)
+        # закрытые часы больше не читаются из Visit, день собирается из часов
+        VisitHourlyStat.objects.filter(period_start=now.replace(hour=1, minute=0)).update(visits=10)
+
+        self._visit("c", 1, agent="Chrome", now=now)  # дописан из буфера в последний час
+        self._visit("b", 0, now=now)
+        self._rollup(now + timedelta(hours=1))
+
+        self.assertEqual(
+            list(VisitHourlyStat.objects.order_by("period_start").values_list("visits", flat=True)), [10, 2, 1]
+        )
+        self.assertEqual(self._daily(2), (13, 3, ["Firefox", "Chrome"]))
+
+    def test_days_follow_shop_timezone(self):
+        now = datetime(2026, 3, 2, 19, 30, tzinfo=dt_timezone.utc)  # 3 марта, 01:30 в магазине
+        self._visit("a", 2, now=now)  # 17:30 UTC — 23:30, ещё 2 марта
+        self._visit("b", 1, now=now)  # 18:30 UTC — 00:30, в UTC ещё 2 марта
+        self._visit("a", 1, now=now)
+        self._rollup(now)
+
+        self.assertEqual(self._daily(2), (1, 1, ["Firefox"]))
+        self.assertEqual(self._daily(3), (2, 2, ["Firefox"]))
+        self.assertEqual(VisitDailyStat.objects.count(), 2)
+
+
+class FakeRedis:
+    """Хэши в памяти; down = True — как недоступный Redis."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise RedisConnectionError("redis down")
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hgetall(self, name):
+        self._check()
+        return {str(k).encode(): str(v).encode() for k, v in self.hashes.get(name, {}).items()}
+
+    def hincrby(self, name, field, amount):
+        self._check()
+        values = self.hashes.setdefault(name, {})
+        values[int(field)] = values.get(int(field), 0) + amount
+        return values[int(field)]
+
+    def hdel(self, name, field):
+        self._check()
+        self.hashes.get(name, {}).pop(int(field), None)
+
+    def delete(self, name):
+        self._check()
+        self.hashes.pop(name, None)
+
+    def expire(self, name, seconds):
+        self._check()
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        self.client._check()
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="db")
+class CartTests(TestCase):
+    URL = "/ru/api/v1/shop/cart/"
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Косилка", description="", price=1000, stock=5)
+
+    def test_unknown_product_is_404(self):
+        response = self.client.post(f"{self.URL}999999/add/")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_expired_row_starts_from_zero(self):
+        store = DatabaseCartStore()
+        store.add("k", self.product.pk, 3)
+        CartItem.objects.update(updated_at=timezone.now() - timedelta(seconds=CART_TTL + 60))
+        self.assertEqual(store.items("k"), {})
+
+        store.add("k", self.product.pk)
+        self.assertEqual(store.items("k"), {self.product.pk: 1})
+
+    def test_foreign_visitor_cookie_is_replaced(self):
+        self.client.cookies["visitor_id"] = "x" * 500
+        response = self.client.post(f"{self.URL}{self.product.pk}/add/")
+        self.assertEqual(response.status_code, 200)
+        visitor_id = response.cookies["visitor_id"].value
+        self.assertEqual(CartItem.objects.get().cart_key, str(uuid.UUID(visitor_id)))
+
+    def test_redis_adopts_rows_written_during_outage(self):
+        self.addCleanup(cart_module._pending.clear)
+        client = FakeRedis()
+        store = RedisCartStore(client)
+        store.add("k", self.product.pk)
+
+        client.down = True
+        store.add("k", self.product.pk)
+        self.assertEqual(store.items("k"), {self.product.pk: 1})
+
+        client.down = False
+        # перенос делает любой следующий запрос процесса, не только к этой корзине
+        RedisCartStore(client).items("other")
+        self.assertEqual(store.items("k"), {self.product.pk: 2})
+        self.assertFalse(CartItem.objects.exists())
+        store.remove("k", self.product.pk)
+        self.assertEqual(store.items("k"), {})
+
+    def test_healthy_redis_path_does_not_query_db(self):
+        store = RedisCartStore(FakeRedis())
+        with self.assertNumQueries(0):
+            store.add("k", self.product.pk, 2)
+            store.decrement("k", self.product.pk)
+            self.assertEqual(store.items("k"), {self.product.pk: 1})
+            store.clear("k")
+
+
+def import_bot():
+    # модуль бота читает токен и хранилище FSM при импорте
+    with override_settings(TELEGRAM_BOT_TOKEN="42:TEST", BOT_FSM_REDIS_URL=""):
+        from app.telegrom import bot
+    return bot
+
+
+def run_asgi(app, scope, messages):
+    """Прогоняет ASGI-вызов, ждёт фоновые задачи webhook и возвращает отправленное."""
+    sent = []
+    incoming = list(messages)
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def call():
+        await app(scope, receive, send)
+        if getattr(app, "_tasks", None):
+            await asyncio.wait(app._tasks)
+
+    asyncio.run(call())
+    return sent
+
+
+class FakeShopRepository:
+    """ShopRepository без БД: каталог из списка, заказы в память."""
+
+    def __init__(self, rows, delay=0):
+        self.rows = rows
+        self.delay = delay
+        self.loads = 0
+        self.orders = []
+        self.error = None
+
+    async def catalog_rows(self):
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        return list(self.rows)
+
+    async def create_order(self, **fields):
+        if self.error is not None:
+            raise self.error
+        self.orders.append(fields)
+
+
+class TelegramBotTests(SimpleTestCase):
+    def setUp(self):
+        self.bot = import_bot()
+        from aiogram import Bot
+        from app.telegrom.bench import FakeSession
+
+        class RecordingSession(FakeSession):
+            def __init__(self):
+                super().__init__(0)
+                self.texts = []
+                self.retry_after = None
+
+            async def make_request(self, bot, method, timeout=None):
+                if self.retry_after is not None:
+                    retry_after, self.retry_after = self.retry_after, None
+                    raise TelegramRetryAfter(method, "Too Many Requests", retry_after)
+                if getattr(method, "text", None):
+                    self.texts.append(method.text)
+                return await super().make_request(bot, method, timeout)
+
+        rows = [(n, f"Товар {n}", Decimal(100 + n), "") for n in range(1, 21)]
+        self.repository = FakeShopRepository(rows)
+        for name, value in (
+            ("repository", self.repository), ("catalog", self.bot.CatalogSnapshot(60)),
+        ):
+            patcher = patch.object(self.bot, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.session = RecordingSession()
+        self.aiobot = Bot("42:TEST", session=self.session)
+
+    def _buttons(self, keyboard):
+        return [[button.callback_data for button in row] for row in keyboard.inline_keyboard]
+
+    def test_render_page(self):
+        items = [self.bot.ProductItem(*row) for row in self.repository.rows]
+        text, keyboard = self.bot.render_page(items, 2)
+        self.assertTrue(text.startswith("🛍️ Товары (стр. 2 из 3):"))
+        self.assertIn("9. 📦 Товар 9 — 💰 109", text)
+        buttons = self._buttons(keyboard)
+        self.assertEqual([row[0] for row in buttons[:-1]], [f"details_{n}" for n in range(9, 17)])
+        self.assertEqual(buttons[-1], ["page_1", "noop", "page_3"])
+
+        # номер страницы за пределами — крайняя страница
+        self.assertEqual(self._buttons(self.bot.render_page(items, 99)[1])[-1], ["page_2", "noop"])
+        # одна страница — без навигации
+        self.assertEqual(len(self._buttons(self.bot.render_page(items[:3], 1)[1])), 3)
+
+    def test_catalog_snapshot_loads_once_and_refreshes(self):
+        self.repository.delay = 0.01
+        snapshot = self.bot.CatalogSnapshot(60)
+
+        async def scenario():
+            await asyncio.gather(*(snapshot.get() for _ in range(10)))
+            self.assertEqual(self.repository.loads, 1)
+            self.assertEqual(snapshot.product(5).name, "Товар 5")
+
+            self.repository.rows = self.repository.rows[:1]
+            await snapshot.get()
+            self.assertEqual(self.repository.loads, 1)
+            snapshot.invalidate()
+            await snapshot.get()
+            self.assertEqual((self.repository.loads, snapshot.product(5)), (2, None))
+
+            snapshot.ttl = 0
+            await snapshot.get()
+            self.assertEqual(self.repository.loads, 3)
+
+        asyncio.run(scenario())
+
+    def _order_with_address(self, product_id):
+        from aiogram.types import Update
+
+        async def scenario():
+            context = self.bot.dp.fsm.get_context(bot=self.aiobot, chat_id=7, user_id=7)
+            await context.set_state(self.bot.OrderForm.address)
+            await context.set_data({"product_id": product_id, "user_name": "Иван", "user_phone": "+996700000000"})
+            message = {
+                "message_id": 1, "date": 0, "text": "ул. Пушкина, 1",
+                "chat": {"id": 7, "type": "private"},
+                "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+            }
+            update = Update.model_validate({"update_id": 1, "message": message}, context={"bot": self.aiobot})
+            await self.bot.dp.feed_update(self.aiobot, update)
+            return await context.get_state()
+
+        return asyncio.run(scenario())
+
+    def test_order_is_created(self):
+        self.assertIsNone(self._order_with_address(5))
+        self.assertEqual(self.repository.orders[0]["product_id"], 5)
+        self.assertTrue(self.session.texts[0].startswith("✅ Ваш заказ оформлен!"))
+
+    def test_order_for_missing_product(self):
+        self.assertIsNone(self._order_with_address(999))
+        self.assertEqual(self.repository.orders, [])
+        self.assertEqual(self.session.texts[0], "😔 Этот товар больше недоступен, выберите другой:")
+
+    def test_order_for_product_deleted_after_snapshot(self):
+        self.repository.error = IntegrityError()
+        self.assertIsNone(self._order_with_address(5))
+        self.assertEqual(self.session.texts[0], "😔 Этот товар больше недоступен, выберите другой:")
+        # снимок сброшен: каталог после ошибки перечитан
+        self.assertEqual(self.repository.loads, 2)
+
+    def test_rate_limiter_reserve(self):
+        limiter = RateLimiter(per_chat=1, global_rate=10)
+        self.assertEqual(limiter.reserve("a"), 0)
+        self.assertAlmostEqual(limiter.reserve("a"), 1, delta=0.01)
+        # другой чат не ждёт очередь первого: свободный слот через общий интервал
+        self.assertAlmostEqual(limiter.reserve("b"), 0.1, delta=0.01)
+        self.assertAlmostEqual(limiter.reserve("c"), 0.2, delta=0.01)
+
+    def test_rate_limit_middleware_waits_without_blocking(self):
+        limiter = RateLimiter(per_chat=10, global_rate=1000)
+        self.session.middleware(self.bot.RateLimitMiddleware())
+
+        async def scenario():
+            started = time.monotonic()
+            await asyncio.gather(
+                *(self.aiobot.send_message(7, f"чат 7: {n}") for n in range(3)),
+                *(self.aiobot.send_message(8, f"чат 8: {n}") for n in range(3)),
+            )
+            return time.monotonic() - started
+
+        with patch.object(self.bot, "rate_limiter", limiter):
+            elapsed = asyncio.run(scenario())
+        # по 3 сообщения в два чата идут параллельно: 2 интервала по 100 мс, а не 5
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(len(self.session.texts), 6)
+
+    def test_fake_session_streams_nothing(self):
+        async def read():
+            return [chunk async for chunk in self.session.stream_content("https://example.com/file")]
+
+        self.assertEqual(asyncio.run(read()), [])
+
+    def test_rate_limit_middleware_retries_once(self):
+        self.session.middleware(self.bot.RateLimitMiddleware())
+        self.session.retry_after = 0
+        asyncio.run(self.aiobot.send_message(7, "повтор"))
+        self.assertEqual(self.session.texts, ["повтор"])
+
+
+@override_settings(TELEGRAM_OUTBOX_EAGER_DRAIN=False)
+class ShopRepositoryTests(TransactionTestCase):
+    def setUp(self):
+        from app.telegrom.repository import ShopRepository
+
+        self.repository = ShopRepository(8)
+        self.addCleanup(self.repository.close)
+        self.addCleanup(self._close_pool_connections)
+        self.mower = Product.objects.create(name="Косилка", description="d", price=1000)
+        self.trimmer = Product.objects.create(name="Триммер", description="", price=500)
+
+    def _close_pool_connections(self):
+        # у потоков пула свои соединения, иначе они переживут тест
+        asyncio.run(self.repository._run(connections.close_all))
+
+    def test_sqlite_pool_has_one_writer(self):
+        self.assertEqual(self.repository.threads, 1 if connection.vendor == "sqlite" else 8)
+
+    def test_catalog_rows_and_create_order_run_in_pool(self):
+        def thread_name():
+            return threading.current_thread().name
+
+        async def scenario():
+            rows = await self.repository.catalog_rows()
+            orders = await asyncio.gather(*(
+                self.repository.create_order(
+                    product_id=self.trimmer.pk, quantity=2,
+                    user_name=f"Покупатель {n}", user_phone="+996700000000", user_address="ул. Пушкина, 1",
+                )
+                for n in range(5)
+            ))
+            return rows, orders, await self.repository._run(thread_name)
+
+        rows, orders, name = asyncio.run(scenario())
+        self.assertEqual(rows, [
+            (self.mower.pk, "Косилка", Decimal("1000.00"), "d"),
+            (self.trimmer.pk, "Триммер", Decimal("500.00"), ""),
+        ])
+        self.assertTrue(name.startswith("bot-db"))
+        self.assertEqual(Order.objects.filter(product=self.trimmer, price=500, quantity=2).count(), 5)
+        self.assertEqual({o.pk for o in orders}, set(Order.objects.values_list("pk", flat=True)))
+
+
+@override_settings(BOT_WEBHOOK_URL="https://shop.example/tg/hook", BOT_WEBHOOK_SECRET="s3cret", BOT_WEBHOOK_CONCURRENCY=4)
+class TelegramWebhookTests(SimpleTestCase):
+    def setUp(self):
+        import_bot()
+        from aiogram import Bot
+        from app.telegrom.bench import FakeSession
+        from app.telegrom.repository import ShopRepository
+        from app.telegrom.webhook import TelegramWebhook
+
+        self.django_paths = []
+
+        async def django_app(scope, receive, send):
+            self.django_paths.append(scope["path"])
+
+        self.webhook = TelegramWebhook(django_app)
+        self.session = FakeSession(0)
+        self.webhook.bot = Bot("42:TEST", session=self.session)
+        self.webhook.repository = ShopRepository(1)
+
+    def _post(self, body, secret="s3cret", method="POST", path="/tg/hook"):
+        headers = [(b"x-telegram-bot-api-secret-token", secret.encode())] if secret is not None else []
+        scope = {"type": "http", "method": method, "path": path, "headers": headers}
+        sent = run_asgi(self.webhook, scope, [{"type": "http.request", "body": body}])
+        return sent[0]["status"] if sent else None
+
+    def test_secret_is_required(self):
+        from app.telegrom.webhook import TelegramWebhook
+
+        with override_settings(BOT_WEBHOOK_SECRET=""), self.assertRaises(ImproperlyConfigured):
+            TelegramWebhook(None)
+
+    def test_other_paths_go_to_django(self):
+        self._post(b"", path="/ru/api/v1/shop/product/")
+        self.assertEqual(self.django_paths, ["/ru/api/v1/shop/product/"])
+
+    def test_bad_requests_are_rejected(self):
+        update = json.dumps({"update_id": 1}).encode()
+        self.assertEqual(self._post(update, method="GET"), 405)
+        self.assertEqual(self._post(update, secret=None), 403)
+        self.assertEqual(self._post(update, secret="wrong"), 403)
+        self.assertEqual(self._post(b"{not json"), 400)
+        self.assertEqual(self.session.calls, 0)
+
+    def test_update_is_acked_and_processed(self):
+        message = {
+            "message_id": 1, "date": 0, "text": "/start",
+            "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+        }
+        self.assertEqual(self._post(json.dumps({"update_id": 1, "message": message}).encode()), 200)
+        self.assertEqual(self.session.calls, 1)
+
+    def test_lifespan_registers_webhook_and_shuts_down(self):
+        sent = run_asgi(
+            self.webhook, {"type": "lifespan"},
+            [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}],
+        )
+        self.assertEqual(
+            [m["type"] for m in sent], ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.assertEqual(self.session.calls, 1)  # setWebhook
@@ -1,6 +1,7 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
 from app.shop.views import ProductViewSet, ReviewsViewSet, FavoriteProductViewSet, CartViewSet, CheckoutView, ContactAPI
+from app.shop import async_views
 
 router = DefaultRouter()
 router.register(r'product', ProductViewSet, basename='product')
@@ -11,6 +12,9 @@ router.register(r'contact', ContactAPI, basename='contact')
 
 urlpatterns = [
     path("checkout/", CheckoutView.as_view(), name="checkout"),
+    path("async/product/", async_views.product_list, name="async-product-list"),
+    path("async/product/<int:pk>/", async_views.product_detail, name="async-product-detail"),
+    path("async/reviews/", async_views.reviews_list, name="async-reviews-list"),
 ]
 
 urlpatterns += router.urls
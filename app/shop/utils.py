@@ -1,21 +1,111 @@
+import asyncio
 import requests
 import os
+import threading
+import time
+from bisect import bisect_left, insort
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
-def send_telegram_message(text: str):
-    token = os.getenv("BOT_TOKEN", getattr(settings, "BOT_TOKEN", None))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+class TelegramError(Exception):
+    def __init__(self, message, retry_after=None, permanent=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        # 400/403: повтор не поможет (битая разметка, бот заблокирован)
+        self.permanent = permanent
+
+
+class RateLimiter:
+    """
+    Ограничение Telegram: не чаще per_chat сообщений в секунду в один чат
+    и global_rate сообщений в секунду на бота в целом.
+
+    Занятые моменты отправки хранятся списком: очередь одного чата занимает
+    слоты в будущем, а сообщение в другой чат встаёт в свободный промежуток
+    между ними, а не после всей очереди.
+    """
+
+    def __init__(self, per_chat=1, global_rate=30):
+        self.chat_interval = 1 / per_chat
+        self.global_interval = 1 / global_rate
+        self._lock = threading.Lock()
+        self._chat_next = {}
+        self._slots = []  # отсортированные моменты отправки
+
+    def reserve(self, chat_id):
+        """Занимает ближайший слот, возвращает сколько до него ждать (сек)."""
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._chat_next.get(chat_id, 0.0))
+            slots = self._slots
+            del slots[:bisect_left(slots, now - self.global_interval)]
+            # ближе global_interval к чужому слоту нельзя — сдвигаемся за него
+            i = bisect_left(slots, at - self.global_interval)
+            while i < len(slots) and slots[i] < at + self.global_interval:
+                at = max(at, slots[i] + self.global_interval)
+                i += 1
+            insort(slots, at)
+            self._chat_next[chat_id] = at + self.chat_interval
+        return at - now
+
+    def wait(self, chat_id):
+        delay = self.reserve(chat_id)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def await_slot(self, chat_id):
+        # для aiogram: ждём, не блокируя event loop и ответы другим чатам
+        delay = self.reserve(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+rate_limiter = RateLimiter(
+    per_chat=getattr(settings, "TELEGRAM_RATE_PER_CHAT", 1),
+    global_rate=getattr(settings, "TELEGRAM_RATE_GLOBAL", 30),
+)
+
+
+def telegram_credentials():
+    token = os.getenv("BOT_TOKEN", getattr(settings, "TELEGRAM_BOT_TOKEN", None))
     chat_id = os.getenv("ADMIN_CHAT_ID", getattr(settings, "ADMIN_CHAT_ID", None))
+    return token, chat_id
+
 
+def post_telegram_message(text: str, chat_id=None, parse_mode="HTML"):
+    """Отправка через общий пул соединений; ошибки — TelegramError."""
+    token, default_chat_id = telegram_credentials()
+    chat_id = chat_id or default_chat_id
     if not token or not chat_id:
-        print("⚠️ Telegram credentials not set.")
-        return False
+        raise TelegramError("Telegram credentials not set.")
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+    base_url = getattr(settings, "TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+    payload = {"chat_id": chat_id, "text": text}
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
 
+    rate_limiter.wait(str(chat_id))
     try:
-        requests.post(url, data=payload, timeout=10)
-        return True
+        response = _session.post(f"{base_url}/bot{token}/sendMessage", data=payload, timeout=10)
     except requests.RequestException as e:
-        print("Telegram send failed:", e)
-        return False
+        raise TelegramError(str(e)) from e
+
+    if response.status_code == 200:
+        return response
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    retry_after = (body.get("parameters") or {}).get("retry_after")
+    raise TelegramError(
+        body.get("description") or f"HTTP {response.status_code}",
+        retry_after=retry_after,
+        permanent=response.status_code in (400, 403),
+    )
@@ -5,50 +5,111 @@ from django.core.cache import cache
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework import status, mixins
-from datetime import time
 from datetime import time as dt_time
-from decimal import Decimal
-from django.utils import timezone
+from django.conf import settings
 
 from app.shop.models import Product, Reviews, Contact
-from app.shop.serializers import ProductSerializer, ReviewsSerializer, CheckoutCreateSerializer, ContactSerializers
-from app.shop.filters import ProductFilter
+from app.shop.serializers import ProductSerializer, ReviewsSerializer, CheckoutCreateSerializer, CheckoutOrderSerializer, ContactSerializers
+from app.shop.filters import ProductFilter, ProductSearchFilter
+from app.shop.pagination import ShopPagination, ShopCursorPagination
+from app.shop.cart import get_cart_store, get_cart_key, cart_summary
+from app.shop.favorites import SESSION_KEY as FAVORITES_SESSION_KEY, get_favorites, overlay_favorites
+from app.shop.cache import product_list_cache_key, bump_catalog_version, catalog_fill_reads, PRODUCT_LIST_TIMEOUT
+from app.shop.pricing import QuoteError, build_quote, save_quote
+from app.shop.idempotency import HEADER as IDEMPOTENCY_HEADER, IdempotencyError, idempotent, request_fingerprint, scoped_key
+from app.analytics.metrics import record_cache
+
+TOP_RATED_LIMIT = 12
+TOP_RATED_MAX_LIMIT = 50
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related("category").prefetch_related("images")
     serializer_class = ProductSerializer
+    pagination_class = ShopPagination
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ["name", "description", "price"]
-    ordering_fields = ["price"]
+    search_fields = ["name"]
+    ordering_fields = ["price", "rating_avg", "rating_count"]
+
+    @property
+    def paginator(self):
+        # ?cursor= (в т.ч. пустой для первой страницы) включает keyset-режим.
+        # Курсор сортирует по id и сбросил бы порядок релевантности ?search=,
+        # поэтому поиск всегда листается по номерам страниц.
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            if (
+                request is not None
+                and ShopCursorPagination.cursor_query_param in request.query_params
+                and not request.query_params.get(ProductSearchFilter.search_param, "").strip()
+            ):
+                self._paginator = ShopCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # выдачи списков общие для всех и кэшируются; избранное накладываем при ответе
+        shared = self.action in ("list", "top_rated")
+        context["favorites"] = frozenset() if shared else get_favorites(self.request)
+        return context
 
     def list(self, request, *args, **kwargs):
-        cache_key = "products_list"
+        cache_key = product_list_cache_key(request.query_params)
         products = cache.get(cache_key)
+        record_cache("products_list", products is not None)
 
-        if not products:
-            queryset = self.filter_queryset(self.get_queryset())
-            serializer = self.get_serializer(queryset, many=True)
-            products = serializer.data
-            cache.set(cache_key, products, timeout=60)
+        if products is None:
+            with catalog_fill_reads():
+                queryset = self.filter_queryset(self.get_queryset())
+                page = self.paginate_queryset(queryset)
+                serializer = self.get_serializer(page, many=True)
+                products = self.get_paginated_response(serializer.data).data
+            cache.set(cache_key, products, timeout=PRODUCT_LIST_TIMEOUT)
 
+        overlay_favorites(products["results"], get_favorites(request))
+        return Response(products)
+
+    @action(detail=False, methods=["get"], url_path="top-rated")
+    def top_rated(self, request):
+        try:
+            limit = min(max(int(request.query_params.get("limit", TOP_RATED_LIMIT)), 1), TOP_RATED_MAX_LIMIT)
+        except ValueError:
+            limit = TOP_RATED_LIMIT
+        cache_key = product_list_cache_key(request.query_params, params={"limit"}, prefix="products_top_rated")
+        products = cache.get(cache_key)
+        record_cache("products_top_rated", products is not None)
+
+        if products is None:
+            # идёт по индексу shop_product_top_rated, без агрегации отзывов
+            queryset = (
+                self.get_queryset()
+                .filter(rating_count__gte=settings.TOP_RATED_MIN_REVIEWS)
+                .order_by("-rating_avg", "-rating_count", "id")[:limit]
+            )
+            with catalog_fill_reads():
+                products = self.get_serializer(queryset, many=True).data
+            cache.set(cache_key, products, timeout=PRODUCT_LIST_TIMEOUT)
+
+        overlay_favorites(products, get_favorites(request))
         return Response(products)
 
     def perform_create(self, serializer):
         product = serializer.save()
-        cache.delete("products_list")
+        bump_catalog_version()
         return product
 
     def perform_update(self, serializer):
         product = serializer.save()
-        cache.delete("products_list")
+        bump_catalog_version()
         return product
 
     def perform_destroy(self, instance):
         instance.delete()
-        cache.delete("products_list")
+        bump_catalog_version()
 
 
 class ReviewsViewSet(viewsets.ModelViewSet):
@@ -59,13 +120,20 @@ class ReviewsViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         if self.request.method == "GET":
             queryset = queryset.filter(is_active=True)
+            product = self.request.query_params.get("product")
+            if product and product.isdigit():
+                queryset = queryset.filter(product_id=product)
         return queryset
 
 
 class FavoriteProductViewSet(viewsets.ViewSet):
+    @action(detail=False, methods=["get"])
+    def ids(self, request):
+        return Response({"ids": sorted(get_favorites(request))})
+
     @action(detail=True, methods=["post"])
     def toggle(self, request, pk=None):
-        favorites = request.session.get("favorites", [])
+        favorites = request.session.get(FAVORITES_SESSION_KEY, [])
 
         if int(pk) in favorites:
             favorites.remove(int(pk))
@@ -74,110 +142,58 @@ class FavoriteProductViewSet(viewsets.ViewSet):
             favorites.append(int(pk))
             is_favorite = True
 
-        request.session["favorites"] = favorites
+        request.session[FAVORITES_SESSION_KEY] = favorites
         request.session.modified = True
 
         return Response({"product_id": pk, "is_favorite": is_favorite})
 
     def list(self, request):
-        favorites_ids = request.session.get("favorites", [])
-        queryset = Product.objects.filter(id__in=favorites_ids)
-        serializer = ProductSerializer(queryset, many=True, context={"request": request})
+        favorites_ids = get_favorites(request)
+        queryset = (
+            Product.objects.filter(id__in=favorites_ids)
+            .select_related("category")
+            .prefetch_related("images")
+        )
+        serializer = ProductSerializer(
+            queryset, many=True, context={"request": request, "favorites": favorites_ids}
+        )
         return Response(serializer.data)
 
 
 class CartViewSet(viewsets.ViewSet):
     @action(detail=True, methods=["post"])
     def add(self, request, pk=None):
-        cart = request.session.get("cart", {})
-        product = Product.objects.get(pk=pk)
-
-        if str(pk) in cart:
-            cart[str(pk)]["quantity"] += 1
-        else:
-            cart[str(pk)] = {
-                "name": product.name,
-                "price": float(product.price),
-                "quantity": 1
-            }
-
-        request.session["cart"] = cart
-        request.session.modified = True
-        return Response(self._get_cart_summary(cart))
+        if not Product.objects.filter(pk=pk).exists():
+            return Response({"detail": "Товар не найден."}, status=status.HTTP_404_NOT_FOUND)
+        store, key = get_cart_store(), get_cart_key(request)
+        store.add(key, int(pk))
+        return Response(cart_summary(store.items(key)))
 
     @action(detail=True, methods=["post"])
     def remove(self, request, pk=None):
-        cart = request.session.get("cart", {})
-        if str(pk) in cart:
-            del cart[str(pk)]
-            request.session["cart"] = cart
-            request.session.modified = True
-        return Response(self._get_cart_summary(cart))
+        store, key = get_cart_store(), get_cart_key(request)
+        store.remove(key, int(pk))
+        return Response(cart_summary(store.items(key)))
 
     @action(detail=True, methods=["post"])
     def decrement(self, request, pk=None):
-        cart = request.session.get("cart", {})
-        if str(pk) in cart:
-            if cart[str(pk)]["quantity"] > 1:
-                cart[str(pk)]["quantity"] -= 1
-            else:
-                del cart[str(pk)]
-            request.session["cart"] = cart
-            request.session.modified = True
-        return Response(self._get_cart_summary(cart))
+        store, key = get_cart_store(), get_cart_key(request)
+        store.decrement(key, int(pk))
+        return Response(cart_summary(store.items(key)))
 
     def list(self, request):
-        cart = request.session.get("cart", {})
-        return Response(self._get_cart_summary(cart))
-
-    def _get_cart_summary(self, cart):
-        total = sum(item["price"] * item["quantity"] for item in cart.values())
-        return {
-            "items": cart,
-            "total_price": round(total, 2),
-            "total_items": sum(item["quantity"] for item in cart.values())
-        }
-
-def compute_delivery_datetime(min_hours: int, preferred: time | None):
-    now = timezone.now()
-    earliest = now + timedelta(hours=min_hours)
-
-    if not preferred:
-        return earliest
-
-    candidate = earliest.replace(
-        hour=preferred.hour, minute=preferred.minute, second=0, microsecond=0
-    )
-    if candidate < earliest:
-        candidate += timedelta(days=1)
-    return candidate
-
-def _compute_delivery_datetime(min_hours: int, preferred: dt_time | None):
-    now = timezone.now()
-    earliest = now + timezone.timedelta(hours=min_hours)
-    if not preferred:
-        return earliest
-    candidate = earliest.replace(hour=preferred.hour, minute=preferred.minute, second=0, microsecond=0)
-    if candidate < earliest:
-        candidate += timezone.timedelta(days=1)
-    return candidate
+        store, key = get_cart_store(), get_cart_key(request)
+        return Response(cart_summary(store.items(key)))
 
 class CheckoutView(APIView):
     def get(self, request, *args, **kwargs):
-        cart = request.session.get("cart", {})
+        cart = get_cart_store().items(get_cart_key(request))
         if not cart:
             return Response({"detail": "Корзина пуста."}, status=status.HTTP_400_BAD_REQUEST)
 
         delivery_type = request.query_params.get("delivery_type", "standard")
         preferred_time_str = request.query_params.get("preferred_time")
 
-        subtotal = Decimal("0")
-        for it in cart.values():
-            subtotal += Decimal(str(it["price"])) * int(it["quantity"])
-
-        shipping_cost = Decimal("700") if delivery_type == "express" else Decimal("0")
-        total = subtotal + shipping_cost
-
         preferred_time = None
         if preferred_time_str:
             try:
@@ -186,49 +202,42 @@ class CheckoutView(APIView):
             except Exception:
                 return Response({"detail": "preferred_time должен быть в формате HH:MM"}, status=400)
 
-        min_hours = 24
-        delivery_dt = _compute_delivery_datetime(min_hours, preferred_time)
+        try:
+            quote = build_quote(cart, delivery_type, preferred_time)
+        except QuoteError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # quote_id из ответа можно передать в POST — заказ пройдёт только по этим суммам
+        save_quote(quote)
+        return Response(quote.as_preview())
+
+    def post(self, request, *args, **kwargs):
+        store, key = get_cart_store(), get_cart_key(request)
 
-        base_note = "Товар будет доставлен через 24 часа."
-        if preferred_time:
-            delivery_note = (
-                f"{base_note} Вы выбрали время {preferred_time.strftime('%H:%M')}. "
-                f"Доставка назначена на {timezone.localtime(delivery_dt).strftime('%d.%m.%Y %H:%M')}."
+        def create():
+            serializer = CheckoutCreateSerializer(
+                data=request.data,
+                context={"cart": store.items(key), "request": request}
             )
-        else:
-            delivery_note = (
-                f"{base_note} Доставка назначена на {timezone.localtime(delivery_dt).strftime('%d.%m.%Y %H:%M')}."
+            serializer.is_valid(raise_exception=True)
+            order = serializer.save()
+            return order, CheckoutOrderSerializer(order).data
+
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            order, data = create()
+            store.clear(key)
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        # повтор с тем же ключом получает первый ответ, а не второй заказ
+        try:
+            status_code, data, replayed = idempotent(
+                scoped_key(key, idempotency_key), request_fingerprint(request.data), create
             )
-
-        return Response({
-            "preview": True,
-            "delivery_type": delivery_type,
-            "preferred_time": preferred_time.strftime("%H:%M") if preferred_time else None,
-            "delivery_eta_hours": min_hours,
-            "delivery_datetime": delivery_dt,
-            "delivery_note": delivery_note,
-            "subtotal": round(subtotal, 2),
-            "shipping_cost": round(shipping_cost, 2),
-            "total": round(total, 2),
-            "items": [
-                {
-                    "name": it["name"],
-                    "price": it["price"],
-                    "quantity": it["quantity"],
-                    "line_total": round(float(it["price"]) * int(it["quantity"]), 2),
-                } for it in cart.values()
-            ],
-        })
-
-    def post(self, request, *args, **kwargs):
-        cart = request.session.get("cart", {})
-        serializer = CheckoutCreateSerializer(
-            data=request.data,
-            context={"cart": cart, "request": request}
-        )
-        serializer.is_valid(raise_exception=True)
-        order = serializer.save()
-        return Response(CheckoutOrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        except IdempotencyError as e:
+            return Response({"detail": str(e)}, status=e.status)
+        if not replayed:
+            store.clear(key)
+        return Response(data, status=status_code, headers={"Idempotent-Replayed": "true" if replayed else "false"})
 
 class ContactAPI(viewsets.GenericViewSet,
                     mixins.CreateModelMixin):
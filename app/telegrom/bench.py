@@ -0,0 +1,169 @@
+"""
+Нагрузка на обработчики бота без Telegram: python -m app.telegrom.bench
+
+N пользователей одновременно проходят /start → /products → карточка →
+подтверждение → имя → телефон → адрес (заказ в БД). Ответы бота уходят в
+фейковую сессию с задержкой --api-latency, к каждому SQL добавляется
+--db-latency (сетевая задержка до PostgreSQL). Сравнивает прежний доступ к БД
+(thread-sensitive поток Django, --threads 0) с пулом ShopRepository.
+
+Без Redis: BOT_FSM_REDIS_URL= (по умолчанию так и есть). Заказы помечаются и
+удаляются после прогона. На SQLite пул ShopRepository — один поток (один
+писатель), сравнивать пулы имеет смысл на PostgreSQL.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("BOT_FSM_REDIS_URL", "")
+os.environ.setdefault("BOT_TOKEN", "42:bench")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage  # noqa: E402
+from aiogram.types import Chat, Message, Update  # noqa: E402
+
+from app.telegrom import bot as shop_bot  # noqa: E402  (django.setup())
+
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from app.shop.benchmarks import format_summary, summarize  # noqa: E402
+from app.shop.models import Order, Product, TelegramOutbox  # noqa: E402
+from app.telegrom.repository import ShopRepository  # noqa: E402
+
+BENCH_ADDRESS = "bench-bot"
+FAKE_TOKEN = os.environ["BOT_TOKEN"]
+
+
+class FakeSession(BaseSession):
+    """Вместо api.telegram.org: ждёт latency и возвращает правдоподобный ответ."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=method.chat_id or 0, type="private"),
+                text=method.text,
+            )
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        # файлы бот не скачивает — пустой поток
+        return
+        yield
+
+    async def close(self):
+        pass
+
+
+def _message(user_id, text, n):
+    return {
+        "message_id": n,
+        "date": 0,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+        "text": text,
+    }
+
+
+def _script(user_id, product_id):
+    """Апдейты одного пользователя: от /start до оформленного заказа."""
+    message = _message(user_id, "/products", 1)
+    steps = [
+        {"message": _message(user_id, "/start", 1)},
+        {"message": message},
+        {"callback_query": {
+            "id": f"{user_id}-1", "from": message["from"], "chat_instance": "bench",
+            "data": f"details_{product_id}", "message": message,
+        }},
+        {"callback_query": {
+            "id": f"{user_id}-2", "from": message["from"], "chat_instance": "bench",
+            "data": "confirm_order", "message": message,
+        }},
+        {"message": _message(user_id, "Bench", 2)},
+        {"message": _message(user_id, "+70000000000", 3)},
+        {"message": _message(user_id, BENCH_ADDRESS, 4)},
+    ]
+    return [dict(update_id=user_id * 100 + i, **step) for i, step in enumerate(steps)]
+
+
+async def run(users, threads, api_latency):
+    bot = Bot(token=FAKE_TOKEN, session=FakeSession(api_latency))
+    repository = ShopRepository(threads)
+    shop_bot.repository = repository
+    shop_bot.catalog.invalidate()
+    product_id = (await repository.catalog_rows())[0][0]
+    latencies = []
+
+    async def user(n):
+        # апдейты одного чата Telegram присылает по очереди, разные чаты — параллельно
+        for data in _script(10_000 + n, product_id):
+            update = Update.model_validate(data, context={"bot": bot})
+            started = time.perf_counter()
+            await shop_bot.dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(users)))
+    elapsed = time.perf_counter() - started
+    await asyncio.get_running_loop().run_in_executor(None, repository.close)
+    return summarize(latencies, elapsed), elapsed, repository.threads
+
+
+async def compare(users, thread_counts, api_latency):
+    # один event loop на все прогоны: asyncio.Lock снимка каталога привязан к нему
+    for threads in thread_counts:
+        summary, elapsed, threads = await run(users, threads, api_latency)
+        label = "sync_to_async (общий поток)" if threads == 0 else f"ShopRepository, {threads} потоков"
+        print(format_summary(label, summary) + f", всего {elapsed:.2f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--threads", type=int, action="append", help="0 — прежний общий поток; можно несколько")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="секунд на вызов Telegram API")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="секунд на SQL-запрос")
+    args = parser.parse_args()
+
+    def slow_sql(execute, sql, params, many, context):
+        time.sleep(args.db_latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # сигнал приходит на каждое переподключение того же DatabaseWrapper
+        if slow_sql not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow_sql)
+
+    if args.db_latency:
+        connection_created.connect(install, weak=False)
+
+    if not Product.objects.exists():
+        raise SystemExit("Нет товаров, сначала manage.py seed_perf_data")
+
+    try:
+        # без Celery: заказы не пытаются сразу уйти в Telegram
+        with override_settings(TELEGRAM_OUTBOX_EAGER_DRAIN=False):
+            asyncio.run(compare(args.users, args.threads or [0, 8], args.api_latency))
+    finally:
+        TelegramOutbox.objects.filter(text__contains=BENCH_ADDRESS).delete()
+        Order.objects.filter(user_address=BENCH_ADDRESS).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,124 @@
 import os
+import time
 import django
 import asyncio
+from dataclasses import dataclass
+from decimal import Decimal
 from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from asgiref.sync import sync_to_async
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
 
 # Подключаем Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 django.setup()
 
-from app.shop.models import Product, Order
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError
 
-TOKEN = "8420115725:AAGhOwGmXk4S2GDO-MhEAU9tGtIhITiYpeE"
-ADMIN_CHAT_ID = 5199401134  # замените на свой ID
+from app.shop.utils import rate_limiter
+from app.telegrom.repository import ShopRepository
 
+TOKEN = getattr(settings, "TELEGRAM_BOT_TOKEN", None)
+if not TOKEN:
+    raise ImproperlyConfigured("Не задан токен бота: переменная окружения BOT_TOKEN")
+
+PAGE_SIZE = getattr(settings, "BOT_PAGE_SIZE", 8)
+CATALOG_TTL = getattr(settings, "BOT_CATALOG_TTL", 60)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Все исходящие сообщения — через общий лимит Telegram (в чат и на бота).
+    Ждёт asyncio.sleep, поэтому ответы разным пользователям идут параллельно,
+    а не друг за другом.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            await rate_limiter.await_slot(str(chat_id))
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # лимит всё же превышен (другой процесс с тем же токеном) — один повтор
+            await asyncio.sleep(e.retry_after)
+            return await make_request(bot, method)
+
+
+@dataclass(frozen=True)
+class ProductItem:
+    id: int
+    name: str
+    price: Decimal
+    description: str
+
+
+class CatalogSnapshot:
+    """
+    Каталог в памяти бота на CATALOG_TTL секунд: /products, листание, карточки
+    и заказы не ходят в БД на каждое нажатие. Перечитывает один обработчик,
+    остальные ждут его под asyncio.Lock.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self._loaded_at = None
+        self._items = []
+        self._by_id = {}
+
+    def _fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def get(self):
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    rows = await repository.catalog_rows()
+                    self._items = [ProductItem(*row) for row in rows]
+                    self._by_id = {item.id: item for item in self._items}
+                    self._loaded_at = time.monotonic()
+        return self
+
+    @property
+    def items(self):
+        return self._items
+
+    def product(self, product_id):
+        return self._by_id.get(product_id)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+repository = ShopRepository()
+catalog = CatalogSnapshot(CATALOG_TTL)
+
+
+def create_storage():
+    # FSM в Redis: заказ не теряется при перезапуске и виден всем воркерам webhook
+    url = getattr(settings, "BOT_FSM_REDIS_URL", None)
+    if not url:
+        return MemoryStorage()
+    ttl = getattr(settings, "BOT_FSM_TTL", None)
+    return RedisStorage.from_url(url, state_ttl=ttl, data_ttl=ttl)
+
+
+storage = create_storage()
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
+bot.session.middleware(RateLimitMiddleware())
+# апдейты одного пользователя — по очереди, даже если пришли на разные воркеры
+dp = Dispatcher(
+    storage=storage,
+    events_isolation=storage.create_isolation() if isinstance(storage, RedisStorage) else None,
+)
 
 # FSM для оформления заказа
 class OrderForm(StatesGroup):
@@ -33,29 +133,63 @@ async def start_handler(message: types.Message):
         "👋 Привет! Я магазин OnlineShop 🛍️\nНапиши /products чтобы посмотреть товары."
     )
 
-# Функция для показа товаров
-async def show_products(message: types.Message):
-    products = await sync_to_async(list)(Product.objects.all())
-    if not products:
+# Одна страница каталога: текст и клавиатура (товары + ⬅️ n/N ➡️)
+def render_page(items, page):
+    pages = max(1, (len(items) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = min(max(page, 1), pages)
+    chunk = items[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+    lines = [f"🛍️ Товары (стр. {page} из {pages}):", ""]
+    rows = []
+    for n, product in enumerate(chunk, start=(page - 1) * PAGE_SIZE + 1):
+        lines.append(f"{n}. 📦 {product.name} — 💰 {product.price}")
+        rows.append([InlineKeyboardButton(text=f"📄 {product.name}", callback_data=f"details_{product.id}")])
+
+    if pages > 1:
+        nav = []
+        if page > 1:
+            nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
+        nav.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data="noop"))
+        if page < pages:
+            nav.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
+        rows.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Функция для показа товаров: одно сообщение со страницей вместо сообщения на товар
+async def show_products(message: types.Message, page=1):
+    snapshot = await catalog.get()
+    if not snapshot.items:
         await message.answer("Товаров пока нет 😔")
         return
-
-    for product in products:
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📄 Подробнее", callback_data=f"details_{product.id}")]
-        ])
-        await message.answer(f"📦 {product.name}\n💰 {product.price}", reply_markup=keyboard)
+    text, keyboard = render_page(snapshot.items, page)
+    await message.answer(text, reply_markup=keyboard)
 
 # Показ товаров командой /products
 @dp.message(Command("products"))
 async def products_handler(message: types.Message):
     await show_products(message)
 
+# Листание страниц: правим то же сообщение
+@dp.callback_query(lambda c: c.data.startswith("page_"))
+async def change_page(callback: types.CallbackQuery):
+    snapshot = await catalog.get()
+    text, keyboard = render_page(snapshot.items, int(callback.data.split("_")[1]))
+    if text != callback.message.text:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+@dp.callback_query(lambda c: c.data == "noop")
+async def noop(callback: types.CallbackQuery):
+    await callback.answer()
+
 # Показ деталей товара
 @dp.callback_query(lambda c: c.data.startswith("details_"))
 async def show_details(callback: types.CallbackQuery, state: FSMContext):
     product_id = int(callback.data.split("_")[1])
-    product = await sync_to_async(Product.objects.get)(id=product_id)
+    product = (await catalog.get()).product(product_id)
+    if product is None:
+        await callback.answer("Товар больше недоступен", show_alert=True)
+        return
     await state.update_data(product_id=product_id)
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -89,20 +223,35 @@ async def process_phone(message: types.Message, state: FSMContext):
     await message.answer("Введите адрес доставки:")
     await state.set_state(OrderForm.address)
 
+# Товар пропал, пока пользователь вводил данные
+async def product_unavailable(message: types.Message, state: FSMContext):
+    await message.answer("😔 Этот товар больше недоступен, выберите другой:")
+    await show_products(message)
+    await state.clear()
+
 # Сбор адреса и создание заказа
 @dp.message(StateFilter(OrderForm.address))
 async def process_address(message: types.Message, state: FSMContext):
     user_data = await state.get_data()
-    product = await sync_to_async(Product.objects.get)(id=user_data["product_id"])
+    product = (await catalog.get()).product(user_data["product_id"])
+    if product is None:
+        await product_unavailable(message, state)
+        return
 
     # Создание заказа
-    await sync_to_async(Order.objects.create)(
-        product=product,
-        quantity=1,
-        user_name=user_data["user_name"],
-        user_phone=user_data["user_phone"],
-        user_address=message.text
-    )
+    try:
+        await repository.create_order(
+            product_id=product.id,
+            quantity=1,
+            user_name=user_data["user_name"],
+            user_phone=user_data["user_phone"],
+            user_address=message.text
+        )
+    except IntegrityError:
+        # товар удалили после того, как снимок каталога был прочитан
+        catalog.invalidate()
+        await product_unavailable(message, state)
+        return
 
     # Сообщение пользователю
     await message.answer(
@@ -118,17 +267,7 @@ async def process_address(message: types.Message, state: FSMContext):
     # Показываем товары снова
     await show_products(message)
 
-    # Уведомление админу
-    await bot.send_message(
-        ADMIN_CHAT_ID,
-        f"🆕 Новый заказ!\n"
-        f"Товар: {product.name}\n"
-        f"Цена: {product.price}\n"
-        f"Имя: {user_data['user_name']}\n"
-        f"Телефон: {user_data['user_phone']}\n"
-        f"Адрес: {message.text}\n"
-        f"Пользователь: {message.from_user.full_name}"
-    )
+    # Уведомление админу уходит через TelegramOutbox (post_save заказа)
 
     await state.clear()
 
@@ -141,6 +280,8 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
 
 # Запуск бота
 async def main():
+    # polling и webhook взаимоисключающие: снимаем webhook, если он был поставлен
+    await bot.delete_webhook()
     print("✅ Магазин-бот запущен!")
     await dp.start_polling(bot)
 
@@ -0,0 +1,71 @@
+"""
+Доступ бота к БД. Обработчики зовут async-методы репозитория, а не ORM
+напрямую.
+
+aget()/acreate() и async-итерация в Django 5.2 — это sync_to_async с
+thread_sensitive=True, то есть все обработчики стоят в очереди к одному
+потоку. Здесь каждая операция целиком (одна или несколько SQL) выполняется
+в собственном пуле из BOT_DB_THREADS потоков. У каждого потока своё
+постоянное соединение, оно переживает вызовы по правилам CONN_MAX_AGE /
+CONN_HEALTH_CHECKS, как между HTTP-запросами.
+
+SQLite допускает одного писателя: параллельные заказы из нескольких потоков
+получают «database is locked», поэтому на SQLite пул всегда из одного потока.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from app.shop.models import Order, Product
+
+
+def _unit_of_work(func):
+    def run(*args, **kwargs):
+        # как на границе HTTP-запроса: протухшее или битое соединение закрываем
+        close_old_connections()
+        return func(*args, **kwargs)
+    return run
+
+
+@_unit_of_work
+def _catalog_rows():
+    return list(Product.objects.order_by("id").values_list("id", "name", "price", "description"))
+
+
+@_unit_of_work
+def _create_order(product_id, user_name, user_phone, user_address, quantity=1):
+    return Order.objects.create(
+        product_id=product_id,
+        quantity=quantity,
+        user_name=user_name,
+        user_phone=user_phone,
+        user_address=user_address,
+    )
+
+
+class ShopRepository:
+    def __init__(self, threads=None):
+        """threads=0 — прежнее поведение: общий thread-sensitive поток Django."""
+        threads = getattr(settings, "BOT_DB_THREADS", 8) if threads is None else threads
+        if threads and connection.vendor == "sqlite":
+            threads = 1
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="bot-db") if threads else None
+
+    def _run(self, func, *args, **kwargs):
+        if self._executor is None:
+            return sync_to_async(func)(*args, **kwargs)
+        return sync_to_async(func, thread_sensitive=False, executor=self._executor)(*args, **kwargs)
+
+    async def catalog_rows(self):
+        """[(id, name, price, description)] всех товаров по id."""
+        return await self._run(_catalog_rows)
+
+    async def create_order(self, **fields):
+        return await self._run(_create_order, **fields)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
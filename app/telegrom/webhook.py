@@ -0,0 +1,131 @@
+"""
+Webhook-режим бота внутри ASGI-приложения (core/asgi.py).
+
+POST на путь из BOT_WEBHOOK_URL с заголовком BOT_WEBHOOK_SECRET (без него
+режим не запускается) разбирает Dispatcher, остальное уходит в Django.
+Апдейт подтверждается Telegram сразу, обработка идёт задачей; не больше
+BOT_WEBHOOK_CONCURRENCY одновременно на воркер — сверх этого ответ
+задерживается, и Telegram сам придерживает отправку (max_connections).
+Состояние OrderForm лежит в Redis (bot.storage), поэтому воркеров может быть
+несколько, а перезапуск не теряет начатые заказы.
+"""
+import asyncio
+import hmac
+import logging
+from urllib.parse import urlsplit
+
+from aiogram.types import Update
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+class TelegramWebhook:
+    def __init__(self, django_app):
+        from app.telegrom.bot import bot, dp, repository
+
+        self.django_app = django_app
+        self.bot = bot
+        self.dp = dp
+        self.repository = repository
+        self.url = settings.BOT_WEBHOOK_URL
+        self.path = urlsplit(self.url).path or "/"
+        self.secret = settings.BOT_WEBHOOK_SECRET
+        if not self.secret:
+            # без секрета любой, кто знает путь, может прислать поддельный апдейт и заказ
+            raise ImproperlyConfigured("Webhook-режим требует BOT_WEBHOOK_SECRET")
+        self.concurrency = settings.BOT_WEBHOOK_CONCURRENCY
+        self._semaphore = None
+        self._tasks = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["path"] == self.path:
+            return await self.handle_update(scope, receive, send)
+        return await self.django_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("Не удалось зарегистрировать webhook")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # каждый воркер повторяет setWebhook — запрос идемпотентный
+        await self.bot.set_webhook(
+            self.url,
+            secret_token=self.secret,
+            max_connections=self.concurrency,
+            allowed_updates=self.dp.resolve_used_update_types(),
+        )
+
+    async def shutdown(self):
+        # webhook не снимаем: остальные воркеры и следующий запуск продолжают работать
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=10)
+        await self.dp.storage.close()
+        await self.bot.session.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.repository.close)
+
+    async def handle_update(self, scope, receive, send):
+        if scope["method"] != "POST":
+            return await _respond(send, 405)
+        headers = dict(scope["headers"])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b""), self.secret.encode()):
+            return await _respond(send, 403)
+
+        body = await _read_body(receive)
+        try:
+            update = Update.model_validate_json(body, context={"bot": self.bot})
+        except ValueError:
+            return await _respond(send, 400)
+
+        if self._semaphore is None:
+            # сервер без lifespan (uvicorn --lifespan off) — webhook ставят вручную
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        await _respond(send, 200)
+
+    async def _process(self, update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            logger.exception("Ошибка обработки апдейта %s", update.update_id)
+        finally:
+            self._semaphore.release()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _respond(send, status):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain"), (b"content-length", b"0")],
+    })
+    await send({"type": "http.response.body", "body": b""})
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.BOT_WEBHOOK_URL:
+    # бот в webhook-режиме: его путь обслуживает Dispatcher, остальное — Django
+    from app.telegrom.webhook import TelegramWebhook
+
+    application = TelegramWebhook(application)
@@ -13,4 +13,20 @@ app.conf.beat_schedule = {
         "task": "app.shop.tasks.generate_sales_reports",
         "schedule": crontab(minute=0, hour=0),  
     },
+    "rollup-visits-hourly": {
+        "task": "app.shop.tasks.rollup_visits",
+        "schedule": crontab(minute=5),
+    },
+    "purge-expired-carts": {
+        "task": "app.shop.tasks.purge_expired_carts",
+        "schedule": crontab(minute=30, hour=3),
+    },
+    "purge-idempotency-records": {
+        "task": "app.shop.tasks.purge_idempotency_records",
+        "schedule": crontab(minute=45, hour=3),
+    },
+    "drain-telegram-outbox": {
+        "task": "app.shop.tasks.drain_telegram_outbox",
+        "schedule": crontab(),
+    },
 }
\ No newline at end of file
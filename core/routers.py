@@ -0,0 +1,140 @@
+"""
+Чтение каталога, отзывов и настроек — с реплики, всё остальное (заказы,
+корзины, сессии, визиты) и любые записи — с основной БД.
+
+После записи клиент «приклеивается» к основной БД: до конца запроса
+и ещё REPLICA_PIN_SECONDS через cookie, чтобы сразу видеть свои изменения
+несмотря на отставание реплики.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+PIN_COOKIE = "db_pin"
+
+REPLICA_MODELS = {
+    ("shop", "category"),
+    ("shop", "product"),
+    ("shop", "productimage"),
+    ("shop", "reviews"),
+    ("settings", "settings"),
+}
+
+
+class _RequestState:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+def _key(model):
+    return model._meta.app_label, model._meta.model_name
+
+
+class PrimaryReplicaRouter:
+    def __init__(self):
+        self.has_replica = REPLICA in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if not self.has_replica:
+            return None
+        state = _state.get()
+        # вне HTTP-запроса (Celery, команды) и внутри транзакции — только основная БД:
+        # select_for_update и чтение своих же записей не должны уйти на реплику
+        if state is None or state.pinned or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        if _key(model) in REPLICA_MODELS:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # визиты и сессии пишутся почти на каждом GET — привязка нужна только
+        # после изменений в том, что читается с реплики
+        if state is not None and _key(model) in REPLICA_MODELS:
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика — копия основной БД, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока — с основной БД, даже если запрос не привязан к ней."""
+    state = _state.get()
+    if state is None or state.pinned:
+        yield
+        return
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = state.wrote
+
+
+class ReplicaPinMiddleware:
+    """Ставит и читает cookie db_pin; без реплики ничего не делает."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    def _start(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        unsafe = request.method not in ("GET", "HEAD", "OPTIONS")
+        state = _RequestState(pinned=unsafe or pinned_until > time.time())
+        return state, _state.set(state)
+
+    def _finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + self.pin_seconds),
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
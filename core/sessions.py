@@ -0,0 +1,170 @@
+"""
+Сессии в Redis (кэш SESSION_CACHE_ALIAS) с запасным хранилищем в БД.
+
+Redis недоступен — читаем и пишем django_session; сессии, созданные во время
+сбоя, находятся и после восстановления Redis (при промахе кэша смотрим в БД).
+Запись — только при изменении сессии; срок жизни продлевается не чаще
+раза в SESSION_REFRESH_INTERVAL.
+
+Ключи, сохранённые или удалённые в обход кэша, процесс помнит и при первом
+удачном обращении к кэшу переносит из БД: копия в Redis, оставшаяся от
+времени до сбоя, перезаписывается (или удаляется), строка в БД — тоже.
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ERRORS = (ConnectionInterrupted, RedisError, OSError)
+REFRESH_KEY = "_refreshed_at"
+
+# ключи сессий, записанные во время сбоя только в БД
+_pending_lock = threading.Lock()
+_pending = set()
+
+
+def _mark_pending(session_key):
+    with _pending_lock:
+        _pending.add(session_key)
+
+
+class SessionStore(CacheSessionStore):
+    def _sync_pending(self):
+        """Переносит в кэш сессии, записанные во время сбоя; CACHE_ERRORS — наружу."""
+        while _pending:
+            with _pending_lock:
+                if not _pending:
+                    return
+                session_key = _pending.pop()
+            try:
+                store = DBSessionStore(session_key)
+                data = store.load()
+                if data:
+                    self._cache.set(
+                        self.cache_key_prefix + session_key, data, store.get_expiry_age(session_data=data)
+                    )
+                else:
+                    # удалена или истекла во время сбоя — старую копию не воскрешаем
+                    self._cache.delete(self.cache_key_prefix + session_key)
+            except CACHE_ERRORS:
+                _mark_pending(session_key)
+                raise
+            store.delete(session_key)
+
+    def load(self):
+        try:
+            self._sync_pending()
+            data = self._cache.get(self.cache_key)
+        except CACHE_ERRORS:
+            logger.warning("Кэш сессий недоступен, читаем из БД")
+            return self._load_from_db(copy_to_cache=False)
+        if data is not None:
+            return data
+        return self._load_from_db(copy_to_cache=True)
+
+    def _load_from_db(self, copy_to_cache):
+        store = DBSessionStore(self._session_key)
+        data = store.load()
+        if not data:
+            self._session_key = None
+            return {}
+        if copy_to_cache:
+            try:
+                self._cache.set(self.cache_key, data, store.get_expiry_age(session_data=data))
+            except CACHE_ERRORS:
+                pass
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        try:
+            self._sync_pending()
+            if must_create:
+                if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+                    raise CreateError
+            else:
+                # upsert: сессия могла прийти из БД во время сбоя и ещё не быть в кэше
+                self._cache.set(self.cache_key, data, self.get_expiry_age())
+            return
+        except CACHE_ERRORS:
+            logger.warning("Кэш сессий недоступен, сохраняем в БД")
+        store = DBSessionStore(self.session_key)
+        store._session_cache = data
+        try:
+            store.save(must_create=must_create)
+        except UpdateError:
+            # до сбоя сессия жила только в Redis — в БД её ещё нет
+            store.save(must_create=True)
+        _mark_pending(self.session_key)
+
+    def exists(self, session_key):
+        try:
+            return super().exists(session_key)
+        except CACHE_ERRORS:
+            return DBSessionStore().exists(session_key)
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        try:
+            super().delete(session_key)
+            cache_failed = False
+        except CACHE_ERRORS:
+            cache_failed = True
+        DBSessionStore().delete(session_key)
+        if cache_failed:
+            _mark_pending(session_key)
+
+    # async-представления: та же логика с запасным путём, в потоке
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        # в Redis истекает само, в БД — записи, сделанные во время сбоев
+        DBSessionStore.clear_expired()
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """Вместо SESSION_SAVE_EVERY_REQUEST: продлевает живую сессию раз в интервал."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.refresh_interval = getattr(settings, "SESSION_REFRESH_INTERVAL", 60 * 60 * 24)
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if session is not None:
+            now = int(time.time())
+            if session.modified:
+                # сессия и так сохранится — отметка бесплатна
+                if not session.is_empty():
+                    session[REFRESH_KEY] = now
+            elif request.COOKIES.get(settings.SESSION_COOKIE_NAME):
+                refreshed_at = session.get(REFRESH_KEY, 0)
+                # битый или истёкший ключ load() сбрасывает — такие не продлеваем
+                if session.session_key and now - refreshed_at >= self.refresh_interval:
+                    session[REFRESH_KEY] = now
+        return super().process_response(request, response)
@@ -38,9 +38,11 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "app.analytics.middleware.MetricsMiddleware",
+    "core.routers.ReplicaPinMiddleware",
     "corsheaders.middleware.CorsMiddleware", 
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    "core.sessions.SessionMiddleware",
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -70,12 +72,50 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# БД из окружения: DB_ENGINE=postgresql для продакшена, по умолчанию — SQLite.
+# DB_REPLICA_HOST (или DB_REPLICA_NAME для SQLite) включает чтение каталога с реплики.
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite3")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DB_NAME", "onlineshop"),
+            'USER': os.getenv("DB_USER", "postgres"),
+            'PASSWORD': os.getenv("DB_PASSWORD", ""),
+            'HOST': os.getenv("DB_HOST", "localhost"),
+            'PORT': os.getenv("DB_PORT", "5432"),
+            'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+    if os.getenv("DB_REPLICA_HOST"):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv("DB_REPLICA_HOST"),
+            'PORT': os.getenv("DB_REPLICA_PORT", DATABASES['default']['PORT']),
+            'USER': os.getenv("DB_REPLICA_USER", DATABASES['default']['USER']),
+            'PASSWORD': os.getenv("DB_REPLICA_PASSWORD", DATABASES['default']['PASSWORD']),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DB_NAME", BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if os.getenv("DB_REPLICA_NAME"):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DB_REPLICA_NAME"),
+        }
+
+if 'replica' in DATABASES:
+    # в тестах реплика — то же соединение, что и основная БД
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ["core.routers.PrimaryReplicaRouter"]
+REPLICA_PIN_SECONDS = 5  # после записи клиент столько читает с основной БД
 
 
 REST_FRAMEWORK = {
@@ -163,8 +203,11 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 
+CORS_EXPOSE_HEADERS = ["idempotent-replayed"]
+
 
 CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS.copy()
 
@@ -175,6 +218,26 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Bishkek"
 
+# Уведомления в Telegram уходят через очередь TelegramOutbox
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_OUTBOX_BATCH_SIZE = 50
+TELEGRAM_OUTBOX_EAGER_DRAIN = True  # False — очередь разбирает только beat
+TELEGRAM_RATE_PER_CHAT = 1
+TELEGRAM_RATE_GLOBAL = 30
+
+# Бот: товаров на страницу /products и сколько секунд живёт снимок каталога
+BOT_PAGE_SIZE = 8
+BOT_CATALOG_TTL = 60
+BOT_DB_THREADS = 8  # потоков (и соединений с БД) у обработчиков бота
+# Состояние форм бота; пустая строка — в памяти процесса (только polling, один процесс)
+BOT_FSM_REDIS_URL = os.getenv("BOT_FSM_REDIS_URL", "redis://127.0.0.1:6379/2")
+BOT_FSM_TTL = 60 * 60 * 24
+# Webhook вместо polling: публичный https-URL, путь из него обслуживает core/asgi.py;
+# секрет обязателен — Telegram присылает его в заголовке каждого апдейта
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+BOT_WEBHOOK_CONCURRENCY = int(os.getenv("BOT_WEBHOOK_CONCURRENCY", "32"))
+
 LANGUAGE_CODE = "ru"
 
 LANGUAGES = [
@@ -184,5 +247,56 @@ LANGUAGES = [
 
 MODELTRANSLATION_DEFAULT_LANGUAGE = "ru"
 
+# Визиты копятся в памяти процесса и пишутся пачкой
+VISIT_BUFFER_SIZE = 200
+VISIT_FLUSH_INTERVAL = 5  # секунд
+VISIT_TRACKER_MAX_VISITORS = 50000
+VISIT_FLUSH_VIA_CELERY = False
+VISIT_FLUSH_THREAD = True  # фоновый сброс буфера раз в VISIT_FLUSH_INTERVAL
+
+# manage.py test гоняет без фонового сброса визитов (core/test_runner.py)
+TEST_RUNNER = "core.test_runner.TestRunner"
+
+# Корзина: хэш в Redis по visitor_id, при недоступности Redis — таблица CartItem
+CART_BACKEND = "redis"
+CART_TTL = 60 * 60 * 24 * 30
+
+# Настройки сайта: память процесса + Redis, браузеру — Cache-Control/ETag
+SITE_SETTINGS_LOCAL_TTL = 30  # секунд
+SITE_SETTINGS_SHARED_TTL = 60 * 60 * 24
+SITE_SETTINGS_MAX_AGE = 60
+# Хосты для ссылок на картинки в настройках; пусто — ALLOWED_HOSTS без "*"
+SITE_SETTINGS_HOSTS = [h for h in os.getenv("SITE_SETTINGS_HOSTS", "").split(",") if h] or None
+
+# Доставка при оформлении: стоимость и минимальный срок по способу доставки
+CHECKOUT_SHIPPING = {
+    "standard": {"cost": "0", "eta_hours": 24},
+    "express": {"cost": "700", "eta_hours": 24},
+}
+CHECKOUT_QUOTE_TTL = 15 * 60  # сколько живёт quote_id из предпросмотра
+
+# Idempotency-Key при оформлении: сколько хранится ответ, сколько держится
+# блокировка первого запроса и сколько дубль ждёт его ответа (секунды)
+IDEMPOTENCY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT = 10
+
+# В «лучшие товары» попадают товары минимум с таким числом активных отзывов
+TOP_RATED_MIN_REVIEWS = 3
+
+# Метрики: /metrics для Prometheus (только с METRICS_ALLOWED_IPS, пустой список — закрыт),
+# медленные запросы — в лог app.analytics
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500")) or None
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip]
+
+# Копии фотографий товаров; "avif" работает, если Pillow собран с libavif
+PRODUCT_IMAGE_WIDTHS = (320, 640, 1280)
+PRODUCT_IMAGE_FORMATS = ("webp", "jpeg")
+PRODUCT_IMAGE_QUALITY = 80
+
+# Сессии в Redis, БД — запасной вариант (core/sessions.py). Пишем только
+# изменённые сессии, срок жизни продлеваем не чаще раза в сутки
+SESSION_ENGINE = "core.sessions"
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30
-SESSION_SAVE_EVERY_REQUEST = True 
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 60 * 60 * 24
@@ -0,0 +1,25 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Без фонового сброса визитов: поток пишет через своё соединение и может
+    пережить тестовую БД. Накопленное сбрасывается до её удаления.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._visit_settings = override_settings(VISIT_FLUSH_THREAD=False)
+        self._visit_settings.enable()
+
+    def teardown_databases(self, old_config, **kwargs):
+        from app.analytics.middleware import VisitMiddleware
+
+        if VisitMiddleware.recorder is not None:
+            VisitMiddleware.recorder.stop()
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self._visit_settings.disable()
+        super().teardown_test_environment(**kwargs)
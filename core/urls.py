@@ -8,6 +8,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from app.analytics.views import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Shop API",
@@ -25,6 +27,7 @@ urlpatterns = [
     
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
 
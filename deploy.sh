@@ -25,6 +25,10 @@ source "$VENV_DIR/bin/activate" || { echo "Virtualenv not found! Exiting."; exit
 echo "Applying migrations..."
 python manage.py migrate --noinput
 
+# Перестраиваем поисковый индекс товаров
+echo "Rebuilding search index..."
+python manage.py rebuild_search_index
+
 # Перезапуск сервисов
 echo "Starting services..."
 systemctl start gunicorn